@@ -0,0 +1,319 @@
+# CadastroProdutos/AtualizarFiscal.py
+# caminho de escrita: aplica um CSV codigo|aliquota (ou outros campos) no cadastro, com dry-run
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.support import expected_conditions as EC
+from pathlib import Path
+import csv
+import time
+
+from CadastroProdutos._fila_retry import FilaRetry
+from CadastroProdutos._log import get_logger, contexto
+from CadastroProdutos.ExtrairAliquota import (
+    ExtrairProduto, ChaveDivergente, ler_nao_exibir_no_cardapio, continua_drive, waitingpanel,
+    nisclickable, clicar, clicar_botao_modal, esperar_resultado_visivel,
+    filtrar_por_codigo, chaves_da_pagina, abrir_edicao, fechar_edicao, recuperar_tela, _mesma_chave,
+    ler_checkpoint, gravar_checkpoint, limpar_checkpoint, salvar_csv,
+    MAX_TENTATIVAS, BACKOFF_RETRY, MAX_FALHAS_SEGUIDAS,
+)
+
+log = get_logger(__name__)
+
+# entrada: CSV com a coluna 'codigo' + uma ou mais colunas de CAMPOS (delimitador | ; , ou tab)
+ENTRADA = Path(__file__).parent / "atualizar.csv"
+
+# True  -> só abre cada produto, compara e grava o diff em SAIDA_DIFF (nada é salvo no sistema)
+# False -> aplica: altera, salva, reabre e confere; resultado em SAIDA_RESULTADO
+DRY_RUN = True
+
+SAIDA_DIFF       = Path(__file__).parent / "atualizar.diff.csv"
+SAIDA_RESULTADO  = Path(__file__).parent / "atualizar.resultado.csv"
+SAIDA_FALHAS     = Path(__file__).parent / "atualizar.falhas.csv"
+CHECKPOINT       = Path(__file__).parent / "atualizar.checkpoint"  # última linha da entrada concluída
+CABECALHO_SAIDA  = ("codigo", "campo", "atual", "novo", "resultado")
+
+CAMPOS = ("nome", "aliquota", "nao_exibir_no_cardapio")
+
+class ValorNaoGravado(Exception):
+    """Depois de salvar, o produto reaberto não tem o valor pedido."""
+
+# ======================
+# entrada (streaming)
+# ======================
+class _PontoEVirgula(csv.excel):
+    delimiter = ";"
+
+def ler_alteracoes(caminho: Path):
+    """
+    Gera (linha, codigo, {campo: valor}) lendo o CSV linha a linha.
+    Células vazias não alteram o campo; colunas desconhecidas são ignoradas.
+    """
+    with caminho.open(newline="", encoding="utf-8-sig", errors="replace") as f:
+        amostra = f.read(8192)
+        f.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters="|;,\t")
+        except csv.Error:
+            dialeto = _PontoEVirgula
+        leitor = csv.reader(f, dialeto)
+        cabecalho = [c.strip().lower() for c in next(leitor, [])]
+        if "codigo" not in cabecalho:
+            raise RuntimeError(f"{caminho.name}: falta a coluna 'codigo' no cabeçalho.")
+        idx = {c: i for i, c in enumerate(cabecalho) if c in CAMPOS}
+        if not idx:
+            raise RuntimeError(f"{caminho.name}: nenhuma coluna editável ({', '.join(CAMPOS)}).")
+        i_cod = cabecalho.index("codigo")
+        for n, linha in enumerate(leitor, start=2):
+            if not linha or i_cod >= len(linha) or not linha[i_cod].strip():
+                continue
+            novos = {c: linha[i].strip() for c, i in idx.items() if i < len(linha) and linha[i].strip()}
+            if novos:
+                yield n, linha[i_cod].strip(), novos
+
+# ======================
+# comparação de valores
+# ======================
+def _numero(s):
+    s = str(s or "").strip().replace("%", "").replace(" ", "")
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+def _booleano(s):
+    return str(s or "").strip().lower() in ("sim", "s", "true", "verdadeiro", "1", "x")
+
+def mesmo_valor(campo, atual, novo):
+    if campo == "aliquota":
+        a, b = _numero(atual), _numero(novo)
+        if a is not None and b is not None:
+            return abs(a - b) < 0.005
+    if campo == "nao_exibir_no_cardapio":
+        return _booleano(atual) == _booleano(novo)
+    return str(atual or "").strip() == str(novo or "").strip()
+
+# ======================
+# leitura / escrita
+# ======================
+LEITORES = {
+    "nome": lambda prod: prod.nameis(),
+    "aliquota": lambda prod: prod.aliquotais(),
+    "nao_exibir_no_cardapio": lambda prod: ler_nao_exibir_no_cardapio(prod.driver),
+}
+
+def _digitar(driver, el, valor):
+    """Substitui o conteúdo do input como um usuário (respeita máscaras do editor) e sai do campo."""
+    if el is None:
+        raise RuntimeError("campo não encontrado no edit form")
+    driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
+    el.click()
+    el.send_keys(Keys.CONTROL, "a")
+    el.send_keys(Keys.DELETE)
+    el.send_keys(valor)
+    el.send_keys(Keys.TAB)
+
+def escrever_nome(prod, valor):
+    _digitar(prod.driver, prod.wait.until(EC.visibility_of_element_located((By.ID, "NomeProduto"))), valor)
+
+def escrever_aliquota(prod, valor):
+    _digitar(prod.driver, prod.input_aliquota(), valor)
+
+def escrever_nao_exibir(prod, valor):
+    """Marca/desmarca 'Não exibir no cardápio' (widget Dojo ou clique no input)."""
+    ok = prod.driver.execute_script("""
+        var alvo = arguments[0];
+        try {
+            if (window.dijit && dijit.byId) {
+                var w = dijit.byId('NaoExibirNoCardapio');
+                if (w && typeof w.set === 'function') { w.set('checked', alvo); return true; }
+            }
+        } catch(e) {}
+        var input = document.getElementById('NaoExibirNoCardapio') ||
+                    document.querySelector("input[name='NaoExibirNoCardapio']");
+        if (!input) return false;
+        if (!!input.checked !== alvo) input.click();
+        return true;
+    """, _booleano(valor))
+    if not ok:
+        raise RuntimeError("checkbox 'Não exibir no cardápio' não encontrado")
+
+ESCRITORES = {
+    "nome": escrever_nome,
+    "aliquota": escrever_aliquota,
+    "nao_exibir_no_cardapio": escrever_nao_exibir,
+}
+
+def salvar_edicao(driver, timeout=30):
+    """Salva o edit form, confirma o modal (se houver) e espera voltar à lista."""
+    if nisclickable(driver, "salvar", timeout=6):
+        clicar(driver, "salvar", timeout=6)
+    else:
+        driver.execute_script("try { runInSession('saveItem()'); } catch(e) {}")
+    waitingpanel(driver, timeout=timeout, tag="salvar")
+    clicar_botao_modal(driver, "OK", "Sim", "Yes", "Confirmar", espera=2)
+    try:
+        esperar_resultado_visivel(driver, timeout=timeout)
+    except Exception:
+        raise RuntimeError("a edição não voltou para a lista depois de salvar (erro de validação?)")
+
+def abrir_produto(driver, codigo):
+    """Filtra a grid por '[Codigo] = codigo' e abre a edição. None se o código não existe."""
+    filtrar_por_codigo(driver, "=", codigo)
+    linhas = chaves_da_pagina(driver)
+    if not linhas:
+        return None
+    abrir_edicao(driver, linhas[0][0])
+    prod = ExtrairProduto(driver)
+    aberto = prod.codigois()
+    if not _mesma_chave(aberto, codigo):
+        fechar_edicao(driver)
+        raise ChaveDivergente(f"esperava código {codigo}, abriu {aberto!r}")
+    return prod
+
+def atualizar_produto(driver, codigo, novos, aplicar=False):
+    """
+    Abre o produto, compara com 'novos' e, se aplicar=True, altera o que difere,
+    salva e reabre para conferir. Retorna as linhas (codigo, campo, atual, novo, resultado).
+    """
+    prod = abrir_produto(driver, codigo)
+    if prod is None:
+        return [(codigo, c, "", v, "nao_encontrado") for c, v in novos.items()]
+    atuais = {c: LEITORES[c](prod) for c in novos}
+    mudar = {c: v for c, v in novos.items() if not mesmo_valor(c, atuais[c], v)}
+
+    if not (aplicar and mudar):
+        fechar_edicao(driver)
+        waitingpanel(driver, timeout=10, tag="pos-ler")
+    else:
+        for c, v in mudar.items():
+            ESCRITORES[c](prod, v)
+        salvar_edicao(driver)
+        waitingpanel(driver, timeout=10, tag="pos-salvar")
+
+        # conferência: reabre e lê o que ficou gravado
+        prod = abrir_produto(driver, codigo)
+        if prod is None:
+            raise ChaveDivergente(f"código {codigo} sumiu da grid depois de salvar")
+        gravados = {c: LEITORES[c](prod) for c in mudar}
+        fechar_edicao(driver)
+        waitingpanel(driver, timeout=10, tag="pos-conferir")
+        erradas = [c for c, v in mudar.items() if not mesmo_valor(c, gravados[c], v)]
+        if erradas:
+            raise ValorNaoGravado("; ".join(f"{c}: pedido {mudar[c]!r}, gravado {gravados[c]!r}" for c in erradas))
+
+    feito = "alterado" if aplicar else "alterar"
+    return [(codigo, c, atuais[c], v, feito if c in mudar else "igual") for c, v in novos.items()]
+
+# ======================
+# lote
+# ======================
+def atualizar_registros(driver, alteracoes, aplicar=False, saida=None, checkpoint=None):
+    """
+    Processa o iterável de (linha, codigo, novos) sem prompts. As linhas de resultado
+    vão sendo acrescentadas em 'saida' (uma queda não perde o que já foi feito) e, com
+    'checkpoint', a linha da entrada até onde tudo foi concluído é gravada para retomar
+    depois (nunca passa de uma linha que ainda espera retry).
+    Falhas vão para a fila de retry. Retorna (resultados, falhas).
+    """
+    continua_drive(driver)
+    waitingpanel(driver, 4, "ini")
+
+    inicio = int(ler_checkpoint(checkpoint) or 0) if checkpoint else 0
+    if inicio:
+        log.info("retomando depois da linha %d da entrada (checkpoint)", inicio)
+    if saida is not None and not inicio:
+        salvar_csv(saida, [], escrever_cabecalho=True, overwrite=True, cabecalho=CABECALHO_SAIDA)
+
+    resultados = []
+    pedidos = {}
+    fila = FilaRetry(max_tentativas=MAX_TENTATIVAS, backoff=BACKOFF_RETRY)
+
+    def registrar(linhas):
+        resultados.extend(linhas)
+        if saida is not None:
+            salvar_csv(saida, linhas, escrever_cabecalho=False, overwrite=False, cabecalho=CABECALHO_SAIDA)
+        for lin in linhas:
+            if lin[4] != "igual":
+                log.info("%s %s: %r -> %r (%s)", lin[0], lin[1], lin[2], lin[3], lin[4])
+
+    def processar(item):
+        n, codigo = item
+        with contexto(linha=n, codigo=codigo):
+            try:
+                return atualizar_produto(driver, codigo, pedidos[item], aplicar)
+            except Exception:
+                recuperar_tela(driver)
+                raise
+
+    def marcar(n):
+        # retomada começa na menor linha ainda sem resultado (na fila de retry ou falha)
+        abertas = [item[0] - 1 for item, _, _ in fila.pendentes() + fila.falhas]
+        gravar_checkpoint(min([n] + abertas), checkpoint)
+
+    falhas_seguidas = 0
+    try:
+        for n, codigo, novos in alteracoes:
+            if n <= inicio:
+                continue
+            item = (n, codigo)
+            pedidos[item] = novos
+            try:
+                linhas = processar(item)
+            except Exception as e:
+                falhas_seguidas += 1
+                fila.adicionar(item, e)
+                log.warning("falha no código %s (%s: %s); enfileirado para retry", codigo, type(e).__name__, e)
+                if falhas_seguidas >= MAX_FALHAS_SEGUIDAS:
+                    raise RuntimeError(f"{falhas_seguidas} falhas seguidas; abortando o lote.") from e
+            else:
+                falhas_seguidas = 0
+                registrar(linhas)
+            if checkpoint:
+                marcar(n)
+
+        if len(fila):
+            log.info("reprocessando %d produto(s) que falharam", len(fila))
+        for _, linhas in fila.drenar(processar):
+            registrar(linhas)
+    finally:
+        try:
+            filtrar_por_codigo(driver, ">", None)  # limpa o filtro
+        except Exception:
+            pass
+        if fila.salvar_falhas(SAIDA_FALHAS, ("linha", "codigo"), incluir_pendentes=True):
+            log.warning("%d produto(s) não processados; veja %s",
+                        len(fila.falhas) + len(fila.pendentes()), SAIDA_FALHAS.resolve())
+
+    if checkpoint:
+        limpar_checkpoint(checkpoint)
+    return resultados, fila.falhas
+
+# ======================
+# Execução principal
+# ======================
+def executar(driver):
+    if not ENTRADA.exists():
+        log.error("arquivo de entrada não encontrado: %s (colunas: codigo|%s)", ENTRADA.resolve(), "|".join(CAMPOS))
+        input("Pressione Enter para fechar...")
+        return
+
+    aplicar = not DRY_RUN
+    saida = SAIDA_RESULTADO if aplicar else SAIDA_DIFF
+    log.info("%s: %s", "APLICANDO alterações" if aplicar else "dry-run (nada será salvo)", ENTRADA.name)
+
+    t0 = time.time()
+    resultados, falhas = atualizar_registros(
+        driver, ler_alteracoes(ENTRADA), aplicar=aplicar, saida=saida,
+        checkpoint=CHECKPOINT if aplicar else None,
+    )
+
+    cont = {}
+    for lin in resultados:
+        cont[lin[4]] = cont.get(lin[4], 0) + 1
+    log.info("concluído em %.0fs: %s; %d falha(s). Detalhes em %s", time.time() - t0,
+             ", ".join(f"{k}={v}" for k, v in sorted(cont.items())) or "nada a fazer",
+             len(falhas), saida.resolve())
+
+    input("Pressione Enter para fechar...")
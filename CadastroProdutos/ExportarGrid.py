@@ -0,0 +1,269 @@
+# CadastroProdutos/ExportarGrid.py
+# importa o catálogo pela exportação nativa da grid (XLSX/CSV) em vez de abrir produto a produto
+from pathlib import Path
+import csv
+import time
+import unicodedata
+
+from CadastroProdutos._fila_retry import FilaRetry
+from CadastroProdutos._log import get_logger, contexto
+from CadastroProdutos.ExtrairAliquota import (
+    ExtrairProduto, ler_nao_exibir_no_cardapio, continua_drive, waitingpanel,
+    filtrar_por_codigo, chaves_da_pagina, abrir_edicao, fechar_edicao, recuperar_tela,
+    salvar_csv_com_prompt, MAX_TENTATIVAS, BACKOFF_RETRY, CAMPOS_BASE, CAMPOS_LOOKUP,
+)
+
+log = get_logger(__name__)
+
+PASTA_DOWNLOAD   = Path(__file__).parent / "downloads"
+FORMATO_EXPORT   = "Xlsx"      # "Xlsx" ou "Csv" (ASPxClientGridViewExportFormat)
+TIMEOUT_DOWNLOAD = 300         # s; o export do catálogo inteiro é uma resposta só do servidor
+CAMPOS = CAMPOS_BASE   # colunas do CSV gerado (sem as de CAMPOS_LOOKUP)
+
+# cabeçalhos aceitos para cada campo (comparados sem acento/caixa/pontuação)
+CABECALHOS = {
+    "codigo":   ("codigo", "cod", "cod produto", "codigo produto", "codigo do produto"),
+    "nome":     ("nome", "nome produto", "nome do produto", "descricao", "produto"),
+    "aliquota": ("aliquota", "aliquota icms", "aliquota icms efetivo", "aliquota efetiva", "icms efetivo"),
+    "nao_exibir_no_cardapio": ("nao exibir no cardapio", "nao exibir cardapio", "oculto no cardapio"),
+}
+
+# ======================
+# helpers de texto
+# ======================
+def _norm(s):
+    s = unicodedata.normalize("NFD", str(s or "")).encode("ascii", "ignore").decode().lower()
+    return " ".join("".join(c if c.isalnum() else " " for c in s).split())
+
+def _mapear_cabecalho(cabecalho):
+    """índice da coluna de cada campo (ou ausente se a exportação não tem o campo)."""
+    idx = {}
+    norm = [_norm(c) for c in cabecalho]
+    for campo, nomes in CABECALHOS.items():
+        for i, c in enumerate(norm):
+            if c in nomes:
+                idx[campo] = i
+                break
+    return idx
+
+def _texto(campo, v):
+    """Valor da planilha -> mesmo formato de texto que a extração pela UI produz."""
+    if v is None:
+        return ""
+    if campo == "nao_exibir_no_cardapio":
+        return "sim" if _norm(v) in ("sim", "s", "true", "verdadeiro", "1", "x") else "não"
+    if isinstance(v, float):
+        if campo == "codigo" and v.is_integer():
+            return str(int(v))
+        if campo == "aliquota":
+            return f"{v:.2f}".replace(".", ",")
+    return str(v).strip()
+
+# ======================
+# leitura em streaming
+# ======================
+def _linhas_xlsx(caminho: Path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para ler a exportação XLSX instale o openpyxl (pip install openpyxl).")
+    wb = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        for linha in wb.active.iter_rows(values_only=True):
+            yield linha
+    finally:
+        wb.close()
+
+class _PontoEVirgula(csv.excel):
+    delimiter = ";"
+
+def _linhas_csv(caminho: Path):
+    with caminho.open(newline="", encoding="utf-8-sig", errors="replace") as f:
+        amostra = f.read(8192)
+        f.seek(0)
+        try:
+            dialeto = csv.Sniffer().sniff(amostra, delimiters=";,|\t")
+        except csv.Error:
+            dialeto = _PontoEVirgula
+        yield from csv.reader(f, dialeto)
+
+def ler_exportacao(caminho: Path):
+    """
+    Lê o arquivo exportado linha a linha (openpyxl read-only para XLSX) e gera
+    (campos_presentes, registro) com registro = (codigo, nome, aliquota, nao_exibir);
+    campos que a exportação não traz vêm como None.
+    """
+    linhas = _linhas_xlsx(caminho) if caminho.suffix.lower() in (".xlsx", ".xlsm") else _linhas_csv(caminho)
+    idx = None
+    for linha in linhas:
+        if idx is None:
+            # pula títulos/linhas em branco até achar o cabeçalho com a coluna de código
+            idx = _mapear_cabecalho(linha or ())
+            if "codigo" not in idx:
+                idx = None
+            continue
+        if not linha or all(v in (None, "") for v in linha):
+            continue
+        reg = tuple(
+            _texto(campo, linha[idx[campo]]) if campo in idx and idx[campo] < len(linha) else None
+            for campo in CAMPOS
+        )
+        if reg[0]:
+            yield frozenset(idx), reg
+    if idx is None:
+        raise RuntimeError(f"Cabeçalho com a coluna de código não encontrado em {caminho.name}.")
+
+# ======================
+# exportação + download
+# ======================
+def preparar_download(driver, pasta: Path):
+    pasta.mkdir(parents=True, exist_ok=True)
+    driver.execute_cdp_cmd("Browser.setDownloadBehavior", {
+        "behavior": "allow", "downloadPath": str(pasta.resolve()),
+    })
+
+def disparar_exportacao(driver, formato=FORMATO_EXPORT):
+    """Pede o export à grid: API cliente (ExportTo) ou, sem ela, o botão de exportar da toolbar."""
+    via = driver.execute_script(r"""
+        var fmt = arguments[0];
+        try {
+            if (window.dataGrid && dataGrid.ExportTo) {
+                var f = (window.ASPxClientGridViewExportFormat && ASPxClientGridViewExportFormat[fmt]) || fmt;
+                dataGrid.ExportTo(f);
+                return 'api';
+            }
+        } catch(e) {}
+        function norm(s){ return (s || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '').toLowerCase(); }
+        var alvo = new RegExp(fmt.toLowerCase() === 'csv' ? 'csv' : 'xlsx|excel', 'i');
+        var cands = document.querySelectorAll('[id^="toolBar"] a, [id^="toolBar"] li, [id*="Export"], [title]');
+        var fallback = null;
+        for (var i = 0; i < cands.length; i++) {
+            var el = cands[i];
+            if (!(el.offsetWidth || el.offsetHeight)) continue;
+            var txt = norm((el.id || '') + ' ' + (el.title || '') + ' ' + el.textContent);
+            if (!/export/.test(txt) && !alvo.test(txt)) continue;
+            if (alvo.test(txt)) { el.click(); return 'toolbar:' + (el.id || el.title); }
+            fallback = fallback || el;
+        }
+        if (fallback) { fallback.click(); return 'toolbar:' + (fallback.id || fallback.title); }
+        return null;
+    """, formato)
+    if not via:
+        raise RuntimeError("Não achei como exportar a grid (sem dataGrid.ExportTo nem botão de exportar).")
+    log.info("exportação disparada via %s", via)
+    return via
+
+def pasta_da_execucao(base: Path = PASTA_DOWNLOAD):
+    """Subpasta vazia só desta exportação: o que aparecer nela é o arquivo baixado agora."""
+    pasta = base / time.strftime("%Y%m%d-%H%M%S")
+    n = 1
+    while pasta.exists():
+        n += 1
+        pasta = base / f"{time.strftime('%Y%m%d-%H%M%S')}-{n}"
+    return pasta
+
+def esperar_download(pasta: Path, antes=frozenset(), timeout=TIMEOUT_DOWNLOAD):
+    """
+    Espera o arquivo do export terminar de baixar: observa a pasta até surgir um
+    arquivo fora de 'antes', sem .crdownload e com tamanho estável. (Os eventos
+    Browser.download* do CDP não chegam ao log de performance do chromedriver.)
+    """
+    fim = time.time() + timeout
+    ultimo_tam = {}
+    while time.time() < fim:
+        novos = [p for p in pasta.iterdir()
+                 if p.name not in antes and p.suffix.lower() not in (".crdownload", ".tmp")]
+        for p in novos:
+            tam = p.stat().st_size
+            if tam > 0 and ultimo_tam.get(p.name) == tam and not (pasta / (p.name + ".crdownload")).exists():
+                return p
+            ultimo_tam[p.name] = tam
+        time.sleep(0.5)
+    raise TimeoutError(f"Exportação não terminou de baixar em {timeout}s.")
+
+# ============================================
+# campos que a exportação não traz: pela UI
+# ============================================
+def completar_pela_ui(driver, registros, faltando):
+    """
+    Para campos ausentes na exportação, abre cada produto pelo filtro
+    '[Codigo] = x' (mesmo caminho do modo keyset) e lê só esses campos.
+    """
+    leitores = {
+        "nome": lambda prod: prod.nameis(),
+        "aliquota": lambda prod: prod.aliquotais(),
+        "nao_exibir_no_cardapio": lambda prod: ler_nao_exibir_no_cardapio(prod.driver),
+    }
+    pos = [CAMPOS.index(c) for c in faltando]
+    fila = FilaRetry(max_tentativas=MAX_TENTATIVAS, backoff=BACKOFF_RETRY)
+
+    def completar(i):
+        codigo = registros[i][0]
+        with contexto(codigo=codigo):
+            try:
+                filtrar_por_codigo(driver, "=", codigo)
+                linhas = chaves_da_pagina(driver)
+                if not linhas:
+                    raise RuntimeError(f"código {codigo} não encontrado na grid")
+                abrir_edicao(driver, linhas[0][0])
+                prod = ExtrairProduto(driver)
+                valores = {c: leitores[c](prod) for c in faltando}
+                fechar_edicao(driver)
+                waitingpanel(driver, timeout=10, tag="pos-completar")
+            except Exception:
+                recuperar_tela(driver)
+                raise
+        reg = list(registros[i])
+        for c, j in zip(faltando, pos):
+            reg[j] = valores[c]
+        registros[i] = tuple(reg)
+
+    for i in range(len(registros)):
+        try:
+            completar(i)
+        except Exception as e:
+            fila.adicionar(i, e)
+            log.warning("falha ao completar pela UI (%s: %s)", type(e).__name__, e,
+                        extra={"codigo": registros[i][0]})
+    for _ in fila.drenar(completar):
+        pass
+    for i, n, erro in fila.falhas:
+        log.error("não consegui completar o código %s pela UI: %s", registros[i][0], erro)
+
+    filtrar_por_codigo(driver, ">", None)  # limpa o filtro
+
+# ======================
+# Execução principal
+# ======================
+def executar(driver):
+    saida_default = Path(__file__).parent / "aliquotas_export.csv"
+    if CAMPOS_LOOKUP:
+        log.warning("CAMPOS_LOOKUP (%s) não vem na exportação; o CSV sai só com %s",
+                    ", ".join(CAMPOS_LOOKUP), ", ".join(CAMPOS))
+
+    continua_drive(driver)
+    waitingpanel(driver, 4, "ini")
+
+    # pasta nova por execução: um export anterior (ou o "X (1).xlsx" do Chrome) não é confundido
+    pasta = pasta_da_execucao()
+    preparar_download(driver, pasta)
+
+    t0 = time.time()
+    disparar_exportacao(driver)
+    arquivo = esperar_download(pasta)
+    log.info("exportação baixada em %.1fs: %s", time.time() - t0, arquivo.name)
+
+    presentes, registros = frozenset(), []
+    for presentes, reg in ler_exportacao(arquivo):
+        registros.append(reg)
+    log.info("%d produtos lidos da exportação", len(registros))
+
+    faltando = [c for c in CAMPOS if c not in presentes]
+    if faltando and registros:
+        log.info("exportação não traz %s; completando produto a produto pela UI", ", ".join(faltando))
+        completar_pela_ui(driver, registros, faltando)
+
+    registros = [tuple("" if v is None else v for v in reg) for reg in registros]
+    salvar_csv_com_prompt(driver, saida_default, registros, cabecalho=CAMPOS)
+
+    input("Pressione Enter para fechar...")
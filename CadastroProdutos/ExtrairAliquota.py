@@ -5,61 +5,132 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from pathlib import Path
+import contextlib
 import csv
+import threading
 import time
 
+from CadastroProdutos._capturas import ArquivoCapturas, JS_CAPTURA
+from CadastroProdutos._cassete import gravando, gravar
+from CadastroProdutos._cdp import executor_da_sessao
+from CadastroProdutos._comandos import instrumentar
+from CadastroProdutos._fila_retry import FilaRetry
+from CadastroProdutos._js import chamar
+from CadastroProdutos._log import get_logger, contexto
+from CadastroProdutos._lookup import cache_da_sessao
+from CadastroProdutos._metricas import METRICAS, rss_navegador, servir
+from CadastroProdutos._parquet import EscritorParquet
+from CadastroProdutos._paralelo import ControladorAIMD, executar_paralelo, fabrica_sessao
+from CadastroProdutos._reciclagem import reciclador_da_sessao
+from CadastroProdutos._rede import tracar
+
+log = get_logger(__name__)
+
 MAX_PAGES = 140  # limite de páginas a varrer
 
+# percurso da grid:
+#   "offset" -> pelo índice global g (sensível a inclusões/exclusões durante a execução)
+#   "chave"  -> keyset: grid ordenada por código e lotes filtrados por "código > último visto"
+MODO_PERCURSO = "offset"
+CAMPO_CODIGO  = "Codigo"   # FieldName da coluna de código na dataGrid
+ROTULO_CODIGO = "Código"   # cabeçalho da coluna de código (para ler a chave da linha)
+CHECKPOINT    = Path(__file__).parent / "aliquotas.checkpoint"  # último código confirmado (modo "chave")
+
+# campos de dropdown da aba Dados Fiscais: coluna do CSV -> id do widget (select/dijit/ASPx).
+# O texto sai do cache de opções da sessão (_lookup), carregado uma vez por widget.
+#   ex.: {"ncm": "CodigoNcm", "cst": "CodigoCst", "cfop": "CodigoCfop", "grupo_tributario": "GrupoTributario"}
+CAMPOS_LOOKUP = {}
+
+# colunas que todo modo produz (captura e exportação nativa só têm estas)
+CAMPOS_BASE   = ("codigo", "nome", "aliquota", "nao_exibir_no_cardapio")
+CABECALHO_CSV = CAMPOS_BASE + tuple(CAMPOS_LOOKUP)
+
+# reprocessamento de linhas que falharem
+MAX_TENTATIVAS      = 3    # por linha (1ª passada + retries)
+BACKOFF_RETRY       = 2.0  # segundos; dobra a cada tentativa
+MAX_FALHAS_SEGUIDAS = 10   # muitas falhas em sequência = sessão quebrada, aborta
+
+# extração:
+#   "campos"  -> lê os campos no navegador e grava o CSV (padrão)
+#   "captura" -> só grava o HTML do edit form em ARQUIVO_CAPTURAS; o parse roda depois, offline:
+#                python -m CadastroProdutos._capturas aliquotas.capturas.gz
+MODO_EXTRACAO    = "campos"
+ARQUIVO_CAPTURAS = Path(__file__).parent / "aliquotas.capturas.gz"
+
+# saída colunar opcional, além do CSV: Parquet tipado (zstd, dicionário nas colunas de
+# poucos valores) gravado em lotes durante a execução. Precisa do pyarrow.
+SAIDA_PARQUET = None  # ex.: Path(__file__).parent / "aliquotas.parquet" (None = só CSV)
+
+# grava cada comando WebDriver e a resposta numa cassete, para reproduzir a execução sem
+# navegador (CadastroProdutos._cassete.DriverReplay) e testar/perfilar a lógica em ms
+GRAVAR_CASSETE = None  # ex.: Path(__file__).parent / "aliquotas.cassete.gz" (None = desligado)
+
+# contagem de comandos WebDriver (round-trips ao chromedriver) por produto
+INSTRUMENTAR_COMANDOS = False
+ORCAMENTO_COMANDOS    = None  # máx. de comandos por produto; acima disso loga aviso (None = só mede)
+
+# endpoint de métricas (Prometheus) durante a execução: http://127.0.0.1:<porta>/metrics
+PORTA_METRICAS = None  # ex.: 9108 (None = desligado)
+
+# scripts do laço quente (overlay, foco de linha, editItem, checkbox...) direto por CDP
+# Runtime.evaluate num websocket persistente, sem o salto HTTP pelo chromedriver.
+# Precisa do websocket-client; sem ele (ou sem CDP) segue pelo WebDriver.
+#   benchmark: python -m CadastroProdutos._cdp
+USAR_CDP = False
+
+# sessões paralelas (modo "offset", extração por campos): páginas distribuídas entre
+# navegadores; o nº de sessões ativas é ajustado por AIMD para manter a latência do
+# WaitPanel/callbacks abaixo de ALVO_LATENCIA_S. Precisa do login pelo gpt_selenium.
+MAX_SESSOES     = 1     # 1 = só o navegador atual
+ALVO_LATENCIA_S = 5.0   # p90 de WaitPanel + virada de página
+
+# reciclagem da aba: numa execução longa o heap do Dojo/DevExpress só cresce (cada edit form
+# aberto/cancelado deixa resto) e cada produto fica mais lento. Passado um limite, abre uma aba
+# nova na mesma sessão, volta para a mesma página/lote da grid e fecha a antiga.
+RECICLAR_A_CADA  = None  # produtos por aba (None = só pelos limites abaixo)
+RECICLAR_HEAP_MB = None  # JSHeapUsedSize da aba (CDP Performance.getMetrics); ex.: 512
+RECICLAR_RSS_MB  = None  # RSS do Chrome + chromedriver; ex.: 3000
+
+def js(driver, script, *args):
+    """
+    execute_script dos scripts do laço quente (pelo caminho CDP se USAR_CDP). Sessão
+    sendo gravada em cassete vai sempre pelo WebDriver: o websocket CDP não é gravado.
+    """
+    if USAR_CDP and not gravando(driver):
+        return executor_da_sessao(driver).executar(script, *args)
+    return driver.execute_script(script, *args)
+
+def lib(driver, nome, *args):
+    """window.__cadastro.<nome>(*args) da biblioteca de _js (instalada 1x por documento)."""
+    return chamar(driver, nome, *args, executar=lambda script, *a: js(driver, script, *a))
+
 # ==============================
 # helpers de overlay / waitpanel
 # ==============================
 def _overlay_visivel(driver):
     """True se o underlay/overlay do Dojo (WaitPanel) estiver ativo bloqueando cliques."""
     try:
-        return driver.execute_script("""
-            function vis(el){
-              if(!el) return false;
-              var s = getComputedStyle(el);
-              if (s.display === 'none' || s.visibility === 'hidden') return false;
-              return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
-            }
-            // wrapper do underlay
-            var wrap = document.querySelector('[id^="dijit_DialogUnderlay_"]') ||
-                       document.getElementById('dijit_DialogUnderlay_0');
-            // underlay interno
-            var ul = document.getElementById('WaitPanelDialog_underlay') ||
-                     (wrap ? wrap.querySelector('.dijitDialogUnderlay, ._underlay') : null);
-            // diálogo (redundância)
-            var dlg = document.getElementById('WaitPanelDialog');
-
-            // estado dojo, se exposto
-            var dojoOpen = false;
-            try {
-              if (window.dijit && dijit.byId) {
-                var w = dijit.byId('WaitPanelDialog');
-                if (w && typeof w.get === 'function') dojoOpen = !!w.get('open');
-              }
-            } catch(e){}
-
-            return dojoOpen || vis(wrap) || vis(ul) || vis(dlg);
-        """)
+        return lib(driver, "overlay")
     except Exception:
         return False
 
 def waitingpanel(driver, timeout=250, tag=""):
     """Espera até timeout o underlay desaparecer. Continua mesmo que estoure."""
-    print(f"DEBUG: aguardando WAITPANEL {tag} sumir (até {timeout}s)…")
-    fim = time.time() + timeout
+    log.debug("aguardando WAITPANEL sumir (até %ss)", timeout, extra={"tag": tag})
+    inicio = time.time()
+    fim = inicio + timeout
     ultimo = None
     while time.time() < fim:
         ativo = _overlay_visivel(driver)
         if ativo != ultimo:
-            print(f"DEBUG: WAITPANEL {tag} -> {'ATIVO' if ativo else 'OCULTO'}")
+            log.debug("WAITPANEL -> %s", "ATIVO" if ativo else "OCULTO", extra={"tag": tag})
             ultimo = ativo
         if not ativo:
+            METRICAS.waitpanel.observar(time.time() - inicio)
             return True
         time.sleep(0.10)
-    print(f"DEBUG: WAITPANEL {tag} ainda ativo ao fim; seguindo assim mesmo…")
+    METRICAS.waitpanel.observar(time.time() - inicio)
+    log.warning("WAITPANEL ainda ativo após %ss; seguindo assim mesmo", timeout, extra={"tag": tag})
     return False
 
 # ======================
@@ -68,19 +139,13 @@ def waitingpanel(driver, timeout=250, tag=""):
 def esperar_resultado_visivel(driver, timeout=20):
     """Garante que a aba de RESULTADO está visível (edição fechada)."""
     WebDriverWait(driver, timeout).until(
-        lambda d: d.execute_script(
-            "var e=document.getElementById('tabPanelEdition'), r=document.getElementById('tabPanelResult');"
-            "return e && getComputedStyle(e).display=='none' && r && getComputedStyle(r).display!='none';"
-        )
+        lambda d: lib(d, "resultadoVisivel")
     )
 
 def esperar_edicao_visivel(driver, timeout=20):
     """Garante que a aba de EDIÇÃO está visível (edit form aberto)."""
     WebDriverWait(driver, timeout).until(
-        lambda d: d.execute_script(
-            "var e=document.getElementById('tabPanelEdition');"
-            "return e && getComputedStyle(e).display!='none';"
-        )
+        lambda d: lib(d, "edicaoVisivel")
     )
     WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.ID, "tabPanelEditionContainer")))
 
@@ -93,46 +158,27 @@ def continua_drive(driver, timeout=20):
         EC.visibility_of_element_located((By.ID, "tabPanelResultContainer"))
     )
     # pelo menos 1 linha carregada
-    WebDriverWait(driver, timeout).until(
-        lambda d: d.execute_script("""
-            var rc = document.getElementById('tabPanelResultContainer');
-            if (!rc) return false;
-            var tbl = rc.querySelector('.dxgvTable,[id^="dataGrid_DXMainTable"]');
-            if (!tbl) return false;
-            var rows = tbl.querySelectorAll('tr[id^="dataGrid_DXDataRow"], tr.dxgvDataRow');
-            return rows.length >= 1;
-        """)
-    )
+    WebDriverWait(driver, timeout).until(lambda d: lib(d, "linhasCarregadas"))
 
 # ============================
 # modal (Sim/Não) robusto
 # ============================
-def clicar_botao_modal(driver, *rotulos):
-    """
-    Clica em um botão/ancora com texto entre 'rotulos' dentro da ÚLTIMA modal visível.
-    Ex.: clicar_botao_modal(driver, 'Sim', 'Yes', 'OK', 'Confirmar')
-    """
-    roots = [
-        "//div[contains(@class,'bootbox') and contains(@class,'modal') and (contains(@class,'in') or contains(@style,'display: block'))][last()]",
-        "//div[contains(@class,'modal') and (contains(@class,'in') or contains(@style,'display: block'))][last()]",
-        "//body"
-    ]
-    for root in roots:
-        for rot in rotulos:
-            xp = (
-                f"{root}//*[self::button or self::a]"
-                f"[normalize-space()='{rot}' or "
-                f" contains(translate(.,"
-                f"'ABCDEFGHIJKLMNOPQRSTUVWXYZÁÀÂÃÉÊÍÓÔÕÚÇ',"
-                f"'abcdefghijklmnopqrstuvwxyzáàâãéêíóôõúç'),"
-                f" '{rot.lower()}')]"
-            )
-            try:
-                WebDriverWait(driver, 6).until(EC.element_to_be_clickable((By.XPATH, xp))).click()
-                return True
-            except Exception:
-                pass
-    return False
+def clicar_botao_modal(driver, *rotulos, espera=0.0):
+    """
+    Clica em um botão/ancora com texto entre 'rotulos' dentro da modal visível do topo.
+    Tudo numa chamada JS (__cadastro.modal): acha a bootbox/modal de maior z-index, o
+    botão (texto exato antes de 'contém', sem acento/caixa) e clica. Sem modal aberta
+    retorna False na hora; 'espera' (s) dá tempo à modal de aparecer (animação do bootstrap).
+    Ex.: clicar_botao_modal(driver, 'Sim', 'Yes', 'OK', 'Confirmar', espera=2)
+    """
+    try:
+        res = lib(driver, "modal", list(rotulos), int(espera * 1000))
+    except Exception as e:
+        log.debug("modal: erro no script (%s)", e)
+        return False
+    if res != "clicado":
+        log.debug("modal: %s", res, extra={"rotulos": list(rotulos)})
+    return res == "clicado"
 
 # ============================
 # resolutores / click helpers
@@ -141,10 +187,7 @@ def nisclickable(driver, n, g=None, timeout=12):
     """verifica se 'n' está clicável (True/False)."""
     try:
         if n.lower() in ("linha", "linha da grid"):
-            driver.execute_script(
-                "try{ if(window.dataGrid){ dataGrid.SetFocusedRowIndex(arguments[0]); } }catch(e){}",
-                int(g)
-            )
+            lib(driver, "focarLinha", int(g), False)
             return True
         if n.lower() in ("editar", "btn editar"):
             return True
@@ -162,6 +205,8 @@ def _resolver_locator(n):
         return (By.CSS_SELECTOR, "a[href='#dadosFiscais'], [data-target='#dadosFiscais']")
     if n_low in ("cancelar", "btn cancelar"):
         return (By.ID, "toolBarCancelItem")
+    if n_low in ("salvar", "btn salvar"):
+        return (By.ID, "toolBarSaveItem")
     raise ValueError(f"Alvo '{n}' não mapeado para locator direto.")
 
 def clicar(driver, n, g=None, timeout=15):
@@ -169,20 +214,15 @@ def clicar(driver, n, g=None, timeout=15):
     Clica/aciona o alvo 'n'.
     - 'linha': foca via API (evita stale). Opcionalmente tenta clicar o <tr>.
     - 'editar': foca g e dispara runInSession('editItem()').
-    - demais: usa locator + clique normal/JS.
+    - demais: usa locator + a estratégia que funcionou da última vez para o alvo;
+      se ela falhar, a cadeia completa (nativo esperando clicável -> JS -> Enter).
     """
     n_low = (n or "").strip().lower()
     waitingpanel(driver, timeout=min(12, timeout), tag=f"antes-de-clicar-{n}")
 
     if n_low in ("linha", "linha da grid"):
         try:
-            driver.execute_script(
-                "try{ if(window.dataGrid){"
-                " dataGrid.SetFocusedRowIndex(arguments[0]);"
-                " if(dataGrid.SelectRow) dataGrid.SelectRow(arguments[0]);"
-                "}}catch(e){}",
-                int(g)
-            )
+            lib(driver, "focarLinha", int(g), True)
         except Exception:
             pass
         try:
@@ -203,32 +243,59 @@ def clicar(driver, n, g=None, timeout=15):
 
     if n_low in ("editar", "btn editar"):
         try:
-            if g is not None:
-                driver.execute_script(
-                    "try{ if(window.dataGrid){ dataGrid.SetFocusedRowIndex(arguments[0]); } }catch(e){}",
-                    int(g)
-                )
-            driver.execute_script("try { runInSession('editItem()'); } catch(e) {}")
+            lib(driver, "editar", None if g is None else int(g))
             return
         except Exception:
             pass
 
     by, sel = _resolver_locator(n_low)
     elem = WebDriverWait(driver, timeout).until(EC.presence_of_element_located((by, sel)))
-    try:
+
+    # 1) estratégia que funcionou da última vez para este alvo, sem as esperas da cadeia
+    aprendida = _ESTRATEGIAS.get(n_low)
+    if aprendida:
+        t0 = time.perf_counter()
         try:
-            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
-        except Exception:
-            pass
-        WebDriverWait(driver, 5).until(EC.element_to_be_clickable((by, sel))).click()
-    except Exception:
+            _CLIQUES[aprendida[0]](driver, by, sel, elem, esperar=False)
+            _ESTRATEGIAS[n_low] = (aprendida[0], time.perf_counter() - t0)
+            return
+        except Exception as e:
+            log.debug("clique '%s' por %s falhou (%s); refazendo a cadeia", n_low, aprendida[0], type(e).__name__)
+            _ESTRATEGIAS.pop(n_low, None)
+
+    # 2) cadeia completa: nativo (esperando clicável) -> JS -> Enter; guarda a que funcionou
+    for nome in ("nativo", "js", "enter"):
+        t0 = time.perf_counter()
         try:
-            driver.execute_script("arguments[0].click();", elem)
+            _CLIQUES[nome](driver, by, sel, elem, esperar=True)
         except Exception:
-            try:
-                elem.send_keys("\n")
-            except Exception:
-                pass
+            continue
+        _ESTRATEGIAS[n_low] = (nome, time.perf_counter() - t0)
+        return
+
+# ----- estratégias de clique (por alvo, aprendidas em clicar) -----
+def _clique_nativo(driver, by, sel, elem, esperar=True):
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", elem)
+    except Exception:
+        pass
+    if esperar:
+        WebDriverWait(driver, 5).until(EC.element_to_be_clickable((by, sel))).click()
+    else:
+        elem.click()
+
+def _clique_js(driver, by, sel, elem, esperar=True):
+    driver.execute_script("arguments[0].click();", elem)
+
+def _clique_enter(driver, by, sel, elem, esperar=True):
+    elem.send_keys("\n")
+
+_CLIQUES = {"nativo": _clique_nativo, "js": _clique_js, "enter": _clique_enter}
+_ESTRATEGIAS = {}   # alvo -> (estratégia que funcionou por último, segundos que levou)
+
+def estrategias_de_clique():
+    """Cópia do que clicar() aprendeu: {alvo: (estratégia, segundos)}."""
+    return dict(_ESTRATEGIAS)
 
 # ============================
 # Lê "Não exibir no cardápio"
@@ -239,46 +306,52 @@ def ler_nao_exibir_no_cardapio(driver):
     Tenta várias formas: widget Dojo, input.checked, aria-checked, classe do contêiner, atributo 'checked'.
     """
     try:
-        return driver.execute_script("""
-            // tenta input por id/name
-            var input = document.getElementById('NaoExibirNoCardapio') ||
-                        document.querySelector("input[name='NaoExibirNoCardapio']");
-            var cont = input ? (input.closest('.dijitCheckBox') || input.parentElement) : null;
-
-            // 1) Dojo (dijit)
-            try {
-                if (window.dijit && dijit.byId) {
-                    var w = dijit.byId('NaoExibirNoCardapio');
-                    if (w && typeof w.get === 'function') {
-                        return w.get('checked') ? 'sim' : 'não';
-                    }
-                }
-            } catch(e) {}
-
-            // 2) Propriedade checked do input
-            if (input && typeof input.checked !== 'undefined')
-                return input.checked ? 'sim' : 'não';
-
-            // 3) Atributo aria-checked
-            if (input) {
-                var ac = (input.getAttribute('aria-checked') || '').toLowerCase();
-                if (ac === 'true')  return 'sim';
-                if (ac === 'false') return 'não';
-            }
-
-            // 4) Classe do container Dojo
-            if (cont && /\bdijitCheckBoxChecked\b/.test(cont.className))
-                return 'sim';
-
-            // 5) Atributo "checked" puro
-            if (input && input.getAttribute('checked') !== null)
-                return 'sim';
-
-            return 'não';
-        """)
+        return lib(driver, "checkbox", "NaoExibirNoCardapio")
     except Exception:
         return 'não'
 
+# ==================================
+# campos em abas ocultas (sem trocar)
+# ==================================
+def ler_campos_ocultos(driver, *ids):
+    """
+    Valor de cada campo do edit form pelo id (ou name), numa chamada só e mesmo com
+    a aba dele oculta. None para os que ainda não estão no DOM (aba carregada sob
+    demanda): só nesses casos vale ativar a aba.
+    """
+    return lib(driver, "campos", list(ids))
+
+# ============================
+# abrir / fechar a edição
+# ============================
+def abrir_edicao(driver, g):
+    """Foca a linha g e abre o edit form (com um retry leve)."""
+    if not nisclickable(driver, "linha", g=g, timeout=12):
+        log.debug("não consegui focar a linha; tentando assim mesmo")
+    clicar(driver, "linha", g=g, timeout=12)
+    clicar(driver, "editar", g=g, timeout=12)
+
+    # garantir que a EDIÇÃO abriu mesmo (retry leve)
+    try:
+        esperar_edicao_visivel(driver, timeout=20)
+    except TimeoutException:
+        lib(driver, "editar", None)
+        waitingpanel(driver, timeout=8, tag="retry-editar")
+        esperar_edicao_visivel(driver, timeout=15)
+
+def fechar_edicao(driver, timeout=20):
+    """Cancela a edição, confirma 'Sim' no modal (quando existir) e espera voltar à lista."""
+    try:
+        if nisclickable(driver, "cancelar", timeout=6):
+            clicar(driver, "cancelar", timeout=6)
+            clicar_botao_modal(driver, "Sim", "Yes", "OK", "Confirmar", espera=2)
+    except Exception:
+        pass
+    try:
+        esperar_resultado_visivel(driver, timeout=timeout)
+    except Exception:
+        waitingpanel(driver, timeout=12, tag="pos-cancelar")
+
 # ============================
 # Classe extrairProduto (dados)
 # ============================
@@ -302,12 +375,16 @@ class ExtrairProduto:
         el = self.wait.until(EC.visibility_of_element_located((By.ID, "NomeProduto")))
         return (el.get_attribute("value") or el.text or "").strip()
 
-    def aliquotais(self):
-        # garante que está na aba Dados Fiscais
+    def ativar_dados_fiscais(self):
+        """Troca para a aba Dados Fiscais (e espera o WaitPanel, se ela carregar sob demanda)."""
         if nisclickable(self.driver, "Dados Fiscais", timeout=5):
             clicar(self.driver, "Dados Fiscais", timeout=10)
             waitingpanel(self.driver, timeout=6, tag="dados-fiscais")
 
+    def input_aliquota(self):
+        """<input> editável da alíquota (aba Dados Fiscais ativa, para digitar), ou None."""
+        self.ativar_dados_fiscais()
+
         inp = None
         try:
             base = self.driver.find_element(By.ID, "AliquotaIcmsEfetivo")
@@ -324,77 +401,259 @@ class ExtrairProduto:
                 inp = self.driver.find_element(By.CSS_SELECTOR, "input#AliquotaIcmsEfetivo, input[id^='AliquotaIcmsEfetivo'], input[name*='AliquotaIcmsEfetivo']")
             except Exception:
                 inp = None
+        return inp
+
+    def aliquotais(self):
+        # quase sempre a aba já está no DOM, só oculta: lê direto, sem trocar de aba
+        val = ler_campos_ocultos(self.driver, "AliquotaIcmsEfetivo")["AliquotaIcmsEfetivo"]
+        if val is not None:
+            return val
+        # aba carregada sob demanda: ativa e lê o input
+        inp = self.input_aliquota()
         val = (inp.get_attribute("value") if inp else "") or (inp.text if inp else "") or ""
         return val.strip()
 
-    def extrair_produto(self):
-        """Extrai campos e retorna à lista. Confirma 'Sim' no modal de cancelamento."""
-        codigo = self.codigois()
-        nome   = self.nameis()
-        aliquo = self.aliquotais()
-        nao_exibir = ler_nao_exibir_no_cardapio(self.driver)
+    def lookups(self, campos=None):
+        """Textos dos dropdowns de CAMPOS_LOOKUP (na ordem), resolvidos pelo cache da sessão."""
+        campos = CAMPOS_LOOKUP if campos is None else campos
+        if not campos:
+            return ()
+        cache = cache_da_sessao(self.driver)
+        textos = cache.resolver(campos.values())
+        if any(v is None for v in textos.values()):
+            # algum widget ainda não existe: aba carregada sob demanda
+            self.ativar_dados_fiscais()
+            textos = cache.resolver(campos.values())
+        return tuple(textos[i] or "" for i in campos.values())
 
-        # Cancelar + confirmar 'Sim' no modal (quando existir)
-        try:
-            if nisclickable(self.driver, "cancelar", timeout=6):
-                clicar(self.driver, "cancelar", timeout=6)
-                clicar_botao_modal(self.driver, "Sim", "Yes", "OK", "Confirmar")
-        except Exception:
-            pass
+    def extrair_campos(self, campos=CABECALHO_CSV):
+        """Lê só 'campos' (nomes de CABECALHO_CSV), volta à lista e retorna os valores na mesma ordem."""
+        leitores = {
+            "codigo": self.codigois,
+            "nome": self.nameis,
+            "aliquota": self.aliquotais,
+            "nao_exibir_no_cardapio": lambda: ler_nao_exibir_no_cardapio(self.driver),
+        }
+        valores = {c: leitores[c]() for c in campos if c in leitores}
+        lookup = {c: CAMPOS_LOOKUP[c] for c in campos if c in CAMPOS_LOOKUP}
+        if lookup:
+            valores.update(zip(lookup, self.lookups(lookup)))
 
-        # Espera voltar à lista
-        try:
-            esperar_resultado_visivel(self.driver, timeout=20)
-        except Exception:
-            waitingpanel(self.driver, timeout=12, tag="pos-cancelar")
+        # Cancelar + confirmar 'Sim' e esperar voltar à lista
+        fechar_edicao(self.driver)
+
+        return tuple(valores[c] for c in campos)
 
-        return codigo, nome, aliquo, nao_exibir
+    def extrair_produto(self):
+        """Extrai campos e retorna à lista. Confirma 'Sim' no modal de cancelamento."""
+        return self.extrair_campos(CABECALHO_CSV)
 
 # ===================
 # Paginacao (NextPage)
 # ===================
 def nextPage(driver, p_atual, timeout=30):
     """Vai para a próxima página do grid. Retorna (ok, p_novo)."""
-    ok = driver.execute_script("""
-        try {
-            var root = document.querySelector('#tabPanelResultContainer') || document;
-            var pager = root.querySelector('[id*="_DXPagerBottom"], .dxgvPagerBottom, .dxpLite') || root;
-            var curEl = pager.querySelector('.dxp-current');
-            var cur = curEl ? parseInt(curEl.textContent.trim(), 10) : NaN;
-            if (!isNaN(cur)) {
-                var targetText = String(cur + 1);
-                var links = pager.querySelectorAll('a.dxp-num');
-                for (var i = 0; i < links.length; i++) {
-                    if (links[i].textContent.trim() === targetText) {
-                        links[i].click();
-                        return true;
-                    }
-                }
-                if (window.ASPx && ASPx.GVPagerOnClick) {
-                    ASPx.GVPagerOnClick('dataGrid', 'PN' + (cur)); // cur=1 => PN1 (vai pra 2)
-                    return true;
-                }
-            }
-        } catch(e) {}
-        return false;
-    """)
+    inicio = time.time()
+    ok = lib(driver, "proximaPagina")
     if not ok:
         return False, p_atual
 
     waitingpanel(driver, timeout=timeout, tag="paginacao")
     # garantir alguma linha
-    WebDriverWait(driver, 20).until(
-        lambda d: d.execute_script("""
-            var rc = document.getElementById('tabPanelResultContainer');
-            if (!rc) return false;
-            var tbl = rc.querySelector('.dxgvTable,[id^="dataGrid_DXMainTable"]');
-            if (!tbl) return false;
-            var rows = tbl.querySelectorAll('tr[id^="dataGrid_DXDataRow"], tr.dxgvDataRow');
-            return rows.length >= 1;
-        """)
-    )
+    WebDriverWait(driver, 20).until(lambda d: lib(d, "linhasCarregadas"))
+    METRICAS.virada_pagina.observar(time.time() - inicio)
     return True, p_atual + 1
 
+def ir_para_pagina(driver, p, timeout=30):
+    """Vai direto para a página p (1-based) do grid."""
+    ok = driver.execute_script("""
+        try {
+            if (!window.dataGrid || !dataGrid.GotoPage) return false;
+            if (dataGrid.GetPageIndex && dataGrid.GetPageIndex() === arguments[0]) return true;
+            dataGrid.GotoPage(arguments[0]);
+            return true;
+        } catch(e) { return false; }
+    """, int(p) - 1)
+    if not ok:
+        raise RuntimeError(f"Não consegui ir para a página {p} da dataGrid.")
+    inicio = time.time()
+    waitingpanel(driver, timeout=timeout, tag="ir-para-pagina")
+    _esperar_grid_carregada(driver)
+    METRICAS.virada_pagina.observar(time.time() - inicio)
+
+def paginas_da_grid(driver):
+    """Total de páginas da dataGrid (limitado a MAX_PAGES)."""
+    n = driver.execute_script("""
+        try { return (window.dataGrid && dataGrid.GetPageCount) ? dataGrid.GetPageCount() : null; }
+        catch(e) { return null; }
+    """)
+    return min(int(n), MAX_PAGES) if n else MAX_PAGES
+
+# ==================================
+# Keyset por código (modo "chave")
+# ==================================
+class ChaveDivergente(Exception):
+    """A linha focada/aberta não é a do código esperado (grid mudou por baixo)."""
+
+def _mesma_chave(a, b):
+    a, b = str(a or "").strip(), str(b or "").strip()
+    if a.isdigit() and b.isdigit():
+        return int(a) == int(b)
+    return a == b
+
+def _literal_chave(chave):
+    """Literal de critério DevExpress para o código (só dígitos vai sem aspas)."""
+    s = str(chave).strip()
+    if s.isdigit():
+        return s
+    return "'" + s.replace("'", "''") + "'"
+
+def _esperar_grid_carregada(driver, timeout=20):
+    """Espera ao menos 1 linha de dados OU a linha de 'sem dados' da grid."""
+    WebDriverWait(driver, timeout).until(lambda d: lib(d, "gridCarregada"))
+
+def ordenar_por_codigo(driver, timeout=30):
+    """Ordena a grid por código (ascendente) via API cliente da DevExpress."""
+    ok = driver.execute_script("""
+        try {
+            if (!window.dataGrid || !dataGrid.SortBy) return false;
+            dataGrid.SortBy(arguments[0], 'ASC', true);
+            return true;
+        } catch(e) { return false; }
+    """, CAMPO_CODIGO)
+    if not ok:
+        raise RuntimeError(f"Não consegui ordenar a dataGrid por '{CAMPO_CODIGO}'.")
+    waitingpanel(driver, timeout=timeout, tag="ordenar-codigo")
+    _esperar_grid_carregada(driver)
+
+def filtrar_por_codigo(driver, operador=">", chave=None, timeout=30, filtro=None):
+    """
+    Aplica '[Codigo] <operador> chave' na grid (chave vazia limpa o filtro).
+    'filtro' (critério DevExpress, ex. "[Ativo] = True") é combinado com AND.
+    """
+    partes = [f"({filtro})"] if filtro else []
+    if chave not in (None, ""):
+        partes.append(f"[{CAMPO_CODIGO}] {operador} {_literal_chave(chave)}")
+    aplicar_filtro(driver, " AND ".join(partes), timeout=timeout)
+
+def aplicar_filtro(driver, expr, timeout=30):
+    """Aplica o critério 'expr' na dataGrid ('' limpa o filtro)."""
+    ok = driver.execute_script("""
+        try {
+            if (!window.dataGrid || !dataGrid.ApplyFilter) return false;
+            dataGrid.ApplyFilter(arguments[0]);
+            return true;
+        } catch(e) { return false; }
+    """, expr)
+    if not ok:
+        raise RuntimeError(f"Não consegui aplicar o filtro '{expr}' na dataGrid.")
+    waitingpanel(driver, timeout=timeout, tag="filtro")
+    _esperar_grid_carregada(driver)
+
+def chaves_da_pagina(driver, g=None):
+    """
+    Lê a coluna de código das linhas visíveis da grid.
+    Retorna [(g, codigo), ...] ordenado por g (ou só o código da linha g, se informada).
+    """
+    res = lib(driver, "chaves", ROTULO_CODIGO, None if g is None else int(g))
+    if res is None:
+        raise RuntimeError(f"Coluna '{ROTULO_CODIGO}' não encontrada na dataGrid.")
+    linhas = [(int(gg), str(ch)) for gg, ch in res]
+    if g is not None:
+        return linhas[0][1] if linhas else None
+    return linhas
+
+def percorrer_offset(driver, primeira=None, ultima=None):
+    """
+    Gera (p, g, None) pelo índice global da grid, virando a página a cada 10 itens.
+    'primeira'/'ultima' (1-based) limitam a faixa de páginas.
+    """
+    if primeira:
+        ir_para_pagina(driver, primeira)
+    ultima = min(ultima or MAX_PAGES, MAX_PAGES)
+
+    # inferir índice global inicial e página
+    base = lib(driver, "indiceBase") or 0
+
+    g = int(base)         # índice GLOBAL atual
+    p = (g // 10) + 1     # página atual (1-based)
+
+    # percorre até 'ultima' (ou até o pager acabar)
+    while p <= ultima:
+        yield p, g, None
+
+        c = g - 10 * (p - 1) + 1  # 1..10 dentro da página
+        # virar de página quando completar 10 itens
+        if c == 10:
+            ok, p = nextPage(driver, p_atual=p)
+            if not ok:
+                log.info("não há próxima página; encerrando")
+                return
+            g = g + 1  # IDs são globais: 9->10, 19->20, ...
+            time.sleep(0.2)
+        else:
+            g += 1
+
+def percorrer_chave(driver, depois_de=None, filtro=None):
+    """
+    Gera (lote, g, codigo) em ordem de código. Cada lote é a 1ª página do filtro
+    'código > último visto', então inclusões/exclusões no meio da execução não
+    deslocam nada. Antes de cada item a chave da linha é conferida; se divergir,
+    o lote é refeito a partir do último código entregue.
+    """
+    ordenar_por_codigo(driver)
+    ultimo = depois_de
+    divergencias = 0
+    lote = 0
+    refiltrar = True
+    while lote < MAX_PAGES:
+        lote += 1
+        if refiltrar:
+            inicio = time.time()
+            filtrar_por_codigo(driver, ">", ultimo, filtro=filtro)
+            METRICAS.virada_pagina.observar(time.time() - inicio)
+        refiltrar = True
+        linhas = chaves_da_pagina(driver)
+        if not linhas:
+            log.info("filtro por código sem linhas; encerrando")
+            return
+        reciclagens = reciclador_da_sessao(driver).reciclagens
+        for g, chave in linhas:
+            if reciclador_da_sessao(driver).reciclagens != reciclagens:
+                # aba trocada depois do último item: a nova já está em "código > último" (restaurar)
+                refiltrar = False
+                break
+            atual = chaves_da_pagina(driver, g=g)
+            if not _mesma_chave(atual, chave):
+                divergencias += 1
+                log.warning("linha mudou (%s -> %s); refazendo lote após %r", chave, atual, ultimo,
+                            extra={"g": g})
+                if divergencias > 3:
+                    raise ChaveDivergente(f"grid instável: linha g={g} esperada {chave}, encontrada {atual}")
+                break
+            divergencias = 0
+            yield lote, g, chave
+            ultimo = chave
+
+def ler_checkpoint(caminho: Path = CHECKPOINT):
+    """Último código confirmado de uma execução interrompida (ou None)."""
+    try:
+        return caminho.read_text(encoding="utf-8").strip() or None
+    except Exception:
+        return None
+
+def gravar_checkpoint(chave, caminho: Path = CHECKPOINT):
+    try:
+        caminho.write_text(str(chave), encoding="utf-8")
+    except Exception:
+        pass
+
+def limpar_checkpoint(caminho: Path = CHECKPOINT):
+    try:
+        caminho.unlink()
+    except Exception:
+        pass
+
 # ==========================================
 # Escolha do nome do arquivo (prompt HTML)
 # ==========================================
@@ -507,11 +766,12 @@ ok.onclick = () => {{
 # ======================
 # CSV helpers (salvar)
 # ======================
-def salvar_csv(caminho: Path, registros, escrever_cabecalho: bool, overwrite: bool):
+def salvar_csv(caminho: Path, registros, escrever_cabecalho: bool, overwrite: bool, cabecalho=CABECALHO_CSV):
     """
     Escreve codigo|nome|aliquota|nao_exibir_no_cardapio em 'caminho'.
     - Se overwrite=True, apaga o arquivo antes.
     - Se escrever_cabecalho=True, escreve o header.
+    - 'cabecalho' permite colunas extras (ex.: dominio|codigo|...), na ordem dos registros.
     """
     if overwrite and caminho.exists():
         try:
@@ -526,11 +786,11 @@ def salvar_csv(caminho: Path, registros, escrever_cabecalho: bool, overwrite: bo
     with caminho.open(mode, newline="", encoding="utf-8-sig") as f:
         w = csv.writer(f, delimiter="|")
         if escrever_cabecalho or mode == "w":
-            w.writerow(["codigo", "nome", "aliquota", "nao_exibir_no_cardapio"])
-        for (codigo, nome, aliq, nao_exibir) in registros:
-            w.writerow([codigo, nome, aliq, nao_exibir])
+            w.writerow(list(cabecalho))
+        for registro in registros:
+            w.writerow(list(registro))
 
-def salvar_csv_com_prompt(driver, caminho_padrao: Path, registros):
+def salvar_csv_com_prompt(driver, caminho_padrao: Path, registros, cabecalho=CABECALHO_CSV):
     """
     Se o arquivo padrão não existir: salva direto com header.
     Se existir: pergunta se substitui, renomeia ou cancela.
@@ -543,99 +803,439 @@ def salvar_csv_com_prompt(driver, caminho_padrao: Path, registros):
     if destino.exists():
         sel, over = escolher_caminho_saida(driver, destino)
         if sel is None:
-            print("Operação cancelada pelo usuário. CSV não salvo.")
+            log.warning("operação cancelada pelo usuário; CSV não salvo")
             return None
         destino = sel
         overwrite = over
         escrever_cabecalho = overwrite or (not destino.exists())
 
-    salvar_csv(destino, registros, escrever_cabecalho, overwrite)
-    print(f"OK! Salvei {len(registros)} linhas em: {destino.resolve()}")
+    salvar_csv(destino, registros, escrever_cabecalho, overwrite, cabecalho=cabecalho)
+    log.info("OK! Salvei %d linhas em: %s", len(registros), destino.resolve())
     return destino
 
+# ==========================
+# Recuperação / reprocesso
+# ==========================
+def recuperar_tela(driver):
+    """Depois de uma falha: fecha a edição (se aberta) e volta para a lista de resultados."""
+    waitingpanel(driver, timeout=12, tag="recuperar")
+    try:
+        esperar_resultado_visivel(driver, timeout=2)
+        return
+    except Exception:
+        pass
+    fechar_edicao(driver, timeout=15)
+
+def reposicionar(driver, p, g, chave=None):
+    """Leva a grid de volta até o item (p, g, chave) para reprocessar. Retorna o g atual da linha."""
+    if chave is not None:
+        filtrar_por_codigo(driver, "=", chave)
+        linhas = chaves_da_pagina(driver)
+        if not linhas:
+            raise ChaveDivergente(f"código {chave} não encontrado na grid")
+        return linhas[0][0]
+    ir_para_pagina(driver, p)
+    return g
+
+def reciclar_se_preciso(driver, p, g, chave=None, filtro=None):
+    """
+    Entre dois produtos: troca a aba por uma nova se passou dos limites de RECICLAR_*.
+    'filtro' é o critério ativo na grid (iterar_produtos), reaplicado na aba nova.
+    """
+    rec = reciclador_da_sessao(driver, a_cada=RECICLAR_A_CADA, heap_max_mb=RECICLAR_HEAP_MB,
+                               rss_max_mb=RECICLAR_RSS_MB)
+    motivo = rec.motivo()
+    if not motivo:
+        return False
+
+    def restaurar():
+        continua_drive(driver)
+        waitingpanel(driver, 4, "aba-nova")
+        if chave is not None:
+            # keyset: a aba nova já começa no próximo lote (percorrer_chave não refiltra)
+            ordenar_por_codigo(driver)
+            filtrar_por_codigo(driver, ">", chave, filtro=filtro)
+        else:
+            if filtro:
+                aplicar_filtro(driver, filtro)
+            ir_para_pagina(driver, p)
+
+    log.info("reciclando a aba (%s)", motivo, extra={"p": p, "g": g})
+    return rec.reciclar(restaurar)
+
 # ======================
 # Execução principal
 # ======================
+@contextlib.contextmanager
+def _medir_produto(contador, rotulo):
+    """Fecha a contagem de comandos do produto ao sair do bloco (se instrumentado)."""
+    if contador is None:
+        yield
+        return
+    contador.iniciar_produto()
+    try:
+        yield
+    finally:
+        resumo = contador.fechar_produto(rotulo)
+        log.debug("comandos WebDriver do produto: %d em %.3fs", resumo["total"], resumo["segundos"],
+                  extra={"comandos": resumo["comandos"]})
+        if ORCAMENTO_COMANDOS is not None and resumo["total"] > ORCAMENTO_COMANDOS:
+            log.warning("produto usou %d comandos WebDriver (orçamento %d)", resumo["total"], ORCAMENTO_COMANDOS)
+
+def extrair_linha(driver, g, chave=None, campos=CABECALHO_CSV):
+    """
+    Foca a linha g, abre a edição e extrai o produto. Com 'chave', confere o código aberto.
+    O registro sempre começa pelo código, seguido dos demais 'campos'.
+    """
+    abrir_edicao(driver, g)
+
+    # extrair + cancelar + confirmar 'Sim'
+    prod = ExtrairProduto(driver)
+    registro = prod.extrair_campos(("codigo",) + tuple(c for c in campos if c != "codigo"))
+
+    # garantir overlay sumido
+    waitingpanel(driver, timeout=10, tag="pos-extrair")
+
+    if chave is not None and not _mesma_chave(registro[0], chave):
+        raise ChaveDivergente(f"linha g={g}: esperava código {chave}, abriu {registro[0]!r}")
+    return registro
+
+def capturar_linha(driver, g, chave, capturas, p=None):
+    """
+    Modo captura: abre a edição, grava o HTML serializado do edit form em 'capturas'
+    e cancela, sem ler campo a campo. Retorna (codigo,).
+    """
+    abrir_edicao(driver, g)
+    cap = driver.execute_script(JS_CAPTURA)
+    if cap and not cap.get("temAliquota"):
+        # aba Dados Fiscais ainda não carregada: ativa e captura de novo
+        if nisclickable(driver, "Dados Fiscais", timeout=5):
+            clicar(driver, "Dados Fiscais", timeout=10)
+            waitingpanel(driver, timeout=6, tag="dados-fiscais")
+            cap = driver.execute_script(JS_CAPTURA)
+    if not cap:
+        raise RuntimeError("edit form não encontrado para captura")
+    codigo = cap.get("codigo") or ""
+    if chave is not None and not _mesma_chave(codigo, chave):
+        fechar_edicao(driver)
+        raise ChaveDivergente(f"linha g={g}: esperava código {chave}, abriu {codigo!r}")
+    capturas.gravar(cap["html"], p=p, g=g, codigo=codigo)
+
+    fechar_edicao(driver)
+    waitingpanel(driver, timeout=10, tag="pos-capturar")
+    return (codigo,)
+
+def _retentativas(driver, fila, processar, contador=None):
+    """Volta até cada linha da fila com 'driver', reprocessa e gera os registros recuperados."""
+    if not len(fila):
+        return
+    log.info("reprocessando %d linha(s) que falharam", len(fila))
+
+    def reprocessar(item):
+        p, g, chave = item
+        METRICAS.retries.inc()
+        with contexto(p=p, g=g, codigo=chave, retry=True), _medir_produto(contador, chave or f"g={g}"):
+            try:
+                return processar(reposicionar(driver, p, g, chave), chave, p)
+            except Exception as e:
+                METRICAS.falhas.inc()
+                log.warning("retry falhou (%s: %s)", type(e).__name__, e)
+                recuperar_tela(driver)
+                raise
+
+    for _, registro in fila.drenar(reprocessar):
+        METRICAS.produto_extraido()
+        yield registro
+
+def drenar_retry(driver, registros, fila, processar, contador=None):
+    """Reprocessa a fila acumulando em 'registros'."""
+    for registro in _retentativas(driver, fila, processar, contador):
+        registros.append(registro)
+
+def varredura(driver, fila, processar, posicoes=None, contador=None, checkpoint=CHECKPOINT, filtro=None):
+    """
+    Gerador com o laço da extração: para cada (p, g, chave) de 'posicoes' (padrão: o
+    percurso de MODO_PERCURSO) chama processar(g, chave, p) e gera o registro. Linhas
+    que falham vão para 'fila' e são reprocessadas (e geradas) no fim. Só avança quando
+    o consumidor pede o próximo registro; fechar o gerador interrompe a varredura.
+    'filtro': critério já aplicado na grid por quem montou 'posicoes' (volta na reciclagem).
+    """
+    # 1) garantir tela pronta
+    continua_drive(driver)
+    waitingpanel(driver, 4, "ini")
+
+    if posicoes is None:
+        if MODO_PERCURSO == "chave":
+            inicio = ler_checkpoint(checkpoint) if checkpoint else None
+            if inicio:
+                log.info("retomando depois do código %s (checkpoint)", inicio)
+            posicoes = percorrer_chave(driver, depois_de=inicio)
+        else:
+            posicoes = percorrer_offset(driver)
+
+    falhas_seguidas = 0
+    for p, g, chave in posicoes:
+        METRICAS.posicao(p, g)
+        with contexto(p=p, g=g, codigo=chave), _medir_produto(contador, chave or f"g={g}"):
+            try:
+                registro = processar(g, chave, p)
+            except Exception as e:
+                # linha com problema vai para a fila; a varredura segue
+                falhas_seguidas += 1
+                METRICAS.falhas.inc()
+                fila.adicionar((p, g, chave), e)
+                log.warning("falha na linha (%s: %s); enfileirada para retry", type(e).__name__, e)
+                if falhas_seguidas >= MAX_FALHAS_SEGUIDAS:
+                    raise RuntimeError(f"{falhas_seguidas} falhas seguidas; abortando a varredura.") from e
+                recuperar_tela(driver)
+                continue
+            falhas_seguidas = 0
+            METRICAS.produto_extraido()
+            log.info("produto %s extraído", registro[0], extra={"codigo": registro[0]})
+        yield registro
+        # com linhas esperando retry o checkpoint para antes da 1ª delas (ordem de código):
+        # uma retomada depois de queda não pode pular o que ainda não foi extraído
+        if chave is not None and checkpoint and not len(fila) and not fila.falhas:
+            gravar_checkpoint(chave, checkpoint)
+        reciclar_se_preciso(driver, p, g, chave, filtro)
+
+    # 2) drenar a fila de retry (volta até cada linha que falhou)
+    yield from _retentativas(driver, fila, processar, contador)
+
+    if MODO_PERCURSO == "chave" and checkpoint:
+        limpar_checkpoint(checkpoint)
+
+def varrer(driver, registros, fila, processar, contador=None, checkpoint=CHECKPOINT, saidas=()):
+    """
+    Percorre a grid (offset ou keyset) acumulando em 'registros' o que processar(g, chave, p)
+    devolve. Não faz prompts nem salva nada: quem chama decide o destino (e fica com o que
+    já foi coletado se der erro no meio). Cada registro também vai, na hora, para
+    saida.escrever(registro) de cada uma das 'saidas' (ex.: EscritorParquet).
+    """
+    for registro in varredura(driver, fila, processar, contador=contador, checkpoint=checkpoint):
+        registros.append(registro)
+        for saida in saidas:
+            saida.escrever(registro)
+
+def extrair_pagina(driver, p, falhou):
+    """Extrai todas as linhas da página p; linhas com erro vão para falhou(item, erro)."""
+    ir_para_pagina(driver, p)
+    registros = []
+    for g, chave in chaves_da_pagina(driver):
+        METRICAS.posicao(p, g)
+        with contexto(p=p, g=g, codigo=chave):
+            try:
+                registros.append(extrair_linha(driver, g, chave))
+            except Exception as e:
+                METRICAS.falhas.inc()
+                log.warning("falha na linha (%s: %s); enfileirada para retry", type(e).__name__, e)
+                falhou((p, g, chave), e)
+                recuperar_tela(driver)
+                continue
+            METRICAS.produto_extraido()
+        reciclar_se_preciso(driver, p, g)
+    return registros
+
+def extrair_paralelo(driver, registros, fila, saidas=()):
+    """
+    Modo offset com várias sessões: cada página é uma unidade de trabalho, o
+    controlador AIMD decide quantas sessões trabalham ao mesmo tempo. Linhas que
+    falham vão para 'fila' e são drenadas no fim pela sessão principal.
+    Cada página concluída vai na hora para as 'saidas' (na ordem em que terminam);
+    'registros' sai em ordem de página.
+    """
+    continua_drive(driver)
+    waitingpanel(driver, 4, "ini")
+    lock = threading.Lock()
+
+    def falhou(item, erro):
+        with lock:
+            fila.adicionar(item, erro)
+
+    def escrever(regs):
+        with lock:
+            for saida in saidas:
+                saida.escrever_varios(regs)
+
+    def pagina(drv, p):
+        regs = extrair_pagina(drv, p, falhou)
+        escrever(regs)
+        return regs
+
+    controlador = ControladorAIMD(alvo_s=ALVO_LATENCIA_S, maximo=MAX_SESSOES)
+    paginas = range(1, paginas_da_grid(driver) + 1)
+    feitos, erros = executar_paralelo(driver, paginas, pagina, controlador, fabrica=fabrica_sessao())
+    for _, regs in sorted(feitos, key=lambda par: par[0]):
+        registros.extend(regs)
+    for p, erro in sorted(erros, key=lambda par: par[0]):
+        # página inteira falhou (não abriu): refaz na sessão principal
+        try:
+            registros.extend(pagina(driver, p))
+        except Exception as e:
+            log.error("página %d falhou de novo: %s: %s", p, type(e).__name__, e)
+            with lock:
+                fila.desistir((p, None, None), e, tentativas=2)   # sessão paralela + principal
+
+    recuperados = []
+    drenar_retry(driver, recuperados, fila, lambda g, chave, p: extrair_linha(driver, g, chave))
+    escrever(recuperados)
+    registros.extend(recuperados)
+
+def iterar_produtos(driver, campos=None, paginas=None, filtro=None, depois_de=None, retry=True):
+    """
+    API de biblioteca: gera um dict {campo: valor} por produto à medida que é extraído.
+    Nada é lido antes de o consumidor pedir o próximo (backpressure natural) e parar de
+    consumir (break / .close()) encerra a varredura, fechando a edição e limpando o filtro.
+
+    - campos:    nomes de CABECALHO_CSV a ler (padrão: todos); 'codigo' sempre vem (é conferido)
+    - paginas:   (primeira, ultima), 1-based, no modo "offset"
+    - filtro:    critério DevExpress aplicado na grid, ex. "[Ativo] = True"
+    - depois_de: no modo "chave", começa depois deste código
+    - retry:     reprocessa as linhas que falharam no fim (senão ficam só no log)
+
+        for prod in iterar_produtos(driver, campos=("codigo", "aliquota"), paginas=(1, 5)):
+            carregar(prod)
+    """
+    campos = tuple(campos or CABECALHO_CSV)
+    desconhecidos = [c for c in campos if c not in CABECALHO_CSV]
+    if desconhecidos:
+        raise ValueError(f"campos desconhecidos: {', '.join(desconhecidos)} (válidos: {', '.join(CABECALHO_CSV)})")
+    lidos = ("codigo",) + tuple(c for c in campos if c != "codigo")
+    primeira, ultima = paginas or (None, None)
+
+    fila = FilaRetry(max_tentativas=MAX_TENTATIVAS if retry else 1, backoff=BACKOFF_RETRY)
+    continua_drive(driver)
+    if MODO_PERCURSO == "chave":
+        posicoes = percorrer_chave(driver, depois_de=depois_de, filtro=filtro)
+    else:
+        if filtro:
+            aplicar_filtro(driver, filtro)
+        posicoes = percorrer_offset(driver, primeira, ultima)
+
+    completo = False
+    try:
+        for registro in varredura(driver, fila, lambda g, chave, p: extrair_linha(driver, g, chave, lidos),
+                                  posicoes=posicoes, checkpoint=None, filtro=filtro):
+            yield dict(zip(lidos, registro))
+        completo = True
+    finally:
+        if not completo:
+            # consumidor parou no meio (ou erro): deixa a tela na lista
+            try:
+                recuperar_tela(driver)
+            except Exception:
+                pass
+        if filtro or MODO_PERCURSO == "chave":
+            try:
+                aplicar_filtro(driver, "")
+            except Exception:
+                pass
+        for item, n, erro in fila.falhas:
+            log.error("linha %s não extraída após %d tentativa(s): %s", item, n, erro)
+
+def extrair_registros(driver, checkpoint=None):
+    """
+    Varredura completa sem prompts nem input(), para uso programático (ex.: várias lojas).
+    Retorna (registros, falhas) com falhas = [((p, g, codigo), tentativas, erro)].
+    """
+    registros = []
+    fila = FilaRetry(max_tentativas=MAX_TENTATIVAS, backoff=BACKOFF_RETRY)
+    varrer(driver, registros, fila, lambda g, chave, p: extrair_linha(driver, g, chave), checkpoint=checkpoint)
+    return registros, fila.falhas
+
 def executar(driver):
     saida_default = Path(__file__).parent / "aliquotas.csv"
+    if MODO_EXTRACAO == "captura" and CAMPOS_LOOKUP:
+        raise RuntimeError("CAMPOS_LOOKUP não é suportado no modo captura (o parse offline só lê "
+                           f"{', '.join(CAMPOS_BASE)}); use MODO_EXTRACAO = \"campos\".")
+    saida_falhas  = saida_default.with_name(saida_default.stem + ".falhas.csv")
     registros = []
+    fila = FilaRetry(max_tentativas=MAX_TENTATIVAS, backoff=BACKOFF_RETRY)
+    cassete = gravar(driver, GRAVAR_CASSETE) if GRAVAR_CASSETE else None   # antes dos outros wrappers
+    if cassete is not None and USAR_CDP:
+        log.warning("gravando cassete: USAR_CDP ignorado nesta execução (scripts vão pelo WebDriver)")
+    contador = instrumentar(driver) if INSTRUMENTAR_COMANDOS else None
+    rede = tracar(driver)   # trace de rede dos callbacks (só com _rede.ARQUIVO_TRACE)
+    capturas = None
+    if MODO_EXTRACAO == "captura":
+        # retomada pelo checkpoint continua o arquivo; senão começa um novo
+        retomando = MODO_PERCURSO == "chave" and ler_checkpoint(CHECKPOINT) is not None
+        capturas = ArquivoCapturas(ARQUIVO_CAPTURAS, continuar=retomando)
+    parquet = None
+    if SAIDA_PARQUET and capturas is not None:
+        log.warning("modo captura: SAIDA_PARQUET ignorado (gere o Parquet do CSV do parse: "
+                    "python -m CadastroProdutos._parquet)")
+    elif SAIDA_PARQUET:
+        parquet = EscritorParquet(SAIDA_PARQUET, CABECALHO_CSV)
+
+    metricas_srv = None
+    if PORTA_METRICAS:
+        try:
+            metricas_srv = servir(PORTA_METRICAS)
+            METRICAS.rss_navegador.definir(lambda: rss_navegador(driver))
+            log.info("métricas em http://127.0.0.1:%d/metrics", PORTA_METRICAS)
+        except OSError as e:
+            log.warning("não consegui abrir o endpoint de métricas na porta %s: %s", PORTA_METRICAS, e)
+
+    def processar(g, chave, p):
+        if capturas is not None:
+            return capturar_linha(driver, g, chave, capturas, p=p)
+        return extrair_linha(driver, g, chave)
 
     try:
-        # 1) garantir tela pronta
-        continua_drive(driver)
-        waitingpanel(driver, 4, "ini")
-
-        # inferir índice global inicial e página
-        base = driver.execute_script(r"""
-            var rc  = document.getElementById('tabPanelResultContainer');
-            if (!rc) return 0;
-            var rows = rc.querySelectorAll('tr[id^="dataGrid_DXDataRow"]');
-            var minIdx = null;
-            for (var i = 0; i < rows.length; i++) {
-                var id = rows[i].id || "";
-                var m  = id.match(/DXDataRow(\d+)$/);
-                if (m) {
-                    var v = parseInt(m[1], 10);
-                    if (minIdx === null || v < minIdx) minIdx = v;
-                }
-            }
-            return (minIdx === null ? 0 : minIdx);
-        """) or 0
-
-        g = int(base)         # índice GLOBAL atual
-        p = (g // 10) + 1     # página atual (1-based)
-
-        # percorre até MAX_PAGES (ou até o pager acabar)
-        while p <= MAX_PAGES:
-            c = g - 10 * (p - 1) + 1  # 1..10 dentro da página
-            print(f"\n===== P{p} ITEM {c-1} / 9 (g={g}) =====")
-
-            # focar linha & abrir edição
-            if not nisclickable(driver, "linha", g=g, timeout=12):
-                print(f"DEBUG: não consegui focar a linha g={g}, tentando assim mesmo…")
-            clicar(driver, "linha", g=g, timeout=12)
-            clicar(driver, "editar", g=g, timeout=12)
-
-            # garantir que a EDIÇÃO abriu mesmo (retry leve)
-            try:
-                esperar_edicao_visivel(driver, timeout=20)
-            except TimeoutException:
-                driver.execute_script("try { runInSession('editItem()'); } catch(e) {}")
-                waitingpanel(driver, timeout=8, tag="retry-editar")
-                esperar_edicao_visivel(driver, timeout=15)
-
-            # extrair + cancelar + confirmar 'Sim'
-            prod = ExtrairProduto(driver)
-            codigo, nome, aliquota, nao_exibir = prod.extrair_produto()
-            registros.append((codigo, nome, aliquota, nao_exibir))
-
-            # garantir overlay sumido
-            waitingpanel(driver, timeout=10, tag="pos-extrair")
-
-            # virar de página quando completar 10 itens
-            if c == 10:
-                ok, p = nextPage(driver, p_atual=p)
-                if not ok:
-                    print("DEBUG: Não há próxima página; encerrando.")
-                    break
-                g = g + 1  # IDs são globais: 9->10, 19->20, ...
-                time.sleep(0.2)
-            else:
-                g += 1
+        if MAX_SESSOES > 1 and MODO_PERCURSO == "offset" and capturas is None and fabrica_sessao():
+            extrair_paralelo(driver, registros, fila, saidas=() if parquet is None else (parquet,))
+        else:
+            if MAX_SESSOES > 1:
+                log.warning("sessões paralelas só no modo offset/campos com login pelo gpt_selenium; seguindo com uma")
+            varrer(driver, registros, fila, processar, contador=contador,
+                   saidas=() if parquet is None else (parquet,))
 
-        # salvamento normal (com prompt se existir)
-        salvar_csv_com_prompt(driver, saida_default, registros)
+        if capturas is not None:
+            capturas.fechar()
+            log.info("%d capturas gravadas em %s; para gerar o CSV: python -m CadastroProdutos._capturas %s",
+                     capturas.gravadas, ARQUIVO_CAPTURAS.resolve(), ARQUIVO_CAPTURAS.name)
+        else:
+            # salvamento normal (com prompt se existir)
+            salvar_csv_com_prompt(driver, saida_default, registros)
+        if fila.salvar_falhas(saida_falhas, ("pagina", "g", "codigo")):
+            log.warning("%d linha(s) falharam de vez; veja %s", len(fila.falhas), saida_falhas.resolve())
 
     except Exception as e:
         # >>> SE DER ERRO, SALVA O QUE JÁ TEMOS (com prompt) <<<
         try:
-            if registros:
+            if capturas is not None:
+                log.warning("%d capturas já gravadas em %s", capturas.gravadas, ARQUIVO_CAPTURAS.resolve())
+            elif registros:
                 salvar_csv_com_prompt(driver, saida_default, registros)
             else:
-                print("\nATENÇÃO: Erro antes de coletar qualquer linha; nada foi salvo.")
+                log.warning("erro antes de coletar qualquer linha; nada foi salvo")
+            fila.salvar_falhas(saida_falhas, ("pagina", "g", "codigo"), incluir_pendentes=True)
         except Exception as e2:
-            print(f"\nERRO ao salvar CSV parcial: {e2}")
-        print(f"\nMotivo do erro: {type(e).__name__}: {e}")
+            log.error("erro ao salvar CSV parcial: %s", e2)
+        log.error("motivo do erro: %s: %s", type(e).__name__, e)
         raise
 
+    finally:
+        if metricas_srv is not None:
+            metricas_srv.shutdown()
+            metricas_srv.server_close()
+        if capturas is not None:
+            capturas.fechar()
+        if parquet is not None:
+            parquet.fechar()
+        if rede is not None:
+            rede.remover()
+            log.info("%d callbacks no trace de rede: python -m CadastroProdutos._rede %s",
+                     rede.gravados, rede.arquivo.resolve())
+        if contador is not None:
+            contador.remover()
+            resumo = contador.resumo()
+            log.info("comandos WebDriver na execução: %d em %.1fs (%s produtos, média %s, máx %s)",
+                     resumo["total"], resumo["segundos"], resumo["produtos"],
+                     resumo.get("media_por_produto"), resumo.get("max_por_produto"),
+                     extra={"comandos": resumo["comandos"]})
+        if cassete is not None:
+            cassete.remover()
+
     input("Pressione Enter para fechar...")
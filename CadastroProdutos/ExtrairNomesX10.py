@@ -8,6 +8,10 @@ from pathlib import Path
 import csv
 import time
 
+from CadastroProdutos._log import get_logger, contexto
+
+log = get_logger(__name__)
+
 # ==============================
 # helpers de overlay / waitpanel
 # ==============================
@@ -46,18 +50,18 @@ def _overlay_visivel(driver):
 
 def waitingpanel(driver, timeout=250, tag=""):
     """Espera até timeout o underlay desaparecer. Continua mesmo que estoure."""
-    print(f"DEBUG: aguardando WAITPANEL {tag} sumir (até {timeout}s)…")
+    log.debug("aguardando WAITPANEL sumir (até %ss)", timeout, extra={"tag": tag})
     fim = time.time() + timeout
     ultimo = None
     while time.time() < fim:
         ativo = _overlay_visivel(driver)
         if ativo != ultimo:
-            print(f"DEBUG: WAITPANEL {tag} -> {'ATIVO' if ativo else 'OCULTO'}")
+            log.debug("WAITPANEL -> %s", "ATIVO" if ativo else "OCULTO", extra={"tag": tag})
             ultimo = ativo
         if not ativo:
             return True
         time.sleep(0.10)
-    print(f"DEBUG: WAITPANEL {tag} ainda ativo ao fim; seguindo assim mesmo…")
+    log.warning("WAITPANEL ainda ativo após %ss; seguindo assim mesmo", timeout, extra={"tag": tag})
     return False
 
 # ======================
@@ -541,14 +545,14 @@ def salvar_csv_com_prompt(driver, caminho_padrao: Path, registros):
     if destino.exists():
         sel, over = escolher_caminho_saida(driver, destino)
         if sel is None:
-            print("Operação cancelada pelo usuário. CSV não salvo.")
+            log.warning("operação cancelada pelo usuário; CSV não salvo")
             return None
         destino = sel
         overwrite = over
         escrever_cabecalho = overwrite or (not destino.exists())
 
     salvar_csv(destino, registros, escrever_cabecalho, overwrite)
-    print(f"OK! Salvei {len(registros)} linhas em: {destino.resolve()}")
+    log.info("OK! Salvei %d linhas em: %s", len(registros), destino.resolve())
     return destino
 
 # ======================
@@ -586,35 +590,36 @@ def executar(driver):
         # vamos até a página 2 (ajuste se quiser mais)
         while p <= 2:
             c = g - 10 * (p - 1) + 1  # 1..10 dentro da página
-            print(f"\n===== P{p} ITEM {c-1} / 9 (g={g}) =====")
+            with contexto(p=p, g=g):
+                log.info("item %d / 9 da página", c - 1)
 
-            # focar linha & abrir edição
-            if not nisclickable(driver, "linha", g=g, timeout=12):
-                print(f"DEBUG: não consegui focar a linha g={g}, tentando assim mesmo…")
-            clicar(driver, "linha", g=g, timeout=12)
-            clicar(driver, "editar", g=g, timeout=12)
+                # focar linha & abrir edição
+                if not nisclickable(driver, "linha", g=g, timeout=12):
+                    log.debug("não consegui focar a linha; tentando assim mesmo")
+                clicar(driver, "linha", g=g, timeout=12)
+                clicar(driver, "editar", g=g, timeout=12)
 
-            # garantir que a EDIÇÃO abriu mesmo (retry leve)
-            try:
-                esperar_edicao_visivel(driver, timeout=20)
-            except TimeoutException:
-                driver.execute_script("try { runInSession('editItem()'); } catch(e) {}")
-                waitingpanel(driver, timeout=8, tag="retry-editar")
-                esperar_edicao_visivel(driver, timeout=15)
+                # garantir que a EDIÇÃO abriu mesmo (retry leve)
+                try:
+                    esperar_edicao_visivel(driver, timeout=20)
+                except TimeoutException:
+                    driver.execute_script("try { runInSession('editItem()'); } catch(e) {}")
+                    waitingpanel(driver, timeout=8, tag="retry-editar")
+                    esperar_edicao_visivel(driver, timeout=15)
 
-            # extrair + cancelar + confirmar 'Sim'
-            prod = ExtrairProduto(driver)
-            codigo, nome, aliquota, nao_exibir = prod.extrair_produto()
-            registros.append((codigo, nome, aliquota, nao_exibir))
+                # extrair + cancelar + confirmar 'Sim'
+                prod = ExtrairProduto(driver)
+                codigo, nome, aliquota, nao_exibir = prod.extrair_produto()
+                registros.append((codigo, nome, aliquota, nao_exibir))
 
-            # garantir overlay sumido
-            waitingpanel(driver, timeout=10, tag="pos-extrair")
+                # garantir overlay sumido
+                waitingpanel(driver, timeout=10, tag="pos-extrair")
 
             # virar de página quando completar 10 itens
             if c == 10:
                 ok, p = nextPage(driver, p_atual=p)
                 if not ok:
-                    print("DEBUG: Não há próxima página; encerrando.")
+                    log.info("não há próxima página; encerrando")
                     break
                 g = g + 1  # IDs são globais: 9->10, 19->20, ...
                 time.sleep(0.2)
@@ -630,10 +635,10 @@ def executar(driver):
             if registros:
                 salvar_csv_com_prompt(driver, saida_default, registros)
             else:
-                print("\nATENÇÃO: Erro antes de coletar qualquer linha; nada foi salvo.")
+                log.warning("erro antes de coletar qualquer linha; nada foi salvo")
         except Exception as e2:
-            print(f"\nERRO ao salvar CSV parcial: {e2}")
-        print(f"\nMotivo do erro: {type(e).__name__}: {e}")
+            log.error("erro ao salvar CSV parcial: %s", e2)
+        log.error("motivo do erro: %s: %s", type(e).__name__, e)
         raise
 
     input("Pressione Enter para fechar...")
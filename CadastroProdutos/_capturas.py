@@ -0,0 +1,240 @@
+# CadastroProdutos/_capturas.py
+# modo captura: o navegador só grava o HTML do edit form; o parse roda depois, offline
+#
+#   python -m CadastroProdutos._capturas aliquotas.capturas.gz [saida.csv] [--workers N]
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+import argparse
+import gzip
+import json
+import os
+import time
+
+# serializa o edit form; antes copia o estado "vivo" (value/checked/dijit) para atributos,
+# senão o outerHTML só traria os valores da renderização inicial
+JS_CAPTURA = r"""
+    var c = document.getElementById('tabPanelEditionContainer');
+    if (!c) return null;
+    var els = c.querySelectorAll('input, textarea, select');
+    for (var i = 0; i < els.length; i++) {
+        var el = els[i], t = (el.type || '').toLowerCase();
+        try {
+            if (t === 'checkbox' || t === 'radio') {
+                if (el.checked) el.setAttribute('checked', 'checked'); else el.removeAttribute('checked');
+            } else if (el.tagName === 'SELECT') {
+                for (var j = 0; j < el.options.length; j++) {
+                    if (el.options[j].selected) el.options[j].setAttribute('selected', 'selected');
+                    else el.options[j].removeAttribute('selected');
+                }
+            } else if (el.tagName === 'TEXTAREA') {
+                el.textContent = el.value;
+            } else {
+                el.setAttribute('value', el.value);
+            }
+        } catch(e) {}
+    }
+    try {
+        if (window.dijit && dijit.byId) {
+            var ws = c.querySelectorAll('[widgetid]');
+            for (var k = 0; k < ws.length; k++) {
+                var w = dijit.byId(ws[k].getAttribute('widgetid'));
+                if (!w || typeof w.get !== 'function') continue;
+                var alvo = document.getElementById(w.id) || ws[k];
+                var chk = w.get('checked');
+                if (chk !== undefined) alvo.setAttribute('data-cadastro-checked', chk ? 'true' : 'false');
+            }
+        }
+    } catch(e) {}
+    var cod = document.getElementById('CodigoProduto') || c.querySelector("[name='CodigoProduto']");
+    return {
+        html: c.outerHTML,
+        codigo: cod ? (cod.value || cod.textContent || '').trim() : '',
+        temAliquota: !!c.querySelector('#AliquotaIcmsEfetivo, [id^="AliquotaIcmsEfetivo"]')
+    };
+"""
+
+# ==========================
+# arquivo de capturas
+# ==========================
+class ArquivoCapturas:
+    """
+    Arquivo só-de-acréscimo: cada captura é uma linha JSON comprimida como um
+    membro gzip independente. Uma queda no meio perde no máximo a última captura,
+    e o arquivo inteiro continua legível com gzip.open().
+    Cada execução começa um arquivo novo; continuar=True acrescenta ao que já existe
+    (retomada pelo checkpoint).
+    """
+    def __init__(self, caminho: Path, nivel=6, continuar=False):
+        self.caminho = Path(caminho)
+        self.nivel = nivel
+        self.continuar = continuar
+        self._f = None
+        self.gravadas = 0
+
+    def gravar(self, html, **campos):
+        if self._f is None:
+            self._f = self.caminho.open("ab" if self.continuar else "wb")
+        doc = dict(campos, ts=round(time.time(), 3), html=html)
+        linha = (json.dumps(doc, ensure_ascii=False) + "\n").encode("utf-8")
+        self._f.write(gzip.compress(linha, compresslevel=self.nivel))
+        self._f.flush()
+        self.gravadas += 1
+
+    def fechar(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+def ler_capturas(caminho: Path):
+    """Gera os dicts das capturas em ordem; ignora uma captura final truncada."""
+    with gzip.open(caminho, "rt", encoding="utf-8") as f:
+        try:
+            for linha in f:
+                if linha.strip():
+                    yield json.loads(linha)
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+# ==========================
+# parse (roda nos workers)
+# ==========================
+IDS_INTERESSE = ("CodigoProduto", "NomeProduto", "AliquotaIcmsEfetivo", "NaoExibirNoCardapio")
+
+def _interessa(id_, name):
+    return any((id_ or "").startswith(p) for p in IDS_INTERESSE) or name in IDS_INTERESSE
+
+class _ColetorStdlib(HTMLParser):
+    """Fallback sem lxml: guarda (tag, attrs) dos elementos de interesse por id/name."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.elementos = {}
+
+    def handle_starttag(self, tag, attrs):
+        a = {k: (v if v is not None else "") for k, v in attrs}
+        id_, name = a.get("id", ""), a.get("name", "")
+        if _interessa(id_, name):
+            if id_:
+                self.elementos.setdefault(id_, (tag, a))
+            if name:
+                self.elementos.setdefault("name:" + name, (tag, a))
+
+    handle_startendtag = handle_starttag
+
+def _elementos(html):
+    """id (e 'name:<name>') -> (tag, attrs) dos elementos de interesse."""
+    try:
+        import lxml.html
+    except ImportError:
+        col = _ColetorStdlib()
+        col.feed(html)
+        col.close()
+        return col.elementos
+    els = {}
+    for el in lxml.html.fromstring(html).iter():
+        if not isinstance(el.tag, str):
+            continue
+        id_, name = el.get("id", ""), el.get("name", "")
+        if _interessa(id_, name):
+            a = dict(el.attrib)
+            if id_:
+                els.setdefault(id_, (el.tag, a))
+            if name:
+                els.setdefault("name:" + name, (el.tag, a))
+    return els
+
+def _valor(els, id_, prefixo=False):
+    tag, a = els.get(id_) or els.get("name:" + id_) or (None, {})
+    if tag != "input" and prefixo:
+        # editor DevExpress: o <input> fica num filho com id 'Campo_I' etc.
+        for k, (t, attrs) in els.items():
+            if t == "input" and k.startswith(id_):
+                return (attrs.get("value") or "").strip()
+    return (a.get("value") or "").strip()
+
+def _marcado(els, id_):
+    _, a = els.get(id_) or els.get("name:" + id_) or (None, {})
+    if "data-cadastro-checked" in a:
+        return "sim" if a["data-cadastro-checked"] == "true" else "não"
+    if (a.get("aria-checked") or "").lower() in ("true", "false"):
+        return "sim" if a["aria-checked"].lower() == "true" else "não"
+    return "sim" if "checked" in a else "não"
+
+def parse_html(html):
+    """HTML do edit form -> (codigo, nome, aliquota, nao_exibir_no_cardapio), na ordem de CAMPOS_BASE."""
+    els = _elementos(html)
+    return (
+        _valor(els, "CodigoProduto"),
+        _valor(els, "NomeProduto"),
+        _valor(els, "AliquotaIcmsEfetivo", prefixo=True),
+        _marcado(els, "NaoExibirNoCardapio"),
+    )
+
+def _parse_lote(htmls):
+    return [parse_html(h) for h in htmls]
+
+def sem_duplicados(registros):
+    """Uma linha por código (a da última captura, ex.: retry ou retomada); sem código ficam todas."""
+    por_codigo, sem_codigo = {}, []
+    for r in registros:
+        if r[0]:
+            por_codigo.pop(r[0], None)
+            por_codigo[r[0]] = r
+        else:
+            sem_codigo.append(r)
+    return list(por_codigo.values()) + sem_codigo
+
+# ==========================
+# estágio de parse (pool)
+# ==========================
+def processar_capturas(caminho: Path, workers=None, lote=64):
+    """
+    Lê o arquivo de capturas em streaming e faz o parse em um ProcessPoolExecutor.
+    Mantém no máximo ~2 lotes por worker em voo (memória limitada) e gera os
+    registros na mesma ordem das capturas.
+    """
+    workers = workers or os.cpu_count() or 2
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        em_voo = deque()
+        buf = []
+        for cap in ler_capturas(caminho):
+            buf.append(cap.get("html") or "")
+            if len(buf) >= lote:
+                em_voo.append(ex.submit(_parse_lote, buf))
+                buf = []
+                if len(em_voo) >= 2 * workers:
+                    yield from em_voo.popleft().result()
+        if buf:
+            em_voo.append(ex.submit(_parse_lote, buf))
+        while em_voo:
+            yield from em_voo.popleft().result()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Parse offline de um arquivo de capturas do edit form.")
+    ap.add_argument("capturas", type=Path)
+    ap.add_argument("saida", type=Path, nargs="?", help="CSV de saída (padrão: <capturas>.parsed.csv)")
+    ap.add_argument("--workers", type=int, default=None)
+    args = ap.parse_args(argv)
+
+    from CadastroProdutos.ExtrairAliquota import CAMPOS_BASE, salvar_csv
+
+    # nunca o CSV da extração (aliquotas.csv) por padrão
+    nome = args.capturas.name[:-3] if args.capturas.name.endswith(".gz") else args.capturas.name
+    saida = args.saida or args.capturas.with_name(nome + ".parsed.csv")
+    t0 = time.time()
+    registros = sem_duplicados(processar_capturas(args.capturas, workers=args.workers))
+    salvar_csv(saida, registros, escrever_cabecalho=True, overwrite=True, cabecalho=CAMPOS_BASE)
+    print(f"OK! {len(registros)} capturas processadas em {time.time() - t0:.1f}s -> {saida.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+# CadastroProdutos/_cassete.py
+# gravação/reprodução de sessões WebDriver: numa execução real cada comando e a resposta vão
+# para uma "cassete" (JSON lines gzip); o DriverReplay serve essas respostas sem navegador,
+# para rodar/perfilar a lógica dos extratores em milissegundos
+#
+#   python -m CadastroProdutos._cassete aliquotas.cassete.gz     (resumo: comandos por tipo)
+#
+#   from CadastroProdutos._cassete import DriverReplay, relogio_virtual
+#   drv = DriverReplay("aliquotas.cassete.gz")
+#   with relogio_virtual():
+#       registros, falhas = extrair_registros(drv, checkpoint=None)
+from collections import Counter
+from pathlib import Path
+import argparse
+import builtins
+import contextlib
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+from selenium.common import exceptions as selenium_exc
+from selenium.webdriver.chrome.webdriver import WebDriver as ChromeDriver
+from selenium.webdriver.remote.webelement import WebElement
+
+from CadastroProdutos._log import get_logger
+
+log = get_logger(__name__)
+
+VERSAO = 1
+JANELA = 200   # replay: quantos comandos gravados à frente procurar pelo próximo que casa
+
+class DivergenciaCassete(AssertionError):
+    """O código pediu um comando que a cassete não tem (a lógica mudou ou a cassete é de outra versão)."""
+
+# =========================
+# serialização
+# =========================
+def _para_json(v):
+    """WebElement -> {'__elemento__': id}; o resto como veio (listas/dicts recursivos)."""
+    if isinstance(v, WebElement):
+        return {"__elemento__": v.id}
+    if isinstance(v, dict):
+        return {k: _para_json(x) for k, x in v.items()}
+    if isinstance(v, (list, tuple)):
+        return [_para_json(x) for x in v]
+    return v
+
+def _chave(comando, params):
+    """Identidade do comando: tipo + hash dos parâmetros (sessionId fora, muda a cada sessão)."""
+    p = {k: v for k, v in (params or {}).items() if k != "sessionId"}
+    bruto = json.dumps([comando, _para_json(p)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(bruto.encode("utf-8")).hexdigest()[:16]
+
+# =========================
+# gravação
+# =========================
+_GRAVANDO = set()   # session_id das sessões com gravador instalado
+_lock_gravando = threading.Lock()
+
+def gravando(driver):
+    """True se 'driver' está sendo gravado: quem tem atalho fora do driver.execute (CDP direto) não deve usá-lo."""
+    return getattr(driver, "session_id", None) in _GRAVANDO
+
+class Gravador:
+    """
+    Envolve driver.execute (como o ContadorComandos) e grava, em ordem, cada comando
+    com a resposta (ou o erro) numa cassete gzip: uma linha de cabeçalho com as
+    capabilities e uma por comando {"c": tipo, "k": chave, "v": valor | "e": erro}.
+    """
+    def __init__(self, driver, arquivo):
+        self.driver = driver
+        self.arquivo = Path(arquivo)
+        self._original = None
+        self._fp = None
+        self._lock = threading.Lock()
+        self.gravados = 0
+
+    def instalar(self):
+        if self._original is None:
+            self._fp = gzip.open(self.arquivo, "wt", encoding="utf-8", compresslevel=6)
+            caps = dict(getattr(self.driver, "capabilities", None) or {})
+            # sem debuggerAddress: no replay o caminho CDP direto cai para o WebDriver
+            caps.pop("goog:chromeOptions", None)
+            self._fp.write(json.dumps({"cassete": VERSAO, "session_id": self.driver.session_id,
+                                       "capabilities": caps}, default=str) + "\n")
+            self._original = self.driver.execute
+            self.driver.execute = self._execute
+            with _lock_gravando:
+                _GRAVANDO.add(self.driver.session_id)
+        return self
+
+    def remover(self):
+        if self._original is None:
+            return
+        if getattr(self._original, "__self__", None) is self.driver and \
+                getattr(self._original, "__func__", None) is type(self.driver).execute:
+            try:
+                del self.driver.execute
+            except AttributeError:
+                pass
+        else:
+            self.driver.execute = self._original
+        self._original = None
+        with _lock_gravando:
+            _GRAVANDO.discard(self.driver.session_id)
+        self._fp.close()
+        log.info("%d comandos gravados em %s", self.gravados, self.arquivo.resolve())
+
+    def _execute(self, driver_command, params=None):
+        linha = {"c": driver_command, "k": _chave(driver_command, params)}
+        try:
+            resposta = self._original(driver_command, params)
+        except Exception as e:
+            linha["e"] = [type(e).__name__, getattr(e, "msg", None) or str(e)]
+            self._escrever(linha)
+            raise
+        linha["v"] = _para_json((resposta or {}).get("value"))
+        self._escrever(linha)
+        return resposta
+
+    def _escrever(self, linha):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.write(json.dumps(linha, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+                self.gravados += 1
+
+def gravar(driver, arquivo):
+    """Instala o gravador em 'driver' e o devolve (use .remover() para fechar a cassete)."""
+    return Gravador(driver, arquivo).instalar()
+
+# =========================
+# reprodução
+# =========================
+def ler_cassete(arquivo):
+    with gzip.open(arquivo, "rt", encoding="utf-8") as fp:
+        cabecalho = json.loads(fp.readline())
+        if cabecalho.get("cassete") != VERSAO:
+            raise ValueError(f"{arquivo}: cassete versão {cabecalho.get('cassete')!r}, esperada {VERSAO}")
+        return cabecalho, [json.loads(l) for l in fp if l.strip()]
+
+class DriverReplay(ChromeDriver):
+    """
+    Driver do Chrome sem navegador: execute() responde com o que a cassete gravou.
+    A ordem é a da gravação, com tolerância para esperas que fazem mais ou menos
+    consultas do que na gravação: procura o comando até JANELA posições à frente
+    (pulando as consultas que sobraram) e, se o código repetir o último comando
+    servido além do gravado, repete a resposta. Sem correspondência levanta
+    DivergenciaCassete (estrito=True) ou devolve None.
+    """
+    def __init__(self, arquivo, estrito=True):
+        # não chama o __init__ do Chrome (ele sobe chromedriver e abre sessão):
+        # só o estado que os métodos do WebDriver usam
+        from selenium.webdriver.remote.file_detector import LocalFileDetector
+        from selenium.webdriver.remote.shadowroot import ShadowRoot
+        from selenium.webdriver.remote.switch_to import SwitchTo
+
+        cabecalho, self._fitas = ler_cassete(arquivo)
+        self.arquivo = Path(arquivo)
+        self.estrito = estrito
+        self.session_id = cabecalho.get("session_id") or "replay"
+        self.caps = cabecalho.get("capabilities") or {}
+        self.pinned_scripts = {}
+        self.file_detector = LocalFileDetector()
+        self._is_remote = False
+        self._authenticator_id = None
+        self._web_element_cls = WebElement
+        self._shadowroot_cls = ShadowRoot
+        self._switch_to = SwitchTo(self)
+        self._websocket_connection = None
+        try:
+            from selenium.webdriver.remote.locator_converter import LocatorConverter
+            self.locator_converter = LocatorConverter()
+        except ImportError:   # selenium antigo converte o locator dentro do find_element
+            pass
+        self._cursor = 0
+        self._ultimo = None
+        self.pulados = 0
+        self.repetidos = 0
+
+    def _do_json(self, v):
+        if isinstance(v, dict):
+            if set(v) == {"__elemento__"}:
+                return self._web_element_cls(self, v["__elemento__"])
+            return {k: self._do_json(x) for k, x in v.items()}
+        if isinstance(v, list):
+            return [self._do_json(x) for x in v]
+        return v
+
+    def _responder(self, fita):
+        if "e" in fita:
+            nome, msg = fita["e"]
+            cls = getattr(selenium_exc, nome, None) or getattr(builtins, nome, None)
+            if not (isinstance(cls, type) and issubclass(cls, Exception)):
+                cls = selenium_exc.WebDriverException
+            raise cls(msg)
+        return {"value": self._do_json(fita.get("v")), "sessionId": self.session_id}
+
+    def execute(self, driver_command, params=None):
+        chave = _chave(driver_command, params)
+        fim = min(len(self._fitas), self._cursor + JANELA)
+        for i in range(self._cursor, fim):
+            if self._fitas[i]["k"] == chave:
+                self.pulados += i - self._cursor
+                self._cursor = i + 1
+                self._ultimo = self._fitas[i]
+                return self._responder(self._fitas[i])
+        if self._ultimo is not None and self._ultimo["k"] == chave:
+            self.repetidos += 1
+            return self._responder(self._ultimo)
+        if driver_command == "quit":
+            return {"value": None}
+        if self.estrito:
+            script = ((params or {}).get("script") or "")[:120]
+            raise DivergenciaCassete(
+                f"comando {self._cursor} da cassete {self.arquivo.name}: o código pediu {driver_command} "
+                f"{script!r} e a gravação não tem nada igual nas próximas {JANELA} posições "
+                f"(próximo gravado: {self._fitas[self._cursor]['c'] if self._cursor < len(self._fitas) else 'fim'})")
+        return {"value": None}
+
+    @property
+    def restantes(self):
+        return len(self._fitas) - self._cursor
+
+    def quit(self):
+        pass
+
+# =========================
+# relógio virtual
+# =========================
+@contextlib.contextmanager
+def relogio_virtual():
+    """
+    time.sleep não dorme: avança um relógio virtual somado a time.time/monotonic/perf_counter.
+    Esperas (WaitPanel, WebDriverWait, backoff do retry) passam na hora e timeouts continuam
+    valendo pelo tempo "de mentira". Afeta o processo todo enquanto o bloco estiver aberto.
+    """
+    originais = {n: getattr(time, n) for n in ("sleep", "time", "monotonic", "perf_counter")}
+    deslocamento = [0.0]
+
+    def dormir(s):
+        deslocamento[0] += max(0.0, s)
+
+    time.sleep = dormir
+    for nome in ("time", "monotonic", "perf_counter"):
+        setattr(time, nome, (lambda f: lambda: f() + deslocamento[0])(originais[nome]))
+    try:
+        yield
+    finally:
+        for nome, f in originais.items():
+            setattr(time, nome, f)
+
+# =========================
+# resumo
+# =========================
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Resumo de uma cassete WebDriver (comandos por tipo).")
+    ap.add_argument("cassete", type=Path)
+    args = ap.parse_args(argv)
+    cabecalho, fitas = ler_cassete(args.cassete)
+    print(f"{args.cassete.name}: {len(fitas)} comandos, sessão {cabecalho.get('session_id')}, "
+          f"{sum(1 for f in fitas if 'e' in f)} com erro")
+    for comando, n in Counter(f["c"] for f in fitas).most_common():
+        print(f"  {comando:<32} {n:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+# CadastroProdutos/_cdp.py
+# caminho rápido para os scripts do laço quente: Runtime.evaluate direto no websocket CDP da aba,
+# sem o salto HTTP pelo chromedriver; sem CDP disponível cai para driver.execute_script
+#
+#   python -m CadastroProdutos._cdp [--n 500]     (benchmark WebDriver x CDP)
+import argparse
+import itertools
+import json
+import statistics
+import threading
+import time
+
+from selenium.common.exceptions import JavascriptException
+from selenium.webdriver.remote.webelement import WebElement
+
+from CadastroProdutos._log import get_logger
+
+log = get_logger(__name__)
+
+
+class ExecutorCDP:
+    """
+    Mantém um websocket CDP aberto para a aba atual do driver e roda scripts no mesmo
+    formato do execute_script (corpo de função com 'arguments', valor via 'return').
+    Argumentos WebElement não atravessam o CDP: esses casos vão pelo WebDriver.
+    Qualquer falha de conexão desliga o caminho rápido e o executor segue pelo WebDriver.
+    """
+    def __init__(self, driver, timeout=60):
+        self.driver = driver
+        self.timeout = timeout
+        self._ws = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.disponivel = None          # None = ainda não tentou conectar
+        self.chamadas = {"cdp": 0, "webdriver": 0}
+
+    # -------- conexão --------
+    def _conectar(self):
+        try:
+            import websocket
+        except ImportError:
+            raise RuntimeError("caminho CDP precisa do websocket-client (pip install websocket-client)")
+        endereco = (self.driver.capabilities.get("goog:chromeOptions") or {}).get("debuggerAddress")
+        if not endereco:
+            raise RuntimeError("o driver não expõe debuggerAddress (não é Chrome/chromedriver?)")
+        alvo = self.driver.execute_cdp_cmd("Target.getTargetInfo", {})["targetInfo"]["targetId"]
+        # sem Origin: o Chrome recusa websockets de origens não liberadas por --remote-allow-origins
+        self._ws = websocket.create_connection(
+            f"ws://{endereco}/devtools/page/{alvo}", timeout=self.timeout, suppress_origin=True)
+
+    def _pronto(self):
+        if self.disponivel is None:
+            try:
+                self._conectar()
+                self.disponivel = True
+                log.debug("caminho CDP conectado")
+            except Exception as e:
+                self.disponivel = False
+                log.info("caminho CDP indisponível, usando WebDriver: %s", e)
+        return self.disponivel
+
+    def reiniciar(self):
+        """Descarta a conexão (ex.: trocou de aba); a próxima chamada reconecta na aba atual."""
+        self.fechar()
+        self.disponivel = None
+
+    def fechar(self):
+        if self._ws is not None:
+            try:
+                self._ws.close()
+            except Exception:
+                pass
+            self._ws = None
+
+    # -------- chamadas --------
+    def _comando(self, metodo, params):
+        id_ = next(self._ids)
+        self._ws.send(json.dumps({"id": id_, "method": metodo, "params": params}))
+        while True:
+            msg = json.loads(self._ws.recv())
+            if msg.get("id") == id_:   # eventos e respostas antigas são ignorados
+                if "error" in msg:
+                    raise RuntimeError(f"{metodo}: {msg['error'].get('message')}")
+                return msg["result"]
+
+    def executar(self, script, *args):
+        """Equivalente a driver.execute_script(script, *args) (aguarda Promises retornadas)."""
+        if any(isinstance(a, WebElement) for a in args):
+            self.chamadas["webdriver"] += 1
+            return self.driver.execute_script(script, *args)
+        with self._lock:
+            if self._pronto():
+                expr = f"(function(){{\n{script}\n}}).apply(window, {json.dumps(list(args))})"
+                try:
+                    r = self._comando("Runtime.evaluate", {
+                        "expression": expr, "returnByValue": True, "awaitPromise": True, "userGesture": True,
+                    })
+                except Exception as e:
+                    log.warning("caminho CDP caiu (%s: %s); voltando para WebDriver", type(e).__name__, e)
+                    self.fechar()
+                    self.disponivel = False
+                else:
+                    self.chamadas["cdp"] += 1
+                    if "exceptionDetails" in r:
+                        det = r["exceptionDetails"]
+                        raise JavascriptException((det.get("exception") or {}).get("description") or det.get("text"))
+                    return r.get("result", {}).get("value")
+        self.chamadas["webdriver"] += 1
+        return self.driver.execute_script(script, *args)
+
+# =========================
+# um executor por sessão
+# =========================
+_EXECUTORES = {}
+_lock_executores = threading.Lock()
+
+def executor_da_sessao(driver):
+    """ExecutorCDP da sessão WebDriver de 'driver' (criado na primeira chamada)."""
+    chave = getattr(driver, "session_id", None) or id(driver)
+    with _lock_executores:
+        ex = _EXECUTORES.get(chave)
+        if ex is None or ex.driver is not driver:
+            ex = _EXECUTORES[chave] = ExecutorCDP(driver)
+        return ex
+
+# =========================
+# benchmark
+# =========================
+# scripts no formato dos do laço quente (overlay, foco de linha, leitura de checkbox)
+_PAGINA = """<!doctype html><html><body>
+<div id="WaitPanelDialog" style="display:none"></div>
+<div id="tabPanelResultContainer"><table>""" + "".join(
+    f'<tr id="dataGrid_DXDataRow{i}"><td>{1000 + i}</td></tr>' for i in range(10)) + """</table></div>
+<input type="checkbox" id="NaoExibirNoCardapio" checked>
+</body></html>"""
+
+_SCRIPTS = {
+    "overlay": """
+        var dlg = document.getElementById('WaitPanelDialog');
+        if (!dlg) return false;
+        var s = getComputedStyle(dlg);
+        return !(s.display === 'none' || s.visibility === 'hidden');
+    """,
+    "linhas": """
+        var rows = document.querySelectorAll('tr[id^="dataGrid_DXDataRow"]');
+        return rows.length >= 1;
+    """,
+    "checkbox": """
+        var input = document.getElementById(arguments[0]);
+        return input && input.checked ? 'sim' : 'não';
+    """,
+}
+
+def _medir(funcao, n):
+    tempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    tempos.sort()
+    return {"media_ms": round(statistics.fmean(tempos), 3), "p50_ms": round(tempos[len(tempos) // 2], 3),
+            "p95_ms": round(tempos[int(len(tempos) * 0.95)], 3)}
+
+def benchmark(driver, n=500):
+    """Mede os mesmos scripts pelo WebDriver e pelo caminho CDP na aba atual."""
+    ex = ExecutorCDP(driver)
+    if not ex._pronto():
+        raise RuntimeError("caminho CDP indisponível neste driver; nada a comparar")
+    resultado = {}
+    for nome, js in _SCRIPTS.items():
+        args = ("NaoExibirNoCardapio",) if "arguments" in js else ()
+        assert driver.execute_script(js, *args) == ex.executar(js, *args)
+        resultado[nome] = {
+            "webdriver": _medir(lambda: driver.execute_script(js, *args), n),
+            "cdp": _medir(lambda: ex.executar(js, *args), n),
+        }
+    ex.fechar()
+    return resultado
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark execute_script (WebDriver) x Runtime.evaluate (CDP).")
+    ap.add_argument("--n", type=int, default=500, help="execuções por script e caminho")
+    ap.add_argument("--janela", action="store_true", help="abre o Chrome com janela (padrão: headless)")
+    args = ap.parse_args(argv)
+
+    from urllib.parse import quote
+    from selenium.webdriver.chrome.options import Options
+    from _chromedriver import criar_chrome
+
+    opts = Options()
+    if not args.janela:
+        opts.add_argument("--headless=new")
+    driver = criar_chrome(opts)
+    try:
+        driver.get("data:text/html;charset=utf-8," + quote(_PAGINA))
+        res = benchmark(driver, args.n)
+    finally:
+        driver.quit()
+    print(f"{'script':<10} {'caminho':<10} {'média':>9} {'p50':>9} {'p95':>9}")
+    for nome, por_caminho in res.items():
+        for caminho, m in por_caminho.items():
+            print(f"{nome:<10} {caminho:<10} {m['media_ms']:>7.3f}ms {m['p50_ms']:>7.3f}ms {m['p95_ms']:>7.3f}ms")
+        ganho = por_caminho["webdriver"]["media_ms"] / max(por_caminho["cdp"]["media_ms"], 1e-6)
+        print(f"{'':<10} {'ganho':<10} {ganho:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
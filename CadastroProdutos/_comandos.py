@@ -0,0 +1,109 @@
+# CadastroProdutos/_comandos.py
+# contador de round-trips WebDriver (por tipo de comando), por produto e por execução
+import threading
+import time
+
+
+class OrcamentoExcedido(AssertionError):
+    """Algum produto usou mais comandos WebDriver do que o orçamento permite."""
+
+
+class ContadorComandos:
+    """
+    Envolve driver.execute — por onde passam todos os comandos, inclusive os de
+    WebElement e execute_cdp_cmd — contando cada comando por tipo e somando a
+    latência. Os números ficam por produto (iniciar_produto/fechar_produto) e
+    acumulados na execução.
+    """
+    def __init__(self, driver):
+        self.driver = driver
+        self._original = None
+        self._lock = threading.Lock()
+        self.execucao = {}   # comando -> [n, segundos]
+        self.produto = {}    # idem, só do produto corrente
+        self.produtos = []   # [{"produto": rotulo, "total": n, "segundos": s, "comandos": {...}}]
+
+    # -------- instalação --------
+    def instalar(self):
+        if self._original is None:
+            self._original = self.driver.execute
+            self.driver.execute = self._execute
+        return self
+
+    def remover(self):
+        if self._original is None:
+            return
+        if getattr(self._original, "__self__", None) is self.driver and \
+                getattr(self._original, "__func__", None) is type(self.driver).execute:
+            try:
+                del self.driver.execute   # volta ao método da classe
+            except AttributeError:
+                pass
+        else:
+            self.driver.execute = self._original   # havia outro wrapper (ex.: cassete) por baixo
+        self._original = None
+
+    def _execute(self, driver_command, params=None):
+        t0 = time.perf_counter()
+        try:
+            return self._original(driver_command, params)
+        finally:
+            dt = time.perf_counter() - t0
+            with self._lock:
+                for tabela in (self.execucao, self.produto):
+                    acc = tabela.setdefault(driver_command, [0, 0.0])
+                    acc[0] += 1
+                    acc[1] += dt
+
+    # -------- por produto --------
+    def iniciar_produto(self):
+        with self._lock:
+            self.produto = {}
+
+    def fechar_produto(self, rotulo=None):
+        """Fecha a contagem do produto corrente e devolve o resumo dele."""
+        with self._lock:
+            tabela, self.produto = self.produto, {}
+        resumo = _resumir(tabela)
+        resumo["produto"] = rotulo
+        self.produtos.append(resumo)
+        return resumo
+
+    # -------- relatórios --------
+    def resumo(self):
+        """Totais da execução: total de comandos, segundos e detalhamento por comando."""
+        with self._lock:
+            tabela = {k: list(v) for k, v in self.execucao.items()}
+        resumo = _resumir(tabela)
+        resumo["produtos"] = len(self.produtos)
+        if self.produtos:
+            resumo["media_por_produto"] = round(sum(p["total"] for p in self.produtos) / len(self.produtos), 1)
+            resumo["max_por_produto"] = max(p["total"] for p in self.produtos)
+        return resumo
+
+    def excedentes(self, maximo):
+        """Produtos que usaram mais de 'maximo' comandos."""
+        return [p for p in self.produtos if p["total"] > maximo]
+
+    def verificar_orcamento(self, maximo):
+        """Levanta OrcamentoExcedido se algum produto passou de 'maximo' comandos (para testes)."""
+        acima = self.excedentes(maximo)
+        if acima:
+            pior = max(acima, key=lambda p: p["total"])
+            raise OrcamentoExcedido(
+                f"{len(acima)} produto(s) acima de {maximo} comandos WebDriver; "
+                f"pior: {pior['produto']!r} com {pior['total']} ({pior['comandos']})"
+            )
+
+
+def _resumir(tabela):
+    total = sum(n for n, _ in tabela.values())
+    segundos = sum(s for _, s in tabela.values())
+    comandos = {k: {"n": n, "ms": round(s * 1000, 1)}
+                for k, (n, s) in sorted(tabela.items(), key=lambda kv: -kv[1][0])}
+    return {"total": total, "segundos": round(segundos, 3), "comandos": comandos}
+
+
+def instrumentar(driver):
+    """Instala o contador em 'driver' e o devolve (use .remover() para desinstalar)."""
+    return ContadorComandos(driver).instalar()
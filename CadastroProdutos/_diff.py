@@ -0,0 +1,166 @@
+# CadastroProdutos/_diff.py
+# diff entre dois snapshots (aliquotas.csv) em memória limitada, emitindo eventos JSONL
+#
+#   python -m CadastroProdutos._diff aliquotas_antigo.csv aliquotas.csv [mudancas.jsonl]
+from pathlib import Path
+import argparse
+import csv
+import json
+import sys
+import tempfile
+import time
+import zlib
+
+DELIMITADOR = "|"
+CHAVES      = ("dominio", "codigo")   # colunas de chave (as que existirem nos dois arquivos)
+LIMITE_MB   = 64                      # tamanho do lado "antigo" carregado de uma vez; acima disso particiona
+
+# ==========================
+# leitura dos snapshots
+# ==========================
+def _abrir(caminho: Path):
+    f = caminho.open(newline="", encoding="utf-8-sig", errors="replace")
+    leitor = csv.reader(f, delimiter=DELIMITADOR)
+    cabecalho = [c.strip().lower() for c in next(leitor, [])]
+    return f, leitor, cabecalho
+
+def _colunas(cab_antigo, cab_novo):
+    """Índices das colunas de chave e das comparadas (comuns aos dois), em cada arquivo."""
+    chaves = [c for c in CHAVES if c in cab_antigo and c in cab_novo]
+    if "codigo" not in chaves:
+        raise RuntimeError("os dois snapshots precisam da coluna 'codigo'.")
+    campos = [c for c in cab_novo if c in cab_antigo and c not in chaves]
+    return chaves, campos
+
+def _linhas(leitor, cabecalho, chaves, campos):
+    """Gera (chave, valores) com chave = tupla das colunas de chave."""
+    ik = [cabecalho.index(c) for c in chaves]
+    ic = [cabecalho.index(c) for c in campos]
+    for linha in leitor:
+        if not linha:
+            continue
+        linha += [""] * (len(cabecalho) - len(linha))
+        chave = tuple(linha[i].strip() for i in ik)
+        if chave[-1]:
+            yield chave, [linha[i] for i in ic]
+
+# ==========================
+# partições (Grace hash join)
+# ==========================
+def _particao(chave, n):
+    return zlib.crc32(DELIMITADOR.join(chave).encode("utf-8")) % n
+
+def _particionar(linhas, n, pasta: Path, prefixo):
+    """Espalha as linhas em n arquivos pela hash da chave; retorna os caminhos."""
+    caminhos = [pasta / f"{prefixo}.{i:03d}" for i in range(n)]
+    arquivos = [c.open("w", newline="", encoding="utf-8") for c in caminhos]
+    try:
+        escritores = [csv.writer(a, delimiter=DELIMITADOR) for a in arquivos]
+        for chave, valores in linhas:
+            escritores[_particao(chave, n)].writerow(list(chave) + valores)
+    finally:
+        for a in arquivos:
+            a.close()
+    return caminhos
+
+def _ler_particao(caminho: Path, nchaves):
+    with caminho.open(newline="", encoding="utf-8") as f:
+        for linha in csv.reader(f, delimiter=DELIMITADOR):
+            yield tuple(linha[:nchaves]), linha[nchaves:]
+
+# ==========================
+# join
+# ==========================
+def _evento(tipo, chaves, chave, **dados):
+    ev = {"tipo": tipo}
+    ev.update(zip(chaves, chave))
+    ev.update(dados)
+    return ev
+
+def _juntar(antigas, novas, chaves, campos):
+    """Hash join de uma partição: tabela em memória com o lado antigo, novo em streaming."""
+    tabela = dict(antigas)   # chave repetida: vale a última linha
+    vistas = set()
+    for chave, valores in novas:
+        if chave in vistas:
+            continue
+        vistas.add(chave)
+        velho = tabela.pop(chave, None)
+        if velho is None:
+            yield _evento("adicionado", chaves, chave, campos=dict(zip(campos, valores)))
+            continue
+        mudancas = {c: {"de": a, "para": b} for c, a, b in zip(campos, velho, valores) if a != b}
+        if mudancas:
+            yield _evento("alterado", chaves, chave, mudancas=mudancas)
+    for chave, velho in tabela.items():
+        yield _evento("removido", chaves, chave, campos=dict(zip(campos, velho)))
+
+def diff_snapshots(antigo: Path, novo: Path, particoes=None, pasta_temp=None):
+    """
+    Gera os eventos de mudança de 'antigo' para 'novo' (dicts com tipo
+    adicionado/removido/alterado + colunas de chave). Com 1 partição o lado
+    antigo inteiro vai para um dict; com mais, os dois arquivos são espalhados
+    em disco pela hash da chave e cada par de partições é juntado à parte, então
+    a memória fica em ~1/particoes do antigo. A ordem dos eventos segue a das
+    partições (dentro delas: a ordem do arquivo novo, e os removidos no fim).
+    """
+    antigo, novo = Path(antigo), Path(novo)
+    if particoes is None:
+        particoes = max(1, -(-antigo.stat().st_size // (LIMITE_MB * 1024 * 1024)))
+    elif particoes < 1:
+        raise ValueError(f"particoes deve ser >= 1 (recebi {particoes})")
+
+    fa, la, cab_a = _abrir(antigo)
+    fn, ln, cab_n = _abrir(novo)
+    try:
+        chaves, campos = _colunas(cab_a, cab_n)
+        antigas = _linhas(la, cab_a, chaves, campos)
+        novas = _linhas(ln, cab_n, chaves, campos)
+        if particoes == 1:
+            yield from _juntar(antigas, novas, chaves, campos)
+            return
+        with tempfile.TemporaryDirectory(prefix="cadastro-diff-", dir=pasta_temp) as tmp:
+            pa = _particionar(antigas, particoes, Path(tmp), "antigo")
+            pn = _particionar(novas, particoes, Path(tmp), "novo")
+            fa.close(); fn.close()
+            for a, n in zip(pa, pn):
+                yield from _juntar(_ler_particao(a, len(chaves)), _ler_particao(n, len(chaves)), chaves, campos)
+                a.unlink(); n.unlink()
+    finally:
+        fa.close()
+        fn.close()
+
+# ==========================
+# CLI
+# ==========================
+def _positivo(v):
+    n = int(v)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"precisa ser >= 1 (recebi {v})")
+    return n
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Diff entre dois snapshots de extração, em JSON lines.")
+    ap.add_argument("antigo", type=Path)
+    ap.add_argument("novo", type=Path)
+    ap.add_argument("saida", type=Path, nargs="?", help="arquivo .jsonl (padrão: stdout)")
+    ap.add_argument("--particoes", type=_positivo, default=None,
+                    help=f"partições em disco (padrão: 1 a cada {LIMITE_MB} MB do snapshot antigo)")
+    args = ap.parse_args(argv)
+
+    t0 = time.time()
+    cont = {"adicionado": 0, "removido": 0, "alterado": 0}
+    saida = args.saida.open("w", encoding="utf-8") if args.saida else sys.stdout
+    try:
+        for ev in diff_snapshots(args.antigo, args.novo, particoes=args.particoes):
+            cont[ev["tipo"]] += 1
+            saida.write(json.dumps(ev, ensure_ascii=False) + "\n")
+    finally:
+        if saida is not sys.stdout:
+            saida.close()
+    print(f"{cont['adicionado']} adicionados, {cont['removido']} removidos, {cont['alterado']} alterados "
+          f"em {time.time() - t0:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# CadastroProdutos/_fila_retry.py
+# fila de reprocessamento das linhas que falharam durante a varredura
+from pathlib import Path
+import csv
+import heapq
+import itertools
+import time
+
+
+class FilaRetry:
+    """
+    Guarda itens (linhas da grid) que falharam para tentar de novo mais tarde,
+    com número de tentativas limitado e backoff exponencial entre elas.
+    Itens que estouram as tentativas viram falhas permanentes.
+    """
+    def __init__(self, max_tentativas=3, backoff=2.0, backoff_max=60.0):
+        self.max_tentativas = max_tentativas
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._heap = []                  # (pronto_em, seq, item)
+        self._seq = itertools.count()
+        self._tentativas = {}            # item -> tentativas já feitas
+        self._erros = {}                 # item -> último erro (texto)
+        self.falhas = []                 # [(item, tentativas, erro)]
+        self.total_retries = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def adicionar(self, item, erro):
+        """Registra a falha de 'item'. Retorna True se ainda vai ser tentado de novo."""
+        n = self._tentativas.get(item, 0) + 1
+        self._tentativas[item] = n
+        self._erros[item] = f"{type(erro).__name__}: {erro}" if isinstance(erro, BaseException) else str(erro)
+        if n >= self.max_tentativas:
+            self.falhas.append((item, n, self._erros[item]))
+            return False
+        espera = min(self.backoff * (2 ** (n - 1)), self.backoff_max)
+        heapq.heappush(self._heap, (time.time() + espera, next(self._seq), item))
+        return True
+
+    def desistir(self, item, erro, tentativas=1):
+        """Registra 'item' direto como falha permanente, sem novo retry ('tentativas' feitas fora da fila)."""
+        n = self._tentativas.get(item, 0) + tentativas
+        self._tentativas[item] = n
+        self._erros[item] = f"{type(erro).__name__}: {erro}" if isinstance(erro, BaseException) else str(erro)
+        self.falhas.append((item, n, self._erros[item]))
+
+    def drenar(self, processar):
+        """
+        Reprocessa a fila até esvaziar, respeitando o backoff de cada item.
+        'processar(item)' devolve o resultado ou levanta; falhas voltam para a fila.
+        Gera (item, resultado) para cada item que deu certo.
+        """
+        while self._heap:
+            pronto_em, _, item = heapq.heappop(self._heap)
+            espera = pronto_em - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            self.total_retries += 1
+            try:
+                resultado = processar(item)
+            except Exception as e:
+                self.adicionar(item, e)
+                continue
+            yield item, resultado
+
+    def pendentes(self):
+        """Itens ainda na fila (não drenados), com tentativas e último erro."""
+        return [(item, self._tentativas.get(item, 0), self._erros.get(item, ""))
+                for _, _, item in sorted(self._heap)]
+
+    def salvar_falhas(self, caminho: Path, cabecalho, incluir_pendentes=False):
+        """
+        Escreve as falhas permanentes (e, se pedido, as pendentes) em 'caminho'.
+        Cada item é uma tupla com os campos de 'cabecalho'; acrescenta tentativas|erro.
+        Retorna a quantidade de linhas escritas (0 = nada a reportar, arquivo não é criado).
+        """
+        linhas = list(self.falhas)
+        if incluir_pendentes:
+            linhas += self.pendentes()
+        if not linhas:
+            return 0
+        with caminho.open("w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f, delimiter="|")
+            w.writerow(list(cabecalho) + ["tentativas", "erro"])
+            for item, n, erro in linhas:
+                w.writerow(list(item) + [n, erro])
+        return len(linhas)
@@ -0,0 +1,254 @@
+# CadastroProdutos/_js.py
+# biblioteca JS window.__cadastro: instalada uma vez por documento, chamada com scripts mínimos
+import threading
+import zlib
+
+# funções do laço quente; cada uma vira window.__cadastro.<nome>
+FUNCOES = r"""
+function vis(el){
+    if (!el) return false;
+    var s = getComputedStyle(el);
+    if (s.display === 'none' || s.visibility === 'hidden') return false;
+    return !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+}
+function norm(s){
+    return (s || '').normalize('NFD').replace(/[\u0300-\u036f]/g, '')
+                    .replace(/\s+/g, ' ').trim().toLowerCase();
+}
+function container(){ return document.getElementById('tabPanelResultContainer'); }
+
+// underlay/overlay do Dojo (WaitPanel) bloqueando cliques
+C.overlay = function(){
+    var wrap = document.querySelector('[id^="dijit_DialogUnderlay_"]') ||
+               document.getElementById('dijit_DialogUnderlay_0');
+    var ul = document.getElementById('WaitPanelDialog_underlay') ||
+             (wrap ? wrap.querySelector('.dijitDialogUnderlay, ._underlay') : null);
+    var dlg = document.getElementById('WaitPanelDialog');
+    var dojoOpen = false;
+    try {
+        if (window.dijit && dijit.byId) {
+            var w = dijit.byId('WaitPanelDialog');
+            if (w && typeof w.get === 'function') dojoOpen = !!w.get('open');
+        }
+    } catch(e) {}
+    return dojoOpen || vis(wrap) || vis(ul) || vis(dlg);
+};
+
+C.resultadoVisivel = function(){
+    var e = document.getElementById('tabPanelEdition'), r = document.getElementById('tabPanelResult');
+    return !!(e && getComputedStyle(e).display == 'none' && r && getComputedStyle(r).display != 'none');
+};
+
+C.edicaoVisivel = function(){
+    var e = document.getElementById('tabPanelEdition');
+    return !!(e && getComputedStyle(e).display != 'none');
+};
+
+// ao menos 1 linha de dados na grid
+C.linhasCarregadas = function(){
+    var rc = container();
+    if (!rc) return false;
+    var tbl = rc.querySelector('.dxgvTable,[id^="dataGrid_DXMainTable"]');
+    if (!tbl) return false;
+    return tbl.querySelectorAll('tr[id^="dataGrid_DXDataRow"], tr.dxgvDataRow').length >= 1;
+};
+
+// 1 linha de dados OU a linha de "sem dados"
+C.gridCarregada = function(){
+    var rc = container();
+    if (!rc) return false;
+    if (rc.querySelector('tr[id^="dataGrid_DXDataRow"], tr.dxgvDataRow')) return true;
+    return !!rc.querySelector('tr[id^="dataGrid_DXEmptyRow"], tr.dxgvEmptyDataRow');
+};
+
+C.proximaPagina = function(){
+    try {
+        var root = container() || document;
+        var pager = root.querySelector('[id*="_DXPagerBottom"], .dxgvPagerBottom, .dxpLite') || root;
+        var curEl = pager.querySelector('.dxp-current');
+        var cur = curEl ? parseInt(curEl.textContent.trim(), 10) : NaN;
+        if (isNaN(cur)) return false;
+        var links = pager.querySelectorAll('a.dxp-num');
+        for (var i = 0; i < links.length; i++) {
+            if (links[i].textContent.trim() === String(cur + 1)) { links[i].click(); return true; }
+        }
+        if (window.ASPx && ASPx.GVPagerOnClick) {
+            ASPx.GVPagerOnClick('dataGrid', 'PN' + cur); // cur=1 => PN1 (vai pra 2)
+            return true;
+        }
+    } catch(e) {}
+    return false;
+};
+
+// menor índice global (DXDataRow<g>) visível
+C.indiceBase = function(){
+    var rc = container();
+    if (!rc) return 0;
+    var rows = rc.querySelectorAll('tr[id^="dataGrid_DXDataRow"]'), min = null;
+    for (var i = 0; i < rows.length; i++) {
+        var m = (rows[i].id || '').match(/DXDataRow(\d+)$/);
+        if (m) { var v = parseInt(m[1], 10); if (min === null || v < min) min = v; }
+    }
+    return min === null ? 0 : min;
+};
+
+C.focarLinha = function(g, selecionar){
+    try {
+        if (window.dataGrid) {
+            dataGrid.SetFocusedRowIndex(g);
+            if (selecionar && dataGrid.SelectRow) dataGrid.SelectRow(g);
+        }
+    } catch(e) {}
+    return true;
+};
+
+C.editar = function(g){
+    if (g !== null && g !== undefined) C.focarLinha(g, false);
+    try { runInSession('editItem()'); } catch(e) {}
+    return true;
+};
+
+// [[g, codigo], ...] pela coluna de cabeçalho 'rotulo' (ou só a linha 'so'); null sem a coluna
+C.chaves = function(rotulo, so){
+    rotulo = (rotulo || '').toLowerCase();
+    function n(s){ return (s || '').replace(/\s+/g, ' ').trim().toLowerCase(); }
+    var rc = container();
+    if (!rc) return [];
+    var idx = -1, heads = rc.querySelectorAll('[id^="dataGrid_col"]');
+    for (var i = 0; i < heads.length; i++) {
+        if (n(heads[i].textContent) === rotulo) { idx = (heads[i].closest('td') || heads[i]).cellIndex; break; }
+    }
+    if (idx < 0) return null;
+    var out = [], rows = rc.querySelectorAll('tr[id^="dataGrid_DXDataRow"]');
+    for (var j = 0; j < rows.length; j++) {
+        var m = (rows[j].id || '').match(/DXDataRow(\d+)$/);
+        if (!m) continue;
+        var g = parseInt(m[1], 10);
+        if (so !== null && so !== undefined && g !== so) continue;
+        var cel = rows[j].cells[idx];
+        out.push([g, cel ? cel.textContent.trim() : '']);
+    }
+    out.sort(function(a, b){ return a[0] - b[0]; });
+    return out;
+};
+
+// 'sim'/'não' do checkbox (widget Dojo, checked, aria-checked, classe, atributo)
+C.checkbox = function(id){
+    var input = document.getElementById(id) || document.querySelector("input[name='" + id + "']");
+    var cont = input ? (input.closest('.dijitCheckBox') || input.parentElement) : null;
+    try {
+        if (window.dijit && dijit.byId) {
+            var w = dijit.byId(id);
+            if (w && typeof w.get === 'function') return w.get('checked') ? 'sim' : 'não';
+        }
+    } catch(e) {}
+    if (input && typeof input.checked !== 'undefined') return input.checked ? 'sim' : 'não';
+    if (input) {
+        var ac = (input.getAttribute('aria-checked') || '').toLowerCase();
+        if (ac === 'true') return 'sim';
+        if (ac === 'false') return 'não';
+    }
+    if (cont && /\bdijitCheckBoxChecked\b/.test(cont.className)) return 'sim';
+    if (input && input.getAttribute('checked') !== null) return 'sim';
+    return 'não';
+};
+
+// valores de campos do edit form mesmo em aba oculta; null = ainda não está no DOM
+C.campos = function(ids){
+    var out = {}, c = document.getElementById('tabPanelEditionContainer') || document;
+    for (var i = 0; i < ids.length; i++) {
+        var id = ids[i];
+        var el = document.getElementById(id) || c.querySelector("[name='" + id + "']");
+        if (el && !/^(INPUT|TEXTAREA|SELECT)$/.test(el.tagName))
+            el = el.querySelector('input, textarea, select') || el;
+        if (!el) el = c.querySelector("input[id^='" + id + "'], input[name*='" + id + "']");
+        out[id] = el ? String(el.value != null ? el.value : el.textContent || '').trim() : null;
+    }
+    return out;
+};
+
+// clica o botão com um dos 'rotulos' na modal visível do topo; Promise com o resultado
+C.modal = function(rotulos, esperaMs){
+    var fim = Date.now() + (esperaMs || 0), alvos = (rotulos || []).map(norm);
+    function topo(){
+        var cands = document.querySelectorAll('.bootbox.modal, .modal'), best = null, bz = -Infinity;
+        for (var i = 0; i < cands.length; i++) {
+            if (!vis(cands[i])) continue;
+            var z = parseInt(getComputedStyle(cands[i]).zIndex, 10) || 0;
+            if (z >= bz) { best = cands[i]; bz = z; }   // empate: o último no DOM
+        }
+        return best;
+    }
+    return new Promise(function(cb){
+        function tenta(){
+            var m = topo();
+            if (!m) {
+                if (Date.now() < fim) return setTimeout(tenta, 50);
+                return cb('sem-modal');
+            }
+            var bts = [].filter.call(m.querySelectorAll('button, a, input[type=button], input[type=submit]'), vis);
+            var txt = bts.map(function(b){ return norm(b.value && b.tagName === 'INPUT' ? b.value : b.textContent); });
+            for (var a = 0; a < alvos.length; a++)
+                for (var i = 0; i < bts.length; i++)
+                    if (txt[i] === alvos[a]) { bts[i].click(); return cb('clicado'); }
+            for (var a = 0; a < alvos.length; a++)
+                for (var i = 0; i < bts.length; i++)
+                    if (alvos[a] && txt[i].indexOf(alvos[a]) >= 0) { bts[i].click(); return cb('clicado'); }
+            if (Date.now() < fim) return setTimeout(tenta, 50);
+            cb('sem-botao: ' + txt.join(' / '));
+        }
+        tenta();
+    });
+};
+"""
+
+# muda sozinha quando FUNCOES muda: documento com versão antiga recebe a nova
+VERSAO = format(zlib.crc32(FUNCOES.encode("utf-8")), "08x")
+
+LIB = (
+    "(function(){\n"
+    f"if (window.__cadastro && window.__cadastro.v === '{VERSAO}') return;\n"
+    f"var C = {{v: '{VERSAO}'}};\n"
+    + FUNCOES +
+    "\nwindow.__cadastro = C;\n})();"
+)
+
+AUSENTE = "__cadastro_ausente__"
+
+def _chamada(nome):
+    return (f"var C = window.__cadastro;"
+            f"return C && C.v === '{VERSAO}' ? C.{nome}.apply(null, arguments) : '{AUSENTE}';")
+
+_registradas = set()
+_lock = threading.Lock()
+
+def _registrar_novos_documentos(driver):
+    """Pede ao Chrome para injetar a LIB em todo documento novo (1x por sessão; opcional)."""
+    chave = getattr(driver, "session_id", None) or id(driver)
+    with _lock:
+        if chave in _registradas:
+            return
+        _registradas.add(chave)
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": LIB})
+    except Exception:
+        pass   # sem CDP: a LIB é reinstalada sob demanda pelo chamar()
+
+def instalar(driver, executar=None):
+    executar = executar or driver.execute_script
+    executar(LIB)
+    _registrar_novos_documentos(driver)
+
+def chamar(driver, nome, *args, executar=None):
+    """
+    Executa window.__cadastro.<nome>(*args) com um script de uma linha. Se o documento
+    ainda não tem a LIB (navegação, reload) ou tem outra versão, instala e repete.
+    'executar(script, *args)' troca o transporte (padrão: driver.execute_script).
+    """
+    executar = executar or driver.execute_script
+    script = _chamada(nome)
+    res = executar(script, *args)
+    if res == AUSENTE:
+        instalar(driver, executar)
+        res = executar(script, *args)
+    return res
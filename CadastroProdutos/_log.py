@@ -0,0 +1,155 @@
+# CadastroProdutos/_log.py
+# logging estruturado (JSON lines) do pacote, com fila para não bloquear a thread de scraping
+from pathlib import Path
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+ARQUIVO_LOG   = Path(__file__).parent / "logs" / "cadastro.jsonl"
+NIVEL_ARQUIVO = logging.DEBUG
+NIVEL_CONSOLE = logging.INFO
+
+# limite de mensagens repetidas (mesmo template) por janela; WARNING+ sempre passa
+LIMITE_POR_JANELA = 20
+JANELA_S          = 10.0
+
+RAIZ = "CadastroProdutos"
+
+# =========================
+# contexto por produto
+# =========================
+_contexto = contextvars.ContextVar("cadastro_contexto", default={})
+
+@contextlib.contextmanager
+def contexto(**campos):
+    """Acrescenta campos (p, g, codigo, fase...) a todo log emitido dentro do bloco."""
+    token = _contexto.set({**_contexto.get(), **campos})
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+def campos_contexto():
+    """Cópia dos campos de contexto ativos (para quem precisa correlacionar fora do logging)."""
+    return dict(_contexto.get())
+
+# =========================
+# filtros / formatadores
+# =========================
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "ctx"}
+
+class _InjetaContexto(logging.Filter):
+    """Copia o contexto da thread que emitiu para o record (antes de ir para a fila)."""
+    def filter(self, record):
+        record.ctx = _contexto.get()
+        return True
+
+class LimiteTaxa(logging.Filter):
+    """
+    Deixa passar no máximo 'limite' mensagens com o mesmo template por janela.
+    As suprimidas são contadas e informadas no campo 'suprimidas' da próxima que passar.
+    """
+    def __init__(self, limite=LIMITE_POR_JANELA, janela=JANELA_S):
+        super().__init__()
+        self.limite = limite
+        self.janela = janela
+        self._estado = {}   # chave -> [inicio_janela, emitidas, suprimidas]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        chave = (record.name, record.levelno, str(record.msg))
+        agora = time.monotonic()
+        with self._lock:
+            est = self._estado.get(chave)
+            if est is None or agora - est[0] >= self.janela:
+                suprimidas = est[2] if est else 0
+                self._estado[chave] = [agora, 1, 0]
+                if suprimidas:
+                    record.suprimidas = suprimidas
+                return True
+            if est[1] < self.limite:
+                est[1] += 1
+                return True
+            est[2] += 1
+            return False
+
+class FormatoJSON(logging.Formatter):
+    """Uma linha JSON por record: ts, nivel, logger, msg + contexto + campos de 'extra'."""
+    def format(self, record):
+        doc = {
+            "ts": round(record.created, 3),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        doc.update(getattr(record, "ctx", None) or {})
+        for k, v in vars(record).items():
+            if k not in _ATRIBUTOS_PADRAO:
+                doc[k] = v
+        return json.dumps(doc, ensure_ascii=False, default=str)
+
+class FormatoConsole(logging.Formatter):
+    """'NIVEL: msg [p=.. g=.. codigo=..]' para acompanhar a execução no terminal."""
+    def format(self, record):
+        ctx = getattr(record, "ctx", None) or {}
+        sufixo = " ".join(f"{k}={v}" for k, v in ctx.items() if v is not None)
+        texto = f"{record.levelname}: {record.getMessage()}"
+        return f"{texto} [{sufixo}]" if sufixo else texto
+
+# =========================
+# configuração
+# =========================
+_listener = None
+_lock_config = threading.Lock()
+
+def configurar(arquivo: Path = ARQUIVO_LOG, nivel_console=NIVEL_CONSOLE, nivel_arquivo=NIVEL_ARQUIVO):
+    """
+    Liga o logger 'CadastroProdutos' numa QueueHandler; um QueueListener em thread
+    própria grava no console (texto) e em 'arquivo' (JSON lines). Idempotente.
+    """
+    global _listener
+    with _lock_config:
+        if _listener is not None:
+            return
+        fila = queue.SimpleQueue()
+        qh = logging.handlers.QueueHandler(fila)
+        qh.addFilter(_InjetaContexto())
+        qh.addFilter(LimiteTaxa())
+
+        console = logging.StreamHandler(sys.stdout)
+        console.setLevel(nivel_console)
+        console.setFormatter(FormatoConsole())
+        handlers = [console]
+        if arquivo:
+            try:
+                arquivo.parent.mkdir(parents=True, exist_ok=True)
+                arq = logging.FileHandler(arquivo, encoding="utf-8")
+                arq.setLevel(nivel_arquivo)
+                arq.setFormatter(FormatoJSON())
+                handlers.append(arq)
+            except Exception:
+                pass
+
+        raiz = logging.getLogger(RAIZ)
+        raiz.setLevel(min(h.level for h in handlers))
+        raiz.addHandler(qh)
+        raiz.propagate = False
+
+        _listener = logging.handlers.QueueListener(fila, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def get_logger(nome=RAIZ):
+    """Logger do pacote (módulos importados como top-level também ficam sob 'CadastroProdutos')."""
+    configurar()
+    nome = nome.rsplit(".", 1)[-1]
+    return logging.getLogger(RAIZ if nome == RAIZ else f"{RAIZ}.{nome}")
@@ -0,0 +1,147 @@
+# CadastroProdutos/_lookup.py
+# cache, por sessão do navegador, das tabelas de opções dos dropdowns (NCM, CST, CFOP, grupo...)
+import threading
+
+from CadastroProdutos._log import get_logger
+
+log = get_logger(__name__)
+
+# tabela de opções de cada id: ASPxComboBox, dijit (getOptions/store) ou <select> nativo
+JS_OPCOES = r"""
+    var ids = arguments[0], out = {};
+    function limpo(s){ return String(s == null ? '' : s).replace(/<[^>]*>/g, '').trim(); }
+    function opcoes(id){
+        try {
+            if (window.ASPxClientControl) {
+                var c = ASPxClientControl.GetControlCollection().GetByName(id);
+                if (c && c.GetItemCount) {
+                    var r = [];
+                    for (var i = 0; i < c.GetItemCount(); i++) {
+                        var it = c.GetItem(i);
+                        r.push([limpo(it.value), limpo(it.text)]);
+                    }
+                    return r;
+                }
+            }
+        } catch(e) {}
+        try {
+            var w = window.dijit && dijit.byId ? dijit.byId(id) : null;
+            if (w) {
+                if (typeof w.getOptions === 'function')
+                    return w.getOptions().map(function(o){ return [limpo(o.value), limpo(o.label)]; });
+                var st = w.store, itens = st ? (st.data || (st.query ? st.query({}) : null)) : null;
+                if (itens) {
+                    var lab = w.searchAttr || w.labelAttr || 'name', chave = st.idProperty || 'id';
+                    return [].map.call(itens, function(o){ return [limpo(o[chave]), limpo(o[lab])]; });
+                }
+            }
+        } catch(e) {}
+        var el = document.getElementById(id) || document.querySelector("select[name='" + id + "']");
+        if (el && el.tagName === 'SELECT')
+            return [].map.call(el.options, function(o){ return [limpo(o.value), limpo(o.text)]; });
+        return null;
+    }
+    for (var i = 0; i < ids.length; i++) out[ids[i]] = opcoes(ids[i]);
+    return out;
+"""
+
+# só a chave selecionada (e o texto exibido, para fallback) de cada id
+JS_SELECIONADOS = r"""
+    var ids = arguments[0], out = {};
+    function limpo(s){ return String(s == null ? '' : s).trim(); }
+    function sel(id){
+        try {
+            if (window.ASPxClientControl) {
+                var c = ASPxClientControl.GetControlCollection().GetByName(id);
+                if (c && c.GetValue) return [limpo(c.GetValue()), limpo(c.GetText ? c.GetText() : '')];
+            }
+        } catch(e) {}
+        try {
+            var w = window.dijit && dijit.byId ? dijit.byId(id) : null;
+            if (w && typeof w.get === 'function') return [limpo(w.get('value')), limpo(w.get('displayedValue'))];
+        } catch(e) {}
+        var el = document.getElementById(id) || document.querySelector("[name='" + id + "']");
+        if (!el) return null;
+        if (el.tagName === 'SELECT') {
+            var o = el.options[el.selectedIndex];
+            return [limpo(el.value), o ? limpo(o.text) : ''];
+        }
+        return [limpo(el.value), ''];
+    }
+    for (var i = 0; i < ids.length; i++) out[ids[i]] = sel(ids[i]);
+    return out;
+"""
+
+class CacheLookup:
+    """
+    Tabelas chave -> texto dos dropdowns, carregadas uma vez por sessão (id do widget).
+    Por produto só se lê a chave selecionada de cada widget (1 execute_script para todos)
+    e o texto sai da memória. Chave desconhecida recarrega a tabela daquele widget uma vez.
+    """
+    def __init__(self, driver):
+        self.driver = driver
+        self.tabelas = {}     # id -> {chave: texto}
+        self._ausentes = set()  # (id, chave) que nem recarregando apareceram na tabela
+        self._lock = threading.Lock()
+        self.carregamentos = 0
+
+    def carregar(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        res = self.driver.execute_script(JS_OPCOES, ids) or {}
+        with self._lock:
+            for id_ in ids:
+                if res.get(id_) is not None:
+                    self.tabelas[id_] = dict(res[id_])
+                    self.carregamentos += 1
+        log.debug("tabelas de lookup carregadas", extra={"ids": ids, "tamanhos":
+                  {i: len(self.tabelas.get(i, {})) for i in ids}})
+
+    def invalidar(self, id_=None):
+        with self._lock:
+            if id_ is None:
+                self.tabelas.clear()
+                self._ausentes.clear()
+            else:
+                self.tabelas.pop(id_, None)
+                self._ausentes = {a for a in self._ausentes if a[0] != id_}
+
+    def resolver(self, ids):
+        """{id: texto} da opção selecionada em cada widget (None se o widget ainda não existe)."""
+        ids = list(ids)
+        sel = self.driver.execute_script(JS_SELECIONADOS, ids) or {}
+
+        # tabela ainda não carregada, ou chave que não está nela (opção nova, ou tabela lida
+        # antes de o widget popular): (re)carrega só esses widgets, numa chamada
+        carregar = [i for i in ids if sel.get(i) and (
+            i not in self.tabelas or
+            (sel[i][0] and sel[i][0] not in self.tabelas[i] and (i, sel[i][0]) not in self._ausentes))]
+        if carregar:
+            self.carregar(carregar)
+            self._ausentes.update((i, sel[i][0]) for i in carregar
+                                  if sel[i][0] and sel[i][0] not in self.tabelas.get(i, {}))
+
+        out = {}
+        for i in ids:
+            if not sel.get(i):
+                out[i] = None
+                continue
+            chave, exibido = sel[i]
+            out[i] = self.tabelas.get(i, {}).get(chave) or exibido or chave
+        return out
+
+# =========================
+# um cache por sessão
+# =========================
+_CACHES = {}
+_lock_caches = threading.Lock()
+
+def cache_da_sessao(driver):
+    """CacheLookup da sessão WebDriver de 'driver' (criado na primeira chamada)."""
+    chave = getattr(driver, "session_id", None) or id(driver)
+    with _lock_caches:
+        cache = _CACHES.get(chave)
+        if cache is None or cache.driver is not driver:
+            cache = _CACHES[chave] = CacheLookup(driver)
+        return cache
@@ -0,0 +1,243 @@
+# CadastroProdutos/_metricas.py
+# métricas da execução no formato texto do Prometheus, servidas por HTTP numa thread à parte
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import math
+import os
+import threading
+import time
+
+# ======================
+# tipos de métrica
+# ======================
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._lock = threading.Lock()
+
+    def _cabecalho(self):
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+def _num(v):
+    if v is None or (isinstance(v, float) and math.isnan(v)):
+        return "NaN"
+    if isinstance(v, float) and math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda):
+        super().__init__(nome, ajuda)
+        self.valor = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.valor += n
+
+    def texto(self):
+        return self._cabecalho() + [f"{self.nome} {_num(self.valor)}"]
+
+class Medidor(_Metrica):
+    """Gauge: valor definido diretamente ou calculado na hora da coleta (função)."""
+    tipo = "gauge"
+
+    def __init__(self, nome, ajuda, funcao=None):
+        super().__init__(nome, ajuda)
+        self.valor = None
+        self.funcao = funcao
+
+    def definir(self, valor):
+        if callable(valor):
+            self.funcao = valor
+        else:
+            self.valor = valor
+
+    def texto(self):
+        v = self.valor
+        if self.funcao is not None:
+            try:
+                v = self.funcao()
+            except Exception:
+                v = None
+        return self._cabecalho() + [f"{self.nome} {_num(v)}"]
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, buckets):
+        super().__init__(nome, ajuda)
+        self.buckets = tuple(sorted(buckets))
+        self._contagens = [0] * len(self.buckets)
+        self._soma = 0.0
+        self._n = 0
+        self._assinantes = []
+
+    def assinar(self, funcao):
+        """Chama funcao(v) a cada observação (ex.: controlador de concorrência)."""
+        self._assinantes.append(funcao)
+
+    def cancelar(self, funcao):
+        try:
+            self._assinantes.remove(funcao)
+        except ValueError:
+            pass
+
+    def observar(self, v):
+        with self._lock:
+            self._soma += v
+            self._n += 1
+            for i, b in enumerate(self.buckets):
+                if v <= b:
+                    self._contagens[i] += 1
+                    break
+        for f in list(self._assinantes):
+            try:
+                f(v)
+            except Exception:
+                pass
+
+    def texto(self):
+        with self._lock:
+            cont, soma, n = list(self._contagens), self._soma, self._n
+        linhas, acc = self._cabecalho(), 0
+        for b, c in zip(self.buckets, cont):
+            acc += c
+            linhas.append(f'{self.nome}_bucket{{le="{_num(float(b))}"}} {acc}')
+        linhas.append(f'{self.nome}_bucket{{le="+Inf"}} {n}')
+        linhas.append(f"{self.nome}_sum {_num(soma)}")
+        linhas.append(f"{self.nome}_count {n}")
+        return linhas
+
+class Taxa:
+    """Eventos por segundo numa janela deslizante (para o gauge de produtos/s)."""
+    def __init__(self, janela=60.0):
+        self.janela = janela
+        self._ts = deque()
+        self._lock = threading.Lock()
+
+    def marcar(self):
+        with self._lock:
+            self._ts.append(time.monotonic())
+
+    def por_segundo(self):
+        agora = time.monotonic()
+        with self._lock:
+            while self._ts and agora - self._ts[0] > self.janela:
+                self._ts.popleft()
+            if not self._ts:
+                return 0.0
+            return len(self._ts) / min(self.janela, max(agora - self._ts[0], 1.0))
+
+# ======================
+# métricas do pacote
+# ======================
+class Metricas:
+    def __init__(self):
+        self._taxa = Taxa()
+        self.produtos = Contador("cadastro_produtos_extraidos_total", "Produtos extraídos com sucesso.")
+        self.falhas = Contador("cadastro_falhas_linha_total", "Linhas que falharam (cada tentativa).")
+        self.retries = Contador("cadastro_retries_total", "Reprocessamentos de linhas da fila de retry.")
+        self.produtos_por_segundo = Medidor(
+            "cadastro_produtos_por_segundo", "Produtos/s nos últimos 60s.", self._taxa.por_segundo)
+        self.waitpanel = Histograma(
+            "cadastro_waitpanel_segundos", "Tempo esperando o WaitPanel sumir.",
+            (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 250))
+        self.virada_pagina = Histograma(
+            "cadastro_virada_pagina_segundos", "Latência para carregar a próxima página/lote da grid.",
+            (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60))
+        self.pagina = Medidor("cadastro_pagina_atual", "Página (ou lote, no modo chave) atual.")
+        self.indice = Medidor("cadastro_indice_global", "Índice global g da linha atual.")
+        self.rss_navegador = Medidor("cadastro_navegador_rss_bytes", "RSS somado do chromedriver e do Chrome.")
+        self.sessoes = Medidor("cadastro_sessoes_ativas", "Sessões de navegador liberadas pelo controlador AIMD.")
+        self.heap_aba = Medidor("cadastro_aba_js_heap_bytes", "JSHeapUsedSize da aba (CDP Performance.getMetrics).")
+        self.reciclagens = Contador("cadastro_reciclagens_aba_total", "Abas trocadas por uma nova para liberar memória.")
+
+    def produto_extraido(self):
+        self.produtos.inc()
+        self._taxa.marcar()
+
+    def posicao(self, p, g):
+        self.pagina.definir(p)
+        self.indice.definir(g)
+
+    def texto(self):
+        linhas = []
+        for m in (self.produtos, self.produtos_por_segundo, self.falhas, self.retries,
+                  self.waitpanel, self.virada_pagina, self.pagina, self.indice, self.rss_navegador,
+                  self.sessoes, self.heap_aba, self.reciclagens):
+            linhas += m.texto()
+        return "\n".join(linhas) + "\n"
+
+METRICAS = Metricas()
+
+# ======================
+# RSS do navegador
+# ======================
+def _rss_proc(pid):
+    """RSS (bytes) de pid e descendentes via /proc (Linux), sem psutil."""
+    filhos = {}
+    for d in Path("/proc").iterdir():
+        if not d.name.isdigit():
+            continue
+        try:
+            ppid = int((d / "stat").read_text().rsplit(")", 1)[1].split()[1])
+        except Exception:
+            continue
+        filhos.setdefault(ppid, []).append(int(d.name))
+    total, pilha = 0, [pid]
+    pagina = os.sysconf("SC_PAGE_SIZE")
+    while pilha:
+        p = pilha.pop()
+        try:
+            total += int(Path(f"/proc/{p}/statm").read_text().split()[1]) * pagina
+        except Exception:
+            pass
+        pilha += filhos.get(p, [])
+    return total
+
+def rss_navegador(driver):
+    """RSS somado do chromedriver e de todos os processos do Chrome abaixo dele (None se indisponível)."""
+    try:
+        pid = driver.service.process.pid
+    except Exception:
+        return None
+    try:
+        import psutil
+    except ImportError:
+        return _rss_proc(pid) if Path("/proc").is_dir() else None
+    try:
+        raiz = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [raiz] + raiz.children(recursive=True))
+    except Exception:
+        return None
+
+# ======================
+# servidor HTTP
+# ======================
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        corpo = METRICAS.texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+def servir(porta, host="127.0.0.1"):
+    """Sobe o endpoint /metrics numa thread daemon. Retorna o servidor (use .shutdown() ao final)."""
+    srv = ThreadingHTTPServer((host, porta), _Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="cadastro-metricas", daemon=True).start()
+    return srv
@@ -0,0 +1,211 @@
+# CadastroProdutos/_paralelo.py
+# várias sessões do navegador em paralelo, com a concorrência ajustada por AIMD
+import queue
+import threading
+import time
+
+from CadastroProdutos._log import get_logger, contexto
+from CadastroProdutos._metricas import METRICAS
+
+log = get_logger(__name__)
+
+# =========================
+# fábrica de sessões
+# =========================
+# quem faz o login (gpt_selenium) registra aqui como abrir mais uma sessão já na
+# tela de Produto/Serviço da mesma loja; os extratores só pedem sessões novas
+_fabrica = None
+_relogar = None   # relogar(driver) -> True se a sessão tinha caído no login e foi refeita
+_liberar = None   # liberar(driver): a sessão aberta pela fábrica vai ser fechada
+
+def registrar_fabrica(funcao, relogar=None, liberar=None):
+    """
+    funcao() -> driver novo, logado e na tela de cadastro (None desliga).
+    relogar/liberar: ganchos opcionais do rodízio de contas (gpt_selenium.Contas).
+    """
+    global _fabrica, _relogar, _liberar
+    _fabrica = funcao
+    _relogar = relogar
+    _liberar = liberar
+
+def fabrica_sessao():
+    return _fabrica
+
+# =========================
+# controlador AIMD
+# =========================
+def _percentil(valores, q):
+    v = sorted(valores)
+    return v[min(len(v) - 1, int(q * len(v)))] if v else 0.0
+
+class ControladorAIMD:
+    """
+    Limite de sessões ativas em aumento aditivo / redução multiplicativa.
+    Observa latências (WaitPanel e callbacks da grid) e o resultado de cada unidade
+    de trabalho; a cada janela de 'amostras' latências decide:
+      - p90 acima do alvo ou taxa de erro acima do máximo -> limite *= fator
+      - senão                                             -> limite += aumento
+    Depois de cada mudança espera 'espera_s' antes de reavaliar (sessões novas ainda
+    estão logando; numa redução, o servidor ainda está drenando a carga anterior).
+    """
+    def __init__(self, alvo_s=5.0, minimo=1, maximo=4, aumento=1.0, fator=0.5,
+                 amostras=30, erro_max=0.1, espera_s=30.0, inicial=1):
+        self.alvo_s = alvo_s
+        self.minimo = minimo
+        self.maximo = maximo
+        self.aumento = aumento
+        self.fator = fator
+        self.amostras = amostras
+        self.erro_max = erro_max
+        self.espera_s = espera_s
+        self.limite = float(max(minimo, min(maximo, inicial)))
+        self._lat = []
+        self._ok = 0
+        self._erros = 0
+        self._mudou_em = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ativos(self):
+        return max(self.minimo, int(self.limite))
+
+    def observar(self, segundos):
+        with self._lock:
+            self._lat.append(segundos)
+
+    def resultado(self, ok):
+        with self._lock:
+            if ok:
+                self._ok += 1
+            else:
+                self._erros += 1
+
+    def ajustar(self):
+        """Reavalia o limite se a janela já tem amostras suficientes. Retorna o nº de sessões ativas."""
+        with self._lock:
+            agora = time.monotonic()
+            total = self._ok + self._erros
+            taxa_erro = self._erros / total if total else 0.0
+            if agora - self._mudou_em < self.espera_s:
+                return self.ativos
+            estouro_erro = total >= 5 and taxa_erro > self.erro_max
+            if len(self._lat) < self.amostras and not estouro_erro:
+                return self.ativos
+            p90 = _percentil(self._lat, 0.9)
+            antes = self.limite
+            if estouro_erro or p90 > self.alvo_s:
+                self.limite = max(float(self.minimo), self.limite * self.fator)
+            else:
+                self.limite = min(float(self.maximo), self.limite + self.aumento)
+            self._lat, self._ok, self._erros = [], 0, 0
+            self._mudou_em = agora
+        if int(antes) != int(self.limite):
+            log.info("sessões ativas %d -> %d (p90 %.1fs, alvo %.1fs, erros %.0f%%)",
+                     int(antes), self.ativos, p90, self.alvo_s, 100 * taxa_erro)
+        return self.ativos
+
+    def assinar(self, metricas=METRICAS):
+        """Passa a receber as latências de WaitPanel e de virada de página/filtro da grid."""
+        metricas.waitpanel.assinar(self.observar)
+        metricas.virada_pagina.assinar(self.observar)
+        metricas.sessoes.definir(lambda: self.ativos)
+
+    def cancelar(self, metricas=METRICAS):
+        metricas.waitpanel.cancelar(self.observar)
+        metricas.virada_pagina.cancelar(self.observar)
+
+# =========================
+# pool de sessões
+# =========================
+def _tentar_relogar(relogar, drv):
+    try:
+        return bool(relogar(drv))
+    except Exception as e:
+        log.warning("não consegui relogar a sessão (%s: %s)", type(e).__name__, e)
+        return False
+
+def executar_paralelo(driver, unidades, processar, controlador, fabrica=None, relogar=None):
+    """
+    Distribui 'unidades' (ex.: páginas) entre sessões: a de 'driver' e outras abertas
+    com 'fabrica' conforme o controlador libera. Sessões acima do limite atual ficam
+    pausadas (abertas, sem pegar trabalho) até o limite subir de novo.
+    Unidade que falha numa sessão derrubada (relogar() refez o login) volta uma vez
+    para a fila.
+    processar(drv, unidade) -> resultado. Retorna ([(unidade, resultado)], [(unidade, erro)]).
+    """
+    fabrica = fabrica or _fabrica
+    relogar = relogar or _relogar
+    liberar = _liberar
+    pendentes = queue.Queue()
+    for u in unidades:
+        pendentes.put(u)
+
+    feitos, erros = [], []
+    repetidas = set()
+    lock = threading.Lock()
+    threads = []
+
+    def trabalhador(indice, drv):
+        try:
+            while True:
+                if indice >= controlador.ativos:
+                    time.sleep(1.0)  # pausada pelo controlador
+                    if pendentes.empty():
+                        return
+                    continue
+                try:
+                    u = pendentes.get_nowait()
+                except queue.Empty:
+                    return
+                with contexto(sessao=indice):
+                    try:
+                        res = processar(drv, u)
+                    except Exception as e:
+                        controlador.resultado(False)
+                        log.warning("unidade %s falhou (%s: %s)", u, type(e).__name__, e)
+                        if relogar is not None and u not in repetidas and _tentar_relogar(relogar, drv):
+                            with lock:
+                                repetidas.add(u)
+                            pendentes.put(u)
+                            continue
+                        with lock:
+                            erros.append((u, e))
+                        continue
+                controlador.resultado(True)
+                with lock:
+                    feitos.append((u, res))
+        finally:
+            if drv is not driver:
+                if liberar is not None:
+                    liberar(drv)
+                try:
+                    drv.quit()
+                except Exception:
+                    pass
+
+    def iniciar(indice, drv):
+        t = threading.Thread(target=trabalhador, args=(indice, drv), name=f"cadastro-sessao-{indice}", daemon=True)
+        threads.append(t)
+        t.start()
+
+    controlador.assinar()
+    abrir_apos = 0.0
+    try:
+        iniciar(0, driver)
+        while any(t.is_alive() for t in threads):
+            ativos = controlador.ajustar()
+            if fabrica and len(threads) < ativos and not pendentes.empty() and time.monotonic() >= abrir_apos:
+                try:
+                    with contexto(sessao=len(threads)):
+                        log.info("abrindo sessão %d", len(threads))
+                        drv = fabrica()
+                except Exception as e:
+                    controlador.resultado(False)
+                    abrir_apos = time.monotonic() + controlador.espera_s
+                    log.warning("não consegui abrir mais uma sessão (%s: %s)", type(e).__name__, e)
+                else:
+                    iniciar(len(threads), drv)
+            time.sleep(1.0)
+    finally:
+        controlador.cancelar()
+    return feitos, erros
@@ -0,0 +1,135 @@
+# CadastroProdutos/_parquet.py
+# saída colunar: Parquet (Arrow) tipado, gravado em lotes durante a execução,
+# com dicionário nas colunas de poucos valores e compressão zstd
+#
+#   python -m CadastroProdutos._parquet aliquotas.csv [saida.parquet]   (converte um CSV já gerado)
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+import argparse
+import csv
+
+from CadastroProdutos._log import get_logger
+
+log = get_logger(__name__)
+
+LOTE = 1000   # linhas por record batch (cada lote vira um row group)
+
+# tipo de cada coluna conhecida; as demais (ex.: lookups) ficam string com dicionário
+_TIPOS = {
+    "codigo": "string",
+    "nome": "string",
+    "aliquota": "decimal",
+    "nao_exibir_no_cardapio": "bool",
+}
+# código e nome são quase todos distintos: sem dicionário. As demais (poucos valores
+# repetidos em milhares de linhas) vão com dicionário
+_SEM_DICIONARIO = {"codigo", "nome"}
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Para gravar Parquet instale o pyarrow (pip install pyarrow).")
+    return pyarrow
+
+def _decimal(v):
+    """'18,00' / '18.00' / '1.234,5' -> Decimal (None se vazio ou inválido)."""
+    s = str(v or "").strip().replace("%", "")
+    if not s:
+        return None
+    if "," in s:
+        s = s.replace(".", "").replace(",", ".")
+    try:
+        return Decimal(s).quantize(Decimal("0.0001"))
+    except InvalidOperation:
+        return None
+
+def _bool(v):
+    s = str(v or "").strip().lower()
+    if s in ("sim", "true", "1", "s"):
+        return True
+    if s in ("não", "nao", "false", "0", "n"):
+        return False
+    return None
+
+_CONVERSORES = {"decimal": _decimal, "bool": _bool, "string": lambda v: None if v is None else str(v)}
+
+class EscritorParquet:
+    """
+    Grava registros (tuplas na ordem de 'cabecalho') em Parquet, um record batch (row
+    group) a cada 'lote' linhas: a memória fica limitada a um lote e o arquivo cresce
+    durante a execução. O rodapé do Parquet só é escrito em fechar(); quem usa fecha
+    num finally para o arquivo sair legível mesmo quando a extração para com erro.
+    """
+    def __init__(self, caminho: Path, cabecalho, lote=LOTE):
+        pa = _pyarrow()
+        self.caminho = Path(caminho)
+        self.cabecalho = tuple(cabecalho)
+        self.lote = lote
+        tipos = {"string": pa.string(), "decimal": pa.decimal128(12, 4), "bool": pa.bool_()}
+        self._tipos = [_TIPOS.get(c, "string") for c in self.cabecalho]
+        self.schema = pa.schema([pa.field(c, tipos[t]) for c, t in zip(self.cabecalho, self._tipos)])
+        dicionario = [c for c in self.cabecalho if c not in _SEM_DICIONARIO]
+        self._writer = pa.parquet.ParquetWriter(
+            str(self.caminho), self.schema, compression="zstd", use_dictionary=dicionario)
+        self._colunas = [[] for _ in self.cabecalho]
+        self.gravados = 0
+
+    def escrever(self, registro):
+        for col, tipo, v in zip(self._colunas, self._tipos, registro):
+            col.append(_CONVERSORES[tipo](v))
+        if len(self._colunas[0]) >= self.lote:
+            self._descarregar()
+
+    def escrever_varios(self, registros):
+        for r in registros:
+            self.escrever(r)
+
+    def _descarregar(self):
+        if not self._colunas[0]:
+            return
+        pa = _pyarrow()
+        batch = pa.record_batch([pa.array(col, type=f.type) for col, f in zip(self._colunas, self.schema)],
+                                schema=self.schema)
+        self._writer.write_batch(batch)
+        self.gravados += batch.num_rows
+        self._colunas = [[] for _ in self.cabecalho]
+
+    def fechar(self):
+        if self._writer is None:
+            return
+        self._descarregar()
+        self._writer.close()
+        self._writer = None
+        log.info("%d linhas em %s", self.gravados, self.caminho.resolve())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+def converter_csv(origem: Path, destino: Path = None):
+    """Converte um CSV do extrator (| e UTF-8 com BOM) para Parquet, em lotes."""
+    origem = Path(origem)
+    destino = Path(destino) if destino else origem.with_suffix(".parquet")
+    with origem.open(newline="", encoding="utf-8-sig") as f:
+        leitor = csv.reader(f, delimiter="|")
+        cabecalho = next(leitor)
+        with EscritorParquet(destino, cabecalho) as esc:
+            for linha in leitor:
+                esc.escrever(linha)
+    return destino
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Converte o CSV do extrator para Parquet (zstd, dicionário).")
+    ap.add_argument("csv", type=Path)
+    ap.add_argument("saida", type=Path, nargs="?")
+    args = ap.parse_args(argv)
+    destino = converter_csv(args.csv, args.saida)
+    print(f"{args.csv.stat().st_size / 1024:.0f} KB (CSV) -> {destino.stat().st_size / 1024:.0f} KB (Parquet)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# CadastroProdutos/_reciclagem.py
+# troca periódica da aba por uma nova (mesma sessão/cookies) para o Chrome não acumular memória
+# numa execução longa: o renderer antigo, com o heap do Dojo/DevExpress inchado, é fechado
+import threading
+
+from CadastroProdutos._cdp import executor_da_sessao
+from CadastroProdutos._log import get_logger
+from CadastroProdutos._metricas import METRICAS, rss_navegador
+
+log = get_logger(__name__)
+
+MB = 1024 * 1024
+
+def memoria_aba(driver):
+    """Métricas CDP da aba atual ({'JSHeapUsedSize': ..., 'Nodes': ..., ...}); {} sem CDP."""
+    try:
+        driver.execute_cdp_cmd("Performance.enable", {})
+        res = driver.execute_cdp_cmd("Performance.getMetrics", {})
+    except Exception:
+        return {}
+    return {m["name"]: m["value"] for m in res.get("metrics", [])}
+
+class Reciclador:
+    """
+    Decide quando trocar a aba e faz a troca.
+      - a_cada:       recicla a cada N produtos (None = só pelos limites de memória)
+      - heap_max_mb:  JSHeapUsedSize da aba acima disso -> recicla
+      - rss_max_mb:   RSS do Chrome + chromedriver acima disso -> recicla
+      - checar_a_cada: lê as métricas a cada N produtos (cada leitura custa 2 comandos CDP)
+    Sem CDP (ou, para o RSS, sem psutil nem /proc) o limite correspondente é ignorado.
+    """
+    def __init__(self, driver, a_cada=None, heap_max_mb=None, rss_max_mb=None, checar_a_cada=10):
+        self.driver = driver
+        self.configurar(a_cada=a_cada, heap_max_mb=heap_max_mb, rss_max_mb=rss_max_mb,
+                        checar_a_cada=checar_a_cada)
+        self.produtos = 0          # desde a última troca
+        self.reciclagens = 0
+        self.desligado = False
+
+    def configurar(self, **limites):
+        """Troca os limites (mesmos nomes do construtor); os não informados ficam como estão."""
+        for nome in ("a_cada", "heap_max_mb", "rss_max_mb"):
+            if nome in limites:
+                setattr(self, nome, limites[nome])
+        if "checar_a_cada" in limites:
+            self.checar_a_cada = max(1, limites["checar_a_cada"])
+
+    @property
+    def ativo(self):
+        return not self.desligado and bool(self.a_cada or self.heap_max_mb or self.rss_max_mb)
+
+    def motivo(self):
+        """Conta mais um produto e diz por que reciclar agora (None = ainda não)."""
+        if not self.ativo:
+            return None
+        self.produtos += 1
+        if self.a_cada and self.produtos >= self.a_cada:
+            return f"{self.produtos} produtos"
+        if self.produtos % self.checar_a_cada:
+            return None
+        if self.heap_max_mb:
+            heap = memoria_aba(self.driver).get("JSHeapUsedSize")
+            if heap is not None:
+                METRICAS.heap_aba.definir(heap)
+                if heap > self.heap_max_mb * MB:
+                    return f"heap JS {heap / MB:.0f} MB"
+        if self.rss_max_mb:
+            rss = rss_navegador(self.driver)
+            if rss is not None and rss > self.rss_max_mb * MB:
+                return f"RSS {rss / MB:.0f} MB"
+        return None
+
+    def reciclar(self, restaurar=None):
+        """
+        Abre a mesma URL numa aba nova, roda restaurar() nela (voltar à página/lote da
+        grid) e só então fecha a antiga. Se a aba nova não ficar pronta, volta para a
+        antiga e desliga a reciclagem nesta sessão.
+        """
+        drv = self.driver
+        url = drv.current_url
+        antiga = drv.current_window_handle
+        drv.switch_to.new_window("tab")
+        nova = drv.current_window_handle
+        executor_da_sessao(drv).reiniciar()
+        try:
+            drv.get(url)
+            if restaurar is not None:
+                restaurar()
+        except Exception as e:
+            log.warning("aba nova não ficou pronta (%s: %s); seguindo na antiga sem reciclar",
+                        type(e).__name__, e)
+            try:
+                drv.close()
+            except Exception:
+                pass
+            drv.switch_to.window(antiga)
+            executor_da_sessao(drv).reiniciar()
+            self.desligado = True
+            return False
+        drv.switch_to.window(antiga)
+        drv.close()
+        drv.switch_to.window(nova)
+        executor_da_sessao(drv).reiniciar()
+        self.produtos = 0
+        self.reciclagens += 1
+        METRICAS.reciclagens.inc()
+        return True
+
+# =========================
+# um reciclador por sessão
+# =========================
+_RECICLADORES = {}
+_lock_recicladores = threading.Lock()
+
+def reciclador_da_sessao(driver, **limites):
+    """
+    Reciclador da sessão WebDriver de 'driver'. Os 'limites' informados valem a partir
+    desta chamada (a configuração pode mudar entre execuções na mesma sessão).
+    """
+    chave = getattr(driver, "session_id", None) or id(driver)
+    with _lock_recicladores:
+        rec = _RECICLADORES.get(chave)
+        if rec is None or rec.driver is not driver:
+            rec = _RECICLADORES[chave] = Reciclador(driver, **limites)
+        elif limites:
+            rec.configurar(**limites)
+        return rec
@@ -0,0 +1,270 @@
+# CadastroProdutos/_rede.py
+# trace de rede dos callbacks DevExpress/Dojo pelo log de performance do Chrome: tempo de
+# servidor, transferência e o que sobra até o próximo comando nosso, por produto e fase
+#
+#   python -m CadastroProdutos._rede rede.trace.jsonl     (resumo por endpoint)
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+import argparse
+import bisect
+import json
+import re
+import statistics
+import threading
+import time
+
+from CadastroProdutos._log import campos_contexto, get_logger
+
+log = get_logger(__name__)
+
+# liga o log de performance do Chrome na criação do driver (gpt_selenium.criar_driver)
+# e grava o trace neste arquivo. O log só existe se ligado ANTES de abrir o navegador.
+ARQUIVO_TRACE = None   # ex.: Path(__file__).parent / "logs" / "rede.trace.jsonl" (None = desligado)
+
+DRENAR_A_CADA_S = 2.0  # lê o log do chromedriver no máximo a cada N segundos
+TIPOS = ("XHR", "Fetch")  # callbacks; documentos/scripts/imagens ficam de fora
+
+def habilitar(options):
+    """Liga o log de rede (performance) nas Options do Chrome, se ARQUIVO_TRACE estiver definido."""
+    if ARQUIVO_TRACE is None:
+        return options
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return options
+
+_CHAMADA_LIB = re.compile(r"window\.__cadastro;.*\? C\.(\w+)\.apply", re.S)   # script de _js.chamar
+
+def _fase(driver_command, params):
+    """Nome curto da ação que gerou o comando (função do __cadastro, quando for o caso)."""
+    if driver_command in ("executeScript", "executeAsyncScript", "W3C_EXECUTE_SCRIPT", "W3C_EXECUTE_SCRIPT_ASYNC"):
+        m = _CHAMADA_LIB.search((params or {}).get("script", ""))
+        if m:
+            return "__cadastro." + m.group(1)
+    return driver_command
+
+class TracadorRede:
+    """
+    Envolve driver.execute (como o ContadorComandos) para marcar cada comando nosso com
+    o contexto do log (p, g, codigo) e, de tempos em tempos, drena o log de performance
+    do Chrome. Cada callback XHR/Fetch concluído vira uma linha no trace, atribuída ao
+    último comando enviado antes de a requisição sair.
+    Comandos que vão pelo caminho CDP (USAR_CDP) não passam pelo driver.execute: os
+    callbacks deles ficam com a marca do comando WebDriver anterior.
+    """
+    def __init__(self, driver, arquivo):
+        self.driver = driver
+        self.arquivo = Path(arquivo)
+        self._original = None
+        self._lock = threading.Lock()
+        self._drenando = False
+        self._ultima_drenagem = 0.0
+        self._marcas = []          # [(wall, fase, contexto)] em ordem de tempo
+        self._pendentes = {}       # requestId -> dados parciais
+        self._fp = None
+        self.gravados = 0
+
+    # -------- instalação --------
+    def instalar(self):
+        if self._original is None:
+            self._fp = open(self.arquivo, "a", encoding="utf-8")
+            self._original = self.driver.execute
+            self.driver.execute = self._execute
+        return self
+
+    def remover(self):
+        if self._original is None:
+            return
+        try:
+            self.drenar(forcar=True)
+        except Exception:
+            pass
+        self._desligar()
+
+    def _desligar(self):
+        if self._original is None:
+            return
+        if getattr(self._original, "__self__", None) is self.driver and \
+                getattr(self._original, "__func__", None) is type(self.driver).execute:
+            try:
+                del self.driver.execute
+            except AttributeError:
+                pass
+        else:
+            self.driver.execute = self._original   # havia outro wrapper (ex.: contador) por baixo
+        self._original = None
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def _execute(self, driver_command, params=None):
+        original = self._original   # drenar() pode desligar o tracer no meio
+        if not self._drenando:
+            if driver_command != "getLog":
+                with self._lock:
+                    self._marcas.append((time.time(), _fase(driver_command, params), campos_contexto()))
+            if time.monotonic() - self._ultima_drenagem >= DRENAR_A_CADA_S:
+                self.drenar()
+        return original(driver_command, params)
+
+    # -------- log de performance --------
+    def drenar(self, forcar=False):
+        """Lê o que o Chrome acumulou e grava os callbacks concluídos."""
+        if self._drenando or self._original is None:
+            return
+        self._drenando = True
+        try:
+            entradas = self._original("getLog", {"type": "performance"})["value"]
+        except Exception as e:
+            log.warning("log de performance indisponível (%s); trace de rede desligado", e)
+            self._drenando = False
+            self._desligar()
+            return
+        try:
+            for e in entradas:
+                try:
+                    msg = json.loads(e["message"])["message"]
+                except Exception:
+                    continue
+                self._evento(msg.get("method"), msg.get("params") or {})
+            self._fp.flush()
+            self._podar()
+        finally:
+            self._ultima_drenagem = time.monotonic()
+            self._drenando = False
+            if forcar:
+                for rid in list(self._pendentes):
+                    self._gravar(self._pendentes.pop(rid), erro="sem resposta até o fim do trace")
+
+    def _evento(self, metodo, p):
+        rid = p.get("requestId")
+        if metodo == "Network.requestWillBeSent":
+            if p.get("type") not in TIPOS:
+                return
+            req = p.get("request") or {}
+            self._pendentes[rid] = {
+                "wall": p.get("wallTime"), "inicio": p.get("timestamp"),
+                "url": req.get("url"), "metodo": req.get("method"), "tipo": p.get("type"),
+            }
+        elif rid not in self._pendentes:
+            return
+        elif metodo == "Network.responseReceived":
+            r = p.get("response") or {}
+            t = r.get("timing") or {}
+            d = self._pendentes[rid]
+            d["status"] = r.get("status")
+            if t:
+                d["envio_ms"] = round(t.get("sendEnd", 0) - t.get("sendStart", 0), 1)
+                d["espera_servidor_ms"] = round(t.get("receiveHeadersEnd", 0) - t.get("sendEnd", 0), 1)
+                d["cabecalhos_em"] = t.get("requestTime", 0) + t.get("receiveHeadersEnd", 0) / 1000
+        elif metodo == "Network.loadingFinished":
+            d = self._pendentes.pop(rid)
+            d["bytes"] = p.get("encodedDataLength")
+            d["fim"] = p.get("timestamp")
+            self._gravar(d)
+        elif metodo == "Network.loadingFailed":
+            d = self._pendentes.pop(rid)
+            d["fim"] = p.get("timestamp")
+            self._gravar(d, erro=p.get("errorText") or "falhou")
+
+    def _marca(self, wall):
+        """(fase, contexto) do último comando nosso até 'wall' e os instantes dos comandos seguintes."""
+        with self._lock:
+            instantes = [m[0] for m in self._marcas]
+            i = bisect.bisect_right(instantes, wall) - 1
+            fase, ctx = self._marcas[i][1:] if i >= 0 else ("?", {})
+            return fase, ctx, instantes[i + 1:]
+
+    def _podar(self):
+        """Descarta marcas que nenhuma requisição pendente (ou futura) ainda vai usar."""
+        walls = [d["wall"] for d in self._pendentes.values() if d.get("wall")]
+        limite = min(walls + [time.time() - 60])
+        with self._lock:
+            i = bisect.bisect_right([m[0] for m in self._marcas], limite) - 1
+            del self._marcas[:max(0, i)]
+
+    def _gravar(self, d, erro=None):
+        wall = d.get("wall") or time.time()
+        inicio, fim = d.get("inicio"), d.get("fim")
+        fim_wall = wall + (fim - inicio) if (fim is not None and inicio is not None) else None
+        fase, ctx, seguintes = self._marca(wall)
+        proximo = next((t for t in seguintes if fim_wall is not None and t >= fim_wall), None)
+
+        linha = {
+            "ts": datetime.fromtimestamp(wall).isoformat(timespec="milliseconds"),
+            **{k: ctx[k] for k in ("dominio", "sessao", "p", "g", "codigo") if k in ctx},
+            "fase": fase,
+            "metodo": d.get("metodo"),
+            "url": d.get("url"),
+            "status": d.get("status"),
+            "bytes": d.get("bytes"),
+            "total_ms": round((fim - inicio) * 1000, 1) if fim_wall is not None else None,
+            "envio_ms": d.get("envio_ms"),
+            "espera_servidor_ms": d.get("espera_servidor_ms"),
+            "transferencia_ms": round((fim - d["cabecalhos_em"]) * 1000, 1)
+                                if fim is not None and d.get("cabecalhos_em") else None,
+            # render/JS do cliente + nosso polling até o próximo comando
+            "ate_proximo_comando_ms": round((proximo - fim_wall) * 1000, 1) if proximo else None,
+        }
+        if erro:
+            linha["erro"] = erro
+        self._fp.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        self.gravados += 1
+
+def tracar(driver, arquivo=None):
+    """Instala o tracer em 'driver' se ARQUIVO_TRACE (ou 'arquivo') estiver definido; senão None."""
+    arquivo = arquivo or ARQUIVO_TRACE
+    if arquivo is None:
+        return None
+    Path(arquivo).parent.mkdir(parents=True, exist_ok=True)
+    log.info("trace de rede em %s", Path(arquivo).resolve())
+    return TracadorRede(driver, arquivo).instalar()
+
+# =========================
+# resumo do trace
+# =========================
+def _p(valores, q):
+    v = sorted(valores)
+    return v[min(len(v) - 1, int(q * len(v)))] if v else None
+
+def resumir(arquivo):
+    """{(método, caminho): {'n', 'erros', 'servidor_p50/p90', 'transferencia_p50', 'cliente_p50', 'kb_medio'}}."""
+    grupos = {}
+    with open(arquivo, encoding="utf-8") as fp:
+        for linha in fp:
+            try:
+                r = json.loads(linha)
+            except ValueError:
+                continue
+            chave = (r.get("metodo"), urlsplit(r.get("url") or "").path)
+            grupos.setdefault(chave, []).append(r)
+    out = {}
+    for chave, rs in grupos.items():
+        col = lambda k: [r[k] for r in rs if r.get(k) is not None]
+        out[chave] = {
+            "n": len(rs),
+            "erros": sum(1 for r in rs if r.get("erro") or (r.get("status") or 0) >= 400),
+            "servidor_p50": _p(col("espera_servidor_ms"), 0.5),
+            "servidor_p90": _p(col("espera_servidor_ms"), 0.9),
+            "transferencia_p50": _p(col("transferencia_ms"), 0.5),
+            "cliente_p50": _p(col("ate_proximo_comando_ms"), 0.5),
+            "kb_medio": round(statistics.fmean(col("bytes")) / 1024, 1) if col("bytes") else None,
+        }
+    return out
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Resumo por endpoint de um trace de rede (JSONL).")
+    ap.add_argument("trace", type=Path)
+    args = ap.parse_args(argv)
+    res = sorted(resumir(args.trace).items(), key=lambda kv: -(kv[1]["servidor_p90"] or 0))
+    fmt = lambda v: "-" if v is None else f"{v:.0f}"
+    print(f"{'método':<6} {'caminho':<50} {'n':>6} {'erros':>5} {'srv p50':>8} {'srv p90':>8} "
+          f"{'transf':>7} {'cliente':>8} {'KB':>7}")
+    for (metodo, caminho), r in res:
+        print(f"{(metodo or '-'):<6} {caminho[-50:]:<50} {r['n']:>6} {r['erros']:>5} {fmt(r['servidor_p50']):>8} "
+              f"{fmt(r['servidor_p90']):>8} {fmt(r['transferencia_p50']):>7} {fmt(r['cliente_p50']):>8} "
+              f"{'-' if r['kb_medio'] is None else r['kb_medio']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,7 +43,8 @@ def escolher_modulo_no_navegador(driver, mods, default_value=None):
       function finish(val){ if(done) return; done=true; try{ wrap.remove(); }catch(e){} cb(val); }
     """, mods, default_value)
 
-def executar(driver):
+def abrir_produto_servico(driver):
+    """Do menu principal até a tela Cadastros > Produto/Serviço (sem prompts)."""
     wait = WebDriverWait(driver, 20)
 
     # garantir que o menu grande está visível
@@ -76,6 +77,9 @@ def executar(driver):
         EC.visibility_of_element_located((By.XPATH, "//h1[contains(.,'Produto')]"))
     ))
 
+def executar(driver):
+    abrir_produto_servico(driver)
+
     # 2) listar módulos da subpasta ./CadastroProdutos
     subpasta = Path(__file__).parent / "CadastroProdutos"
     mods = sorted([p.stem for p in subpasta.glob("*.py")
@@ -0,0 +1,186 @@
+# _chromedriver.py
+# resolve o par Chrome/chromedriver uma vez e guarda em cache; as próximas aberturas não usam rede
+from pathlib import Path
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+CACHE_FILE = Path(__file__).parent / ".chromedriver.json"
+
+# onde procurar o Chrome quando ele não está no PATH
+_CANDIDATOS_CHROME = {
+    "win32": [
+        r"%ProgramFiles%\Google\Chrome\Application\chrome.exe",
+        r"%ProgramFiles(x86)%\Google\Chrome\Application\chrome.exe",
+        r"%LocalAppData%\Google\Chrome\Application\chrome.exe",
+    ],
+    "darwin": ["/Applications/Google Chrome.app/Contents/MacOS/Google Chrome"],
+    "linux": ["google-chrome", "google-chrome-stable", "chromium", "chromium-browser"],
+}
+
+# =========================
+# versões instaladas
+# =========================
+def _versao(texto):
+    m = re.search(r"(\d+\.\d+\.\d+\.\d+)", texto or "")
+    return m.group(1) if m else None
+
+def _versao_registro():
+    """Versão do Chrome pelo registro (Windows): não abre o navegador."""
+    try:
+        import winreg
+    except ImportError:
+        return None
+    for raiz in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            with winreg.OpenKey(raiz, r"Software\Google\Chrome\BLBeacon") as k:
+                return _versao(winreg.QueryValueEx(k, "version")[0])
+        except OSError:
+            continue
+    return None
+
+def _versao_binario(caminho):
+    """'<binario> --version' (Chrome/chromedriver em Linux/macOS; chromedriver no Windows)."""
+    try:
+        saida = subprocess.run([caminho, "--version"], capture_output=True, text=True, timeout=15)
+        return _versao(saida.stdout or saida.stderr)
+    except Exception:
+        return None
+
+def achar_chrome():
+    """Caminho do executável do Chrome instalado (ou None)."""
+    plataforma = "linux" if sys.platform.startswith("linux") else sys.platform
+    for c in _CANDIDATOS_CHROME.get(plataforma, []):
+        c = os.path.expandvars(c)
+        achado = c if os.path.isfile(c) else shutil.which(c)
+        if achado:
+            return achado
+    return None
+
+def versao_chrome(caminho=None):
+    """Versão do Chrome instalado (registro no Windows; '--version' nos demais)."""
+    if sys.platform == "win32":
+        v = _versao_registro()
+        if v:
+            return v
+        # chrome.exe --version não imprime nada no Windows: usa o nome da pasta da versão
+        caminho = caminho or achar_chrome()
+        if caminho:
+            pasta = Path(caminho).parent
+            versoes = sorted((p.name for p in pasta.iterdir() if _versao(p.name) == p.name),
+                             key=lambda s: tuple(int(x) for x in s.split(".")))
+            return versoes[-1] if versoes else None
+        return None
+    caminho = caminho or achar_chrome()
+    return _versao_binario(caminho) if caminho else None
+
+# =========================
+# Selenium Manager
+# =========================
+def _selenium_manager():
+    """Pergunta ao Selenium Manager (uma vez; pode baixar) onde estão o chromedriver e o Chrome."""
+    from selenium.webdriver.common.selenium_manager import SeleniumManager
+    sm = SeleniumManager()
+    if hasattr(sm, "binary_paths"):          # selenium >= 4.20
+        r = sm.binary_paths(["--browser", "chrome"])
+        return r.get("driver_path"), r.get("browser_path")
+    from selenium.webdriver.chrome.options import Options
+    return sm.driver_location(Options()), None
+
+# =========================
+# cache
+# =========================
+def ler_cache(caminho: Path = CACHE_FILE):
+    try:
+        return json.loads(caminho.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+def _gravar_cache(dados, caminho: Path = CACHE_FILE):
+    try:
+        caminho.write_text(json.dumps(dados, indent=2), encoding="utf-8")
+    except Exception:
+        pass
+
+def _cache_valido(cache, versao):
+    if not cache or not os.path.isfile(cache.get("chromedriver", "")):
+        return False
+    if cache.get("chrome") and not os.path.isfile(cache["chrome"]):
+        return False
+    # sem como descobrir a versão instalada (host sem registro/--version): confia no cache
+    return versao is None or cache.get("versao_chrome") == versao
+
+def resolver(forcar=False, caminho_cache: Path = CACHE_FILE):
+    """
+    Retorna {"chromedriver", "chrome", "versao_chrome", "versao_chromedriver"}.
+    Usa o cache enquanto a versão do Chrome instalado não mudar; senão resolve
+    de novo pelo Selenium Manager (única etapa que pode precisar de rede).
+    """
+    cache = None if forcar else ler_cache(caminho_cache)
+    chrome = (cache or {}).get("chrome") or achar_chrome()
+    versao = versao_chrome(chrome)
+    if _cache_valido(cache, versao):
+        return cache
+
+    try:
+        driver_path, browser_path = _selenium_manager()
+    except Exception as e:
+        if cache and os.path.isfile(cache.get("chromedriver", "")):
+            print(f"Selenium Manager indisponível ({e}); usando o chromedriver do cache.")
+            return cache
+        raise RuntimeError(
+            "Não consegui resolver o chromedriver (sem cache e sem Selenium Manager/rede). "
+            f"Rode uma vez com acesso à internet ou edite {caminho_cache.name}: {e}"
+        ) from e
+    if not driver_path:
+        raise RuntimeError("Selenium Manager não devolveu o caminho do chromedriver.")
+
+    chrome = browser_path or chrome
+    dados = {
+        "chromedriver": str(driver_path),
+        "chrome": str(chrome) if chrome else None,
+        "versao_chrome": versao or (versao_chrome(chrome) if chrome else None),
+        "versao_chromedriver": _versao_binario(str(driver_path)),
+    }
+    _gravar_cache(dados, caminho_cache)
+    return dados
+
+def criar_chrome(options=None):
+    """webdriver.Chrome a partir do cache: caminhos explícitos, sem Selenium Manager na abertura."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = options or Options()
+    par = resolver()
+    if par.get("chrome") and not options.binary_location:
+        options.binary_location = par["chrome"]
+    try:
+        return webdriver.Chrome(service=Service(executable_path=par["chromedriver"]), options=options)
+    except Exception as e:
+        if not _cache_invalido(e, par["chromedriver"]):
+            raise   # perfil, display, Chrome travado...: o erro real, sem ir à rede
+        erro = e
+    # chromedriver do cache sumiu ou não casa com o Chrome (atualizado por fora): resolve de novo
+    print(f"chromedriver do cache inválido ({erro}); resolvendo de novo.")
+    try:
+        par = resolver(forcar=True)
+        return webdriver.Chrome(service=Service(executable_path=par["chromedriver"]), options=options)
+    except Exception as e2:
+        raise e2 from erro
+
+_VERSAO_INCOMPATIVEL = re.compile(r"only supports chrome version|this version of chromedriver|"
+                                  r"current browser version is", re.I)
+
+def _cache_invalido(erro, caminho_driver):
+    """True se a falha ao abrir é do chromedriver em cache (binário ausente ou de outra versão do Chrome)."""
+    if not Path(caminho_driver).is_file():
+        return True
+    return bool(_VERSAO_INCOMPATIVEL.search(str(getattr(erro, "msg", None) or erro)))
+
+
+if __name__ == "__main__":
+    print(json.dumps(resolver(forcar="--forcar" in sys.argv), indent=2))
@@ -0,0 +1,339 @@
+# _daemon.py
+# modo daemon: sessões já logadas e paradas na tela de Produto/Serviço, esperando jobs numa
+# pasta de spool; cada job roda o módulo recarregado do disco (editou o extrator, manda de novo)
+#
+#   python _daemon.py [--sessoes 2]                               (sobe o daemon; usa o .base)
+#   python _daemon.py enviar ExtrairAliquota extrair_registros    (enfileira um job)
+#   python _daemon.py enviar ExtrairAliquota iterar_produtos --kwargs '{"paginas": [1, 2]}' --esperar
+from pathlib import Path
+import argparse
+import builtins
+import contextlib
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from CadastroProdutos._log import contexto, get_logger
+
+log = get_logger("daemon")
+
+SPOOL = Path(__file__).parent / "daemon_jobs"   # entrada/ rodando/ feitos/ falhos/
+INTERVALO_SPOOL_S = 1.0    # de quanto em quanto tempo olha a pasta de entrada
+KEEPALIVE_S       = 240    # sessão ociosa faz um pedido leve ao servidor para não expirar
+
+# módulos com estado da execução (métricas, fábrica de sessões, handlers de log):
+# não são recarregados mesmo que o arquivo mude
+NAO_RECARREGAR = {"CadastroProdutos._log", "CadastroProdutos._metricas", "CadastroProdutos._paralelo"}
+
+# =========================
+# spool
+# =========================
+def _pastas(spool: Path = SPOOL):
+    pastas = {nome: spool / nome for nome in ("entrada", "rodando", "feitos", "falhos")}
+    for p in pastas.values():
+        p.mkdir(parents=True, exist_ok=True)
+    return pastas
+
+def enviar(modulo, funcao="executar", kwargs=None, spool: Path = SPOOL):
+    """Grava um job na entrada do spool (escrita atômica). Retorna o id."""
+    id_ = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+    entrada = _pastas(spool)["entrada"]
+    tmp = entrada / f"{id_}.tmp"
+    tmp.write_text(json.dumps({"id": id_, "modulo": modulo, "funcao": funcao, "kwargs": kwargs or {}},
+                              ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, entrada / f"{id_}.json")
+    return id_
+
+def esperar_resultado(id_, spool: Path = SPOOL, timeout=None):
+    """Resultado gravado pelo daemon para o job 'id_' (None se estourar o timeout)."""
+    pastas = _pastas(spool)
+    fim = None if timeout is None else time.monotonic() + timeout
+    while fim is None or time.monotonic() < fim:
+        for pasta in (pastas["feitos"], pastas["falhos"]):
+            arq = pasta / f"{id_}.json"
+            if arq.exists():
+                return json.loads(arq.read_text(encoding="utf-8"))
+        time.sleep(0.5)
+    return None
+
+def _reivindicar(pastas):
+    """Move o job mais antigo de entrada/ para rodando/ (o rename garante um dono só)."""
+    for arq in sorted(pastas["entrada"].glob("*.json")):
+        destino = pastas["rodando"] / arq.name
+        try:
+            os.replace(arq, destino)
+        except OSError:
+            continue
+        try:
+            return json.loads(destino.read_text(encoding="utf-8")), destino
+        except Exception as e:
+            _concluir(pastas, destino, {"id": arq.stem}, {"ok": False, "erro": f"job ilegível: {e}"})
+    return None, None
+
+def _concluir(pastas, arq_rodando, job, resultado):
+    pasta = pastas["feitos"] if resultado.get("ok") else pastas["falhos"]
+    tmp = pasta / f"{job.get('id', arq_rodando.stem)}.tmp"
+    tmp.write_text(json.dumps({**job, **resultado}, ensure_ascii=False, default=str), encoding="utf-8")
+    os.replace(tmp, tmp.with_suffix(".json"))
+    with contextlib.suppress(OSError):
+        arq_rodando.unlink()
+
+# =========================
+# recarga de módulos
+# =========================
+_mtimes = {}
+# jobs em andamento: reload re-executa o corpo do módulo no mesmo namespace (zera caches
+# por sessão, estratégias...), então só recarrega com nenhum job rodando
+_lock_modulos = threading.Lock()
+_jobs_rodando = 0
+
+def _arquivo(mod):
+    try:
+        return Path(mod.__file__).stat().st_mtime
+    except Exception:
+        return None
+
+def _nome_completo(modulo):
+    """'ExtrairAliquota' -> 'CadastroProdutos.ExtrairAliquota' se existir lá; senão o nome como veio."""
+    if "." not in modulo and (Path(__file__).parent / "CadastroProdutos" / f"{modulo}.py").exists():
+        return f"CadastroProdutos.{modulo}"
+    return modulo
+
+def carregar(modulo):
+    """
+    Importa 'modulo' do disco: recarrega os helpers do pacote cujo arquivo mudou desde
+    a última carga (menos NAO_RECARREGAR) e sempre o próprio módulo do job.
+    """
+    nome = _nome_completo(modulo)
+    for n, mod in sorted(sys.modules.items()):
+        if not n.startswith("CadastroProdutos._") or n in NAO_RECARREGAR or mod is None:
+            continue
+        mtime = _arquivo(mod)
+        if n in _mtimes and mtime != _mtimes[n]:
+            log.info("recarregando %s (arquivo mudou)", n)
+            importlib.reload(mod)
+        _mtimes[n] = mtime
+    importlib.invalidate_caches()
+    if nome in sys.modules:
+        mod = importlib.reload(sys.modules[nome])
+    else:
+        mod = importlib.import_module(nome)
+    _mtimes[nome] = _arquivo(mod)
+    return mod
+
+def _mudou(nome):
+    mod = sys.modules.get(nome)
+    return mod is not None and _arquivo(mod) != _mtimes.get(nome)
+
+@contextlib.contextmanager
+def modulo_do_job(modulo):
+    """
+    Módulo do job enquanto ele roda. Sem outro job rodando, recarrega do disco (carregar);
+    com jobs em andamento usa o já carregado e a recarga fica para quando as sessões vagarem.
+    """
+    global _jobs_rodando
+    with _lock_modulos:
+        if _jobs_rodando == 0:
+            mod = carregar(modulo)
+        else:
+            nome = _nome_completo(modulo)
+            if _mudou(nome):
+                log.info("%s mudou no disco; recarrega quando não houver job rodando", nome)
+            mod = sys.modules.get(nome) or importlib.import_module(nome)
+            _mtimes.setdefault(nome, _arquivo(mod))
+        _jobs_rodando += 1
+    try:
+        yield mod
+    finally:
+        with _lock_modulos:
+            _jobs_rodando -= 1
+
+@contextlib.contextmanager
+def _sem_console():
+    """
+    Sem console no daemon: input() (ex.: 'Pressione Enter...') volta vazio na hora.
+    Vale para o processo todo; servir() liga uma vez, não por job (jobs rodam em paralelo).
+    """
+    original = builtins.input
+
+    def vazio(prompt=""):
+        log.debug("input() ignorado no daemon: %s", prompt)
+        return ""
+
+    builtins.input = vazio
+    try:
+        yield
+    finally:
+        builtins.input = original
+
+# =========================
+# sessões
+# =========================
+class Sessao:
+    """Um navegador logado na loja e na tela de Produto/Serviço."""
+    def __init__(self, indice, abrir, relogar=None, liberar=None):
+        self.indice = indice
+        self._abrir = abrir
+        self._relogar = relogar
+        self._liberar = liberar
+        self.driver = None
+        self.ultimo_uso = time.monotonic()
+
+    def garantir(self):
+        """Driver vivo e na tela de cadastro (reabre o navegador se ele caiu)."""
+        if self.driver is not None:
+            try:
+                self.driver.current_url
+            except Exception:
+                log.warning("sessão %d caiu; abrindo de novo", self.indice)
+                self.fechar()
+            else:
+                if self._relogar is not None and self._relogar(self.driver):
+                    log.info("sessão %d relogada com outra conta", self.indice)
+        if self.driver is None:
+            self.driver = self._abrir()
+        return self.driver
+
+    def keepalive(self):
+        """Pedido leve ao servidor (renova a sessão ASP.NET) sem mexer na tela."""
+        try:
+            self.driver.execute_script(
+                "fetch(location.href, {method: 'HEAD', credentials: 'same-origin', cache: 'no-store'});")
+        except Exception as e:
+            log.warning("keep-alive da sessão %d falhou (%s); será reaberta no próximo job", self.indice, e)
+        self.ultimo_uso = time.monotonic()
+
+    def rodar(self, job):
+        from CadastroProdutosMain import abrir_produto_servico
+        drv = self.garantir()
+        abrir_produto_servico(drv)   # o job anterior pode ter deixado a tela em qualquer lugar
+        with modulo_do_job(job["modulo"]) as mod:
+            funcao = getattr(mod, job.get("funcao") or "executar", None)
+            if not callable(funcao):
+                raise RuntimeError(f"{job['modulo']} não tem a função {job.get('funcao') or 'executar'}(driver, ...)")
+            retorno = funcao(drv, **(job.get("kwargs") or {}))
+            if hasattr(retorno, "__next__"):      # gerador (ex.: iterar_produtos): consome tudo
+                retorno = list(retorno)
+        return retorno
+
+    def fechar(self):
+        if self.driver is not None:
+            if self._liberar is not None:
+                self._liberar(self.driver)
+            with contextlib.suppress(Exception):
+                self.driver.quit()
+            self.driver = None
+
+# =========================
+# laço do daemon
+# =========================
+def servir(n_sessoes=1, spool: Path = SPOOL):
+    import gpt_selenium as gs
+    from CadastroProdutosMain import abrir_produto_servico
+    from CadastroProdutos._paralelo import registrar_fabrica
+
+    perfis = gs.carregar_perfis()
+    if not perfis:
+        raise RuntimeError(f"o daemon precisa das credenciais em {gs.BASE_FILE} (rode o gpt_selenium uma vez e salve)")
+    contas = gs.Contas(perfis)
+    if len(perfis) < n_sessoes:
+        log.warning("%d sessões e %d conta(s) no .base: sessões vão dividir conta", n_sessoes, len(perfis))
+
+    # a 1ª sessão escolhe a loja; as outras (e as extras de jobs paralelos) entram na mesma,
+    # cada uma com a conta livre da vez
+    primeiro = gs.criar_driver()
+    gs.logar(primeiro, perfis[0]["URL"], perfis[0]["USER"], perfis[0]["PASS"])
+    contas.vincular(primeiro, 0)
+    dominio = gs.entrar_dominio(primeiro)
+    abrir_produto_servico(primeiro)
+
+    def abrir():
+        return contas.nova_sessao(dominio)
+
+    def relogar(drv):
+        return contas.relogar(drv, dominio)
+
+    registrar_fabrica(abrir, relogar=relogar, liberar=contas.liberar)
+    sessoes = [Sessao(i, abrir, relogar, contas.liberar) for i in range(max(1, n_sessoes))]
+    sessoes[0].driver = primeiro
+    for s in sessoes[1:]:
+        s.garantir()
+
+    pastas = _pastas(spool)
+    # jobs que estavam rodando quando o daemon anterior parou voltam para a fila
+    for arq in pastas["rodando"].glob("*.json"):
+        os.replace(arq, pastas["entrada"] / arq.name)
+
+    livres = queue.Queue()
+    for s in sessoes:
+        livres.put(s)
+
+    def trabalhar(sessao, job, arq):
+        inicio = time.time()
+        with contexto(job=job.get("id"), sessao=sessao.indice):
+            log.info("job %s: %s.%s", job.get("id"), job.get("modulo"), job.get("funcao") or "executar")
+            try:
+                retorno = sessao.rodar(job)
+                resultado = {"ok": True, "retorno": retorno}
+            except Exception as e:
+                log.error("job falhou: %s: %s", type(e).__name__, e)
+                resultado = {"ok": False, "erro": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+            resultado["segundos"] = round(time.time() - inicio, 3)
+            _concluir(pastas, arq, job, resultado)
+            log.info("job %s %s em %.1fs", job.get("id"), "ok" if resultado["ok"] else "FALHOU",
+                     resultado["segundos"])
+        sessao.ultimo_uso = time.monotonic()
+        livres.put(sessao)
+
+    log.info("daemon pronto: %d sessão(ões) na loja %s; jobs em %s", len(sessoes), dominio, pastas["entrada"])
+    try:
+        with _sem_console():   # input() vazio no processo todo enquanto o daemon serve
+            while True:
+                try:
+                    sessao = livres.get(timeout=INTERVALO_SPOOL_S)
+                except queue.Empty:
+                    continue
+                job, arq = _reivindicar(pastas)
+                if job is None:
+                    if time.monotonic() - sessao.ultimo_uso > KEEPALIVE_S and sessao.driver is not None:
+                        sessao.keepalive()
+                    livres.put(sessao)
+                    time.sleep(INTERVALO_SPOOL_S / max(1, len(sessoes)))
+                    continue
+                threading.Thread(target=trabalhar, args=(sessao, job, arq),
+                                 name=f"daemon-sessao-{sessao.indice}", daemon=True).start()
+    except KeyboardInterrupt:
+        log.info("daemon encerrado")
+    finally:
+        for s in sessoes:
+            s.fechar()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Daemon de extração: sessões logadas esperando jobs num spool.")
+    sub = ap.add_subparsers(dest="cmd")
+    ap.add_argument("--sessoes", type=int, default=1, help="navegadores logados mantidos abertos")
+    ap.add_argument("--spool", type=Path, default=SPOOL, help="pasta do spool de jobs")
+    env = sub.add_parser("enviar", help="enfileira um job")
+    env.add_argument("modulo", help="ex.: ExtrairAliquota (CadastroProdutos/) ou um módulo da raiz")
+    env.add_argument("funcao", nargs="?", default="executar", help="função chamada como funcao(driver, **kwargs)")
+    env.add_argument("--kwargs", default="{}", help="argumentos nomeados em JSON")
+    env.add_argument("--esperar", action="store_true", help="espera o resultado e imprime")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "enviar":
+        id_ = enviar(args.modulo, args.funcao, json.loads(args.kwargs), args.spool)
+        print(id_)
+        if args.esperar:
+            print(json.dumps(esperar_resultado(id_, args.spool), ensure_ascii=False, indent=2, default=str))
+        return
+    servir(args.sessoes, args.spool)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
-from selenium import webdriver
 import time
 
+from _chromedriver import criar_chrome
+
 # Abrir o navegador
-navegador = webdriver.Chrome()
+navegador = criar_chrome()
 
 # acessar o site
 navegador.get("https://chefwebcloud.chef.totvs.com.br/")
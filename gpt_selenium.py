@@ -1,11 +1,18 @@
 import importlib
+import threading
+import time
 from pathlib import Path
-from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+from _chromedriver import criar_chrome
+from CadastroProdutos._log import get_logger
+from CadastroProdutos._rede import habilitar as habilitar_log_rede
+
+log = get_logger("gpt_selenium")
+
 # =========================
 # util: listar módulos .py
 # =========================
@@ -23,30 +30,55 @@ def listar_modulos(pasta=None):
 # =========================
 BASE_FILE = Path(__file__).parent / ".base"
 
-def _parse_base_text(text: str):
-    creds = {}
+def _parse_perfis(text: str):
+    """
+    [(nome, {CHAVE: valor})] na ordem do arquivo. As linhas antes da 1ª [seção] são o
+    perfil 'padrao'; cada [seção] é mais uma conta (URL, se omitida, vem do padrão):
+
+        URL=https://...
+        USER=conta1
+        PASS=...
+        [conta2]
+        USER=conta2
+        PASS=...
+    """
+    perfis = [("padrao", {})]
     for line in text.splitlines():
         line = line.strip()
         if not line or line.startswith("#"):
             continue
+        if line.startswith("[") and line.endswith("]"):
+            perfis.append((line[1:-1].strip(), {}))
+            continue
         if "=" in line:
             k, v = line.split("=", 1)
-            creds[k.strip().upper()] = v.strip().strip('"').strip("'")
-    return creds
+            perfis[-1][1][k.strip().upper()] = v.strip().strip('"').strip("'")
+    return perfis
 
-def carregar_base():
+def _parse_base_text(text: str):
+    return _parse_perfis(text)[0][1]
+
+def carregar_perfis():
+    """Contas completas do .base (URL/USER/PASS), na ordem do arquivo; [] se não houver."""
     if not BASE_FILE.exists():
-        return None
+        return []
     try:
-        creds = _parse_base_text(BASE_FILE.read_text(encoding="utf-8"))
-        url  = creds.get("URL") or ""
+        perfis = _parse_perfis(BASE_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return []
+    url_padrao = perfis[0][1].get("URL") or ""
+    contas = []
+    for nome, creds in perfis:
+        url  = creds.get("URL") or url_padrao
         user = creds.get("USER") or ""
         pw   = creds.get("PASS") or ""
         if url and user and pw:
-            return {"URL": url, "USER": user, "PASS": pw}
-    except Exception:
-        pass
-    return None
+            contas.append({"NOME": nome, "URL": url, "USER": user, "PASS": pw})
+    return contas
+
+def carregar_base():
+    perfis = carregar_perfis()
+    return perfis[0] if perfis else None
 
 def salvar_base(url, user, pw):
     try:
@@ -165,14 +197,291 @@ def escolher_modulo_no_navegador(driver, mods, default_value=None):
     """, mods, default_value)
 
 # =========================
-# Chrome & fluxo principal
+# Chrome / login / domínio
 # =========================
-def main():
-    # Chrome
+def criar_driver():
     opts = Options()
     opts.add_experimental_option("detach", True)  # deixa o Chrome aberto ao terminar
-    driver = webdriver.Chrome(options=opts)
+    habilitar_log_rede(opts)  # só com CadastroProdutos._rede.ARQUIVO_TRACE definido
+    return criar_chrome(opts)  # chromedriver/Chrome do cache (.chromedriver.json), sem rede
+
+def logar(driver, URL, USER, PASS):
+    """Abre a URL e faz o login; para na tela de escolha do domínio (loja)."""
     wait = WebDriverWait(driver, 20)
+    driver.get(URL)
+    driver.maximize_window()
+
+    user_el = wait.until(EC.visibility_of_element_located((By.ID, "UserName")))
+    pwd_el  = driver.find_element(By.ID, "Senha")
+    btn_el  = driver.find_element(By.ID, "btnLogin")
+
+    user_el.clear(); user_el.send_keys(USER)
+    pwd_el.send_keys(PASS)
+    btn_el.click()
+
+    wait.until(EC.visibility_of_element_located((By.ID, "divDomain")))
+
+def listar_dominios(driver):
+    """
+    Lojas do combo de domínio (tela pós-login): [(indice, nome)], com 'indice' o
+    data-option-array-index do chosen. Duas lojas podem ter o mesmo nome; o índice não.
+    """
+    wait = WebDriverWait(driver, 20)
+    wait.until(EC.visibility_of_element_located((By.ID, "divDomain")))
+    lojas = driver.execute_script("""
+        // mesma numeração do SelectParser do chosen: optgroups e options, em ordem
+        var sel = document.getElementById('comboBoxDomain');
+        var out = [], n = 0;
+        function opcao(op) {
+            var t = (op.textContent || '').trim();
+            if (op.value !== '' && t && !op.disabled) out.push([n, t]);
+            n++;
+        }
+        if (!sel) return out;
+        for (var i = 0; i < sel.children.length; i++) {
+            var el = sel.children[i];
+            if (el.tagName === 'OPTGROUP') {
+                n++;
+                for (var j = 0; j < el.children.length; j++) opcao(el.children[j]);
+            } else if (el.tagName === 'OPTION') {
+                opcao(el);
+            }
+        }
+        return out;
+    """) or []
+    if not lojas:
+        # sem <select> acessível: lê a lista do chosen
+        chosen_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#comboBoxDomain_chosen")))
+        chosen_box.click()
+        itens = wait.until(EC.visibility_of_all_elements_located(
+            (By.CSS_SELECTOR, "#comboBoxDomain_chosen .chosen-results li.active-result")))
+        lojas = [(li.get_attribute("data-option-array-index"), li.text.strip()) for li in itens if li.text.strip()]
+        chosen_box.click()
+    return [(int(i), nome) for i, nome in lojas]
+
+def _xpath_texto(s):
+    if "'" not in s:
+        return f"'{s}'"
+    return "concat(" + ", \"'\", ".join(f"'{p}'" for p in s.split("'")) + ")"
+
+def entrar_dominio(driver, nome=None):
+    """
+    Escolhe a loja no combo de domínio, entra e espera a home. Retorna o nome.
+    'nome': texto da loja, o índice de listar_dominios (int; único mesmo com nomes
+    repetidos) ou None para a primeira.
+    """
+    wait = WebDriverWait(driver, 20)
+    wait.until(EC.visibility_of_element_located((By.ID, "divDomain")))
+    chosen_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#comboBoxDomain_chosen")))
+    chosen_box.click()
+    if nome is None:
+        opcao = wait.until(EC.element_to_be_clickable(
+            (By.CSS_SELECTOR, "#comboBoxDomain_chosen .chosen-results li.active-result")))
+    elif isinstance(nome, int):
+        opcao = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR,
+            f"#comboBoxDomain_chosen .chosen-results li.active-result[data-option-array-index='{nome}']")))
+    else:
+        opcao = wait.until(EC.element_to_be_clickable((By.XPATH,
+            "//*[@id='comboBoxDomain_chosen']//li[contains(@class,'active-result')]"
+            f"[normalize-space()={_xpath_texto(nome)}]")))
+    escolhido = opcao.text.strip() or nome
+    opcao.click()
+    wait.until(EC.element_to_be_clickable((By.ID, "btnEntrar"))).click()
+
+    wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#navbar .current-domain")))
+    wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "ul#novoMenu")))
+    return escolhido
+
+def nova_sessao(URL, USER, PASS, dominio=None):
+    """Navegador novo: login, loja 'dominio' (nome ou índice) e tela de Produto/Serviço (para sessões paralelas)."""
+    from CadastroProdutosMain import abrir_produto_servico
+    drv = criar_driver()
+    try:
+        logar(drv, URL, USER, PASS)
+        entrar_dominio(drv, dominio)
+        abrir_produto_servico(drv)
+        return drv
+    except Exception:
+        drv.quit()
+        raise
+
+# =========================
+# várias contas (perfis do .base)
+# =========================
+ESPERA_CONTA_DERRUBADA_S = 300  # conta que derrubou uma sessão fica esse tempo fora do rodízio
+
+def sessao_derrubada(driver):
+    """True se a aba voltou para a tela de login (outro login da mesma conta derrubou esta sessão)."""
+    try:
+        return bool(driver.execute_script(
+            "var u = document.getElementById('UserName');"
+            "return !!(u && u.offsetParent !== null && document.getElementById('btnLogin'));"))
+    except Exception:
+        return False
+
+class Contas:
+    """
+    Rodízio das contas do .base entre as sessões abertas. O TOTVS derruba a sessão
+    anterior quando a mesma conta loga de novo, então cada sessão nova pega a conta
+    menos usada no momento (com contas de sobra, cada sessão fica com a sua). Uma
+    sessão derrubada troca de conta em relogar(); a conta dela fica
+    ESPERA_CONTA_DERRUBADA_S fora do rodízio.
+    """
+    def __init__(self, perfis):
+        if not perfis:
+            raise ValueError("nenhuma conta (URL/USER/PASS) para o rodízio")
+        self.perfis = list(perfis)
+        self._uso = [0] * len(self.perfis)
+        self._fora_ate = [0.0] * len(self.perfis)
+        self._de = {}   # session_id -> índice do perfil
+        self._lock = threading.Lock()
+
+    def _chave(self, driver):
+        return getattr(driver, "session_id", None) or id(driver)
+
+    def _ocupar(self, evitar=None):
+        with self._lock:
+            agora = time.monotonic()
+            candidatas = [i for i in range(len(self.perfis)) if i != evitar and self._fora_ate[i] <= agora] \
+                or [i for i in range(len(self.perfis)) if i != evitar] or [0]
+            i = min(candidatas, key=lambda i: (self._uso[i], i))
+            self._uso[i] += 1
+            if self._uso[i] > 1:
+                log.warning("conta %s em %d sessões ao mesmo tempo (contas no .base: %d); "
+                            "o servidor pode derrubar uma delas", self.perfis[i]["NOME"], self._uso[i], len(self.perfis))
+            return i
+
+    def _soltar(self, i):
+        with self._lock:
+            self._uso[i] = max(0, self._uso[i] - 1)
+
+    def vincular(self, driver, perfil=0):
+        """Registra que 'driver' (já logado, ex.: a sessão principal) usa o perfil de índice 'perfil'."""
+        with self._lock:
+            self._uso[perfil] += 1
+            self._de[self._chave(driver)] = perfil
+
+    def liberar(self, driver):
+        i = self._de.pop(self._chave(driver), None)
+        if i is not None:
+            self._soltar(i)
+
+    def conta_de(self, driver):
+        i = self._de.get(self._chave(driver))
+        return None if i is None else self.perfis[i]
+
+    def nova_sessao(self, dominio=None):
+        """Fábrica de sessões paralelas: navegador novo logado com a conta livre da vez."""
+        i = self._ocupar()
+        p = self.perfis[i]
+        try:
+            drv = nova_sessao(p["URL"], p["USER"], p["PASS"], dominio)
+        except Exception:
+            self._soltar(i)
+            raise
+        with self._lock:
+            self._de[self._chave(drv)] = i
+        return drv
+
+    def relogar(self, driver, dominio=None):
+        """
+        Se a sessão de 'driver' foi derrubada, loga nela com outra conta, entra na loja
+        e volta para a tela de Produto/Serviço. Retorna True se relogou.
+        """
+        if not sessao_derrubada(driver):
+            return False
+        from CadastroProdutosMain import abrir_produto_servico
+        chave = self._chave(driver)
+        antiga = self._de.pop(chave, None)
+        if antiga is not None:
+            self._soltar(antiga)
+            with self._lock:
+                self._fora_ate[antiga] = time.monotonic() + ESPERA_CONTA_DERRUBADA_S
+        i = self._ocupar(evitar=antiga if len(self.perfis) > 1 else None)
+        p = self.perfis[i]
+        log.warning("sessão derrubada (conta %s); relogando com a conta %s",
+                    "?" if antiga is None else self.perfis[antiga]["NOME"], p["NOME"])
+        try:
+            logar(driver, p["URL"], p["USER"], p["PASS"])
+            entrar_dominio(driver, dominio)
+            abrir_produto_servico(driver)
+        except Exception:
+            self._soltar(i)
+            raise
+        with self._lock:
+            self._de[chave] = i
+        return True
+
+# =========================
+# todas as lojas numa execução
+# =========================
+MULTI_DOMINIO       = False  # True: extrai todas as lojas e grava um CSV só (dominio|codigo|...)
+NAVEGADORES_DOMINIO = 1      # lojas em paralelo (um navegador por loja); 1 = uma de cada vez
+SAIDA_DOMINIOS      = Path(__file__).parent / "aliquotas_lojas.csv"
+
+def extrair_todos_dominios(driver, URL, USER, PASS, contas=None):
+    """
+    Lista as lojas do usuário e extrai cada uma com ExtrairAliquota.extrair_registros.
+    A 1ª loja usa o navegador já logado; as demais abrem um navegador próprio (login
+    + loja, com a conta da vez em 'contas'), até NAVEGADORES_DOMINIO ao mesmo tempo.
+    Grava tudo em SAIDA_DOMINIOS.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from CadastroProdutosMain import abrir_produto_servico
+    from CadastroProdutos.ExtrairAliquota import extrair_registros, salvar_csv, CABECALHO_CSV
+    from CadastroProdutos._log import contexto
+
+    lojas = listar_dominios(driver)
+    if not lojas:
+        print("Nenhuma loja encontrada no combo de domínio.")
+        return None
+    nomes = [nome for _, nome in lojas]
+    log.info("%d loja(s): %s", len(nomes), ", ".join(nomes))
+
+    def uma_loja(i, drv=None):
+        # a loja vai pelo índice do combo: o nome pode se repetir entre lojas
+        indice, nome = lojas[i]
+        proprio = drv is None
+        try:
+            with contexto(dominio=nome):
+                if proprio:
+                    drv = contas.nova_sessao(indice) if contas else nova_sessao(URL, USER, PASS, indice)
+                else:
+                    entrar_dominio(drv, indice)
+                    abrir_produto_servico(drv)
+                registros, falhas = extrair_registros(drv)
+                log.info("loja concluída: %d produtos, %d falhas", len(registros), len(falhas))
+                return registros
+        finally:
+            if proprio and drv is not None:
+                if contas:
+                    contas.liberar(drv)
+                drv.quit()
+
+    # por índice: duas lojas podem ter o mesmo nome de exibição
+    por_loja = {}
+    with ThreadPoolExecutor(max_workers=max(1, NAVEGADORES_DOMINIO)) as ex:
+        futuros = {ex.submit(uma_loja, 0, driver): 0}
+        futuros.update({ex.submit(uma_loja, i): i for i in range(1, len(lojas))})
+        for fut in as_completed(futuros):
+            i = futuros[fut]
+            try:
+                por_loja[i] = fut.result()
+            except Exception as e:
+                log.error("loja %s falhou: %s: %s", nomes[i], type(e).__name__, e)
+
+    combinados = [(nomes[i],) + tuple(reg) for i in range(len(nomes)) if i in por_loja for reg in por_loja[i]]
+    salvar_csv(SAIDA_DOMINIOS, combinados, escrever_cabecalho=True, overwrite=True,
+               cabecalho=("dominio",) + CABECALHO_CSV)
+    print(f"OK! {len(combinados)} linhas de {len(por_loja)}/{len(nomes)} lojas em: {SAIDA_DOMINIOS.resolve()}")
+    return SAIDA_DOMINIOS
+
+# =========================
+# fluxo principal
+# =========================
+def main():
+    # Chrome
+    driver = criar_driver()
 
     # 1) Carregar .base ou pedir credenciais
     creds = carregar_base()
@@ -188,29 +497,26 @@ def main():
             ok = salvar_base(URL, USER, PASS)
             print(".base salvo." if ok else "Falha ao salvar .base (sem impactar a execução).")
 
-    # 2) Navegar e logar
-    driver.get(URL)
-    driver.maximize_window()
+    # contas para as sessões extras: os perfis do .base (a 1ª é a desta sessão)
+    perfis = carregar_perfis() if creds else []
+    contas = Contas(perfis or [{"NOME": "padrao", "URL": URL, "USER": USER, "PASS": PASS}])
 
-    user_el = wait.until(EC.visibility_of_element_located((By.ID, "UserName")))
-    pwd_el  = driver.find_element(By.ID, "Senha")
-    btn_el  = driver.find_element(By.ID, "btnLogin")
+    # 2) Navegar e logar
+    logar(driver, URL, USER, PASS)
+    contas.vincular(driver, 0)
 
-    user_el.clear(); user_el.send_keys(USER)
-    pwd_el.send_keys(PASS)
-    btn_el.click()
+    # (opcional) todas as lojas de uma vez
+    if MULTI_DOMINIO:
+        extrair_todos_dominios(driver, URL, USER, PASS, contas)
+        return
 
-    # 3) Pós-login: domínio e entrar
-    wait.until(EC.visibility_of_element_located((By.ID, "divDomain")))
-    chosen_box = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#comboBoxDomain_chosen")))
-    chosen_box.click()
-    primeira_opcao = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "#comboBoxDomain_chosen .chosen-results li.active-result")))
-    primeira_opcao.click()
-    wait.until(EC.element_to_be_clickable((By.ID, "btnEntrar"))).click()
+    # 3) Pós-login: domínio e entrar (4: espera a home)
+    dominio = entrar_dominio(driver)
 
-    # 4) Esperar home
-    wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "#navbar .current-domain")))
-    wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "ul#novoMenu")))
+    # sessões extras (extração paralela) entram na mesma loja, cada uma com a sua conta
+    from CadastroProdutos._paralelo import registrar_fabrica
+    registrar_fabrica(lambda: contas.nova_sessao(dominio),
+                      relogar=lambda drv: contas.relogar(drv, dominio), liberar=contas.liberar)
 
     # 5) Escolher módulo
     mods = listar_modulos()